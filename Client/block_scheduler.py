@@ -0,0 +1,48 @@
+import threading
+
+
+class InflightBytesLimiter:
+    """
+    Caps how many block bytes are being uploaded at once across every file.
+    A block bigger than the whole budget is still let through when nothing else is in flight,
+    otherwise it would never be sent.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.inflight = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, size):
+        with self.condition:
+            while self.inflight > 0 and self.inflight + size > self.max_bytes:
+                self.condition.wait()
+            self.inflight += size
+
+    def release(self, size):
+        with self.condition:
+            self.inflight -= size
+            self.condition.notify_all()
+
+
+class DataNodeLoad:
+    """Tracks how many block transfers each DataNode is currently serving for us, to spread the load."""
+    def __init__(self):
+        self.active = {}
+        self.lock = threading.Lock()
+
+    def order_by_load(self, assigned_datanodes):
+        """
+        Put the least busy DataNode first and count a transfer against it until done() is called.
+        For writes that node heads the pipeline (the only node the client talks to), for reads it is
+        the replica tried first. The other nodes keep the NameNode's order.
+        """
+        with self.lock:
+            head = min(assigned_datanodes, key=lambda node: self.active.get(node, 0))
+            self.active[head] = self.active.get(head, 0) + 1
+        return [head] + [node for node in assigned_datanodes if node != head]
+
+    def done(self, head):
+        with self.lock:
+            self.active[head] -= 1
+            if self.active[head] <= 0:
+                del self.active[head]
@@ -0,0 +1,118 @@
+import hashlib
+import os
+
+import numpy as np
+
+# Content-defined chunk sizes for dedup uploads, the average is rounded down to a power of two
+DEDUP_MIN_CHUNK = int(os.getenv("DEDUP_MIN_CHUNK", str(256 * 1024)))
+DEDUP_AVG_CHUNK = int(os.getenv("DEDUP_AVG_CHUNK", str(1024 * 1024)))
+DEDUP_MAX_CHUNK = int(os.getenv("DEDUP_MAX_CHUNK", str(4 * 1024 * 1024)))
+# File bytes hashed per pass, bigger segments mean fewer numpy calls but more memory
+CHUNK_SEGMENT_SIZE = 16 * 1024 * 1024
+# Gear hash width in bits, each hash covers the last HASH_BITS bytes
+HASH_BITS = 32
+
+# Gear table: one pseudo random 32-bit value per byte value. Derived from sha256 instead of an RNG
+# so every client, on every numpy version, cuts the same content at the same places
+GEAR = np.array([int.from_bytes(hashlib.sha256(bytes([value])).digest()[:4], "big") for value in range(256)],
+                dtype=np.uint32)
+
+
+def gear_hashes(data):
+    """
+    Gear rolling hash after every byte of data: h[i] = (h[i-1] << 1) + GEAR[data[i]] on 32 bits.
+    Bytes older than 32 positions are shifted out, so h[i] is the sum of GEAR[data[i-j]] << j for
+    j < 32. That is built by doubling the window (1, 2, 4, 8, 16 -> 32 bytes) with five vector
+    shift + adds instead of a Python loop over the bytes.
+    """
+    hashes = GEAR[np.frombuffer(data, dtype=np.uint8)]
+    shifted = np.empty_like(hashes)
+    window = 1
+    while window < HASH_BITS:
+        np.left_shift(hashes[:-window], window, out=shifted[window:])
+        # shifted is a copy, so the add reads the hashes from before this round
+        np.add(hashes[window:], shifted[window:], out=hashes[window:])
+        window *= 2
+    return hashes
+
+
+def _top_bits_mask(bits):
+    # the high bits of a gear hash depend on the most bytes, the low ones only on the last few
+    return ((1 << bits) - 1) << (HASH_BITS - bits)
+
+
+class FastCDC:
+    """
+    FastCDC content-defined chunking: a gear hash rolls over the data and a chunk ends where the
+    hash has enough zero bits. Cuts depend only on nearby content, so inserting or deleting bytes
+    moves the boundaries around the edit and the chunks after it come out the same as before.
+    Normalized chunking: before avg_size a harder mask (2 more bits) is used and after it an easier
+    one (2 fewer), which pulls chunk sizes towards the average. No cut before min_size, forced cut
+    at max_size.
+    """
+    def __init__(self, min_size=DEDUP_MIN_CHUNK, avg_size=DEDUP_AVG_CHUNK, max_size=DEDUP_MAX_CHUNK):
+        if not HASH_BITS <= min_size <= avg_size <= max_size:
+            raise ValueError(f"Chunk sizes must satisfy {HASH_BITS} <= min <= avg <= max, "
+                             f"got {min_size}/{avg_size}/{max_size}")
+        self.min_size = min_size
+        self.avg_size = avg_size
+        self.max_size = max_size
+        bits = avg_size.bit_length() - 1
+        self.mask_strict = _top_bits_mask(min(HASH_BITS, bits + 2))
+        self.mask_loose = _top_bits_mask(max(1, bits - 2))
+
+    def cut_points(self, data, final=True):
+        """
+        Chunk ends (exclusive offsets) in data, which must start at a chunk boundary.
+        Unless final, the tail after the last cut is left out since more data could move it.
+        """
+        size = len(data)
+        hashes = gear_hashes(data)
+        # the strict mask has every bit of the loose one, so strict candidates are a subset
+        loose = np.flatnonzero((hashes & self.mask_loose) == 0)
+        strict = loose[(hashes[loose] & self.mask_strict) == 0] + 1
+        loose += 1
+        cuts = []
+        start = 0
+        while start < size:
+            remaining = size - start
+            if remaining < self.max_size and not final:
+                break
+            if remaining <= self.min_size:
+                end = size
+            else:
+                end = None
+                # a hash at position i means a cut after byte i, the candidate arrays hold i + 1
+                i = np.searchsorted(strict, start + self.min_size)
+                if i < len(strict) and strict[i] < start + self.avg_size:
+                    end = int(strict[i])
+                else:
+                    i = np.searchsorted(loose, start + self.avg_size)
+                    if i < len(loose) and loose[i] < start + self.max_size:
+                        end = int(loose[i])
+                if end is None:
+                    end = min(start + self.max_size, size)
+            cuts.append(end)
+            start = end
+        return cuts
+
+    def chunk_file(self, path):
+        """Yield (offset, size, sha256 hex fingerprint) for every chunk of a file, in order."""
+        offset = 0
+        pending = b""
+        with open(path, "rb") as f:
+            while True:
+                data = f.read(CHUNK_SEGMENT_SIZE)
+                final = not data
+                buffer = pending + data
+                if not buffer:
+                    return
+                start = 0
+                with memoryview(buffer) as view:
+                    for end in self.cut_points(buffer, final):
+                        yield offset, end - start, hashlib.sha256(view[start:end]).hexdigest()
+                        offset += end - start
+                        start = end
+                pending = buffer[start:]
+                if final:
+                    return
@@ -1,10 +1,21 @@
 import os  
-import requests  
+import sys
 import json
 import logging
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
-import base64
+import struct
+import zlib
+import queue
+import tempfile
+from urllib.parse import quote
+import numpy as np
+from block_scheduler import InflightBytesLimiter, DataNodeLoad
+from http_pool import get_session, log_connection_stats, HTTP_TIMEOUT
+from erasure import get_codec, stripe_cell_lengths
+from chunking import FastCDC
+from upload_journal import UploadJournal
+from metrics import Histogram, render
 
 # Setup logging for the client
 logging.basicConfig(
@@ -15,16 +26,60 @@ logger = logging.getLogger(__name__)
 
 # Base URL for the NameNode API
 namenode_url = "http://namenode:9870"
+DATANODE_PORT = int(os.getenv("DATANODE_PORT", "8000"))
+# How much of a block is read from disk and put on the wire at a time
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", str(1024 * 1024)))
+# Blocks of a single file uploaded at the same time
+MAX_PARALLEL_BLOCKS = int(os.getenv("MAX_PARALLEL_BLOCKS", "4"))
+# Upper bound on block bytes in flight across all files being uploaded
+MAX_INFLIGHT_BYTES = int(os.getenv("MAX_INFLIGHT_BYTES", str(128 * 1024 * 1024)))
+# Attempts per block before the whole file is given up on
+BLOCK_RETRIES = int(os.getenv("BLOCK_RETRIES", "3"))
+BLOCK_RETRY_DELAY_SECONDS = 1
+# Blocks are sent as [chunk][crc32] packets of this many data bytes, DataNodes verify each one
+CHECKSUM_CHUNK_SIZE = int(os.getenv("CHECKSUM_CHUNK_SIZE", str(64 * 1024)))
+CHECKSUM_HEADER = "X-Checksum-Chunk-Size"
+# DataNodes answer HEAD /blocks/{block_id} with the stored block's size in this header
+BLOCK_SIZE_HEADER = "X-Block-Size"
+# Files that still failed after their block retries are reopened and resumed this many times
+UPLOAD_RESUME_ATTEMPTS = int(os.getenv("UPLOAD_RESUME_ATTEMPTS", "2"))
+# Storage policy for uploads: unset/"replicated" for REPLICATION_FACTOR copies, or erasure coding like "RS-6-3"
+STORAGE_POLICY = os.getenv("STORAGE_POLICY")
+# Encoded cells buffered per internal block while a block group streams out
+EC_QUEUE_CELLS = 4
+# Files allocated per POST /files/batch when uploading a directory
+UPLOAD_BATCH_SIZE = int(os.getenv("UPLOAD_BATCH_SIZE", "100"))
+# DEDUP=1 cuts files into content-defined chunks and only sends the chunks the NameNode hasn't seen
+DEDUP = os.getenv("DEDUP", "0") == "1"
+# PACK_SMALL_FILES=1 packs files up to PACK_MAX_FILE_BYTES into shared container blocks instead of a block each
+PACK_SMALL_FILES = os.getenv("PACK_SMALL_FILES", "0") == "1"
+PACK_MAX_FILE_BYTES = int(os.getenv("PACK_MAX_FILE_BYTES", str(1024 * 1024)))
+# Small files per POST /files/pack, the NameNode fills containers from each request separately
+PACK_BATCH_FILES = int(os.getenv("PACK_BATCH_FILES", "10000"))
+
+# Where the time of an upload goes, logged after every run and written here in Prometheus format if set
+CLIENT_METRICS_FILE = os.getenv("CLIENT_METRICS_FILE")
+
+# allocate: NameNode round trips, chunk: FastCDC + fingerprints, read: disk reads + crc32 per block,
+# encode: parity maths per EC block group, send: PUT per block (reads stream inside it, so it includes them)
+phase_seconds = Histogram("client_phase_seconds", "Time spent per upload phase", ("phase",))
+PHASES = ("allocate", "chunk", "read", "encode", "send")
+
+inflight_limiter = InflightBytesLimiter(MAX_INFLIGHT_BYTES)
+datanode_load = DataNodeLoad()
 
 def namenode_healthcheck():
     """Check if the NameNode is reachable and healthy."""
     try:
-        res = requests.get(namenode_url + "/health")
+        res = get_session().get(namenode_url + "/health", timeout=HTTP_TIMEOUT)
         return res.status_code == 200
     except Exception as e:
         logger.error(f"Failed to connect to NameNode: {e}")
         return False
 
+def datanode_block_url(datanode_id, block_id):
+    return f"http://{datanode_id}:{DATANODE_PORT}/blocks/{block_id}"
+
 def scan_directory(directory_path="client_testfiles"):
     if os.path.exists(directory_path):  # Fix this
         files_list = [os.path.join(directory_path, f) for f in os.listdir(directory_path) if f.endswith((".txt",".pdf")) and os.path.isfile(os.path.join(directory_path, f))]
@@ -37,128 +92,836 @@ def scan_directory(directory_path="client_testfiles"):
         logger.error(f"{directory_path} doesn't exist")
         return []  
 
-def send_blocks_to_datanodes(filename, blocks):
-    """Send file blocks directly to assigned DataNodes"""
+def framed_size(size, chunk_size=CHECKSUM_CHUNK_SIZE):
+    """Bytes on the wire for size bytes of block data sent as [chunk][crc32] packets."""
+    return size + 4 * ((size + chunk_size - 1) // chunk_size)
+
+class BlockStream:
+    """
+    File-like view over one block of an open file, framed as [chunk][crc32] packets.
+    requests streams it with a Content-Length header, so only one checksum chunk
+    of the block is held in memory at once instead of the whole block.
+    The crc32 of every chunk is computed here, while reading, so the DataNodes can catch
+    anything that got corrupted between our disk and theirs.
+    """
+    def __init__(self, file, offset, size, chunk_size=CHECKSUM_CHUNK_SIZE):
+        self.file = file
+        self.remaining = size
+        self.chunk_size = chunk_size
+        self.size = framed_size(size, chunk_size)
+        self.pending = memoryview(b"")
+        self.read_seconds = 0.0
+        file.seek(offset)
+
+    def __len__(self):
+        return self.size
+
+    def read(self, amount=-1):
+        if not self.pending:
+            if self.remaining <= 0:
+                return b""
+            started = time.perf_counter()
+            data = self.file.read(min(self.chunk_size, self.remaining))
+            if not data:
+                raise IOError(f"File ended {self.remaining} bytes before the end of the block")
+            self.remaining -= len(data)
+            self.pending = memoryview(data + struct.pack(">I", zlib.crc32(data)))
+            self.read_seconds += time.perf_counter() - started
+        if amount is None or amount < 0 or amount >= len(self.pending):
+            data, self.pending = bytes(self.pending), memoryview(b"")
+        else:
+            # http.client reads 8KB at a time, a memoryview avoids re-copying the rest of the packet
+            data, self.pending = bytes(self.pending[:amount]), self.pending[amount:]
+        return data
+
+class ConcatenatedFiles:
+    """
+    Read-only file over several files back to back, the body of a container block.
+    Each file contributes exactly the size the NameNode packed it with, and read(n) always fills n
+    bytes until the end so BlockStream's checksum chunks line up across file boundaries.
+    """
+    def __init__(self, files):
+        self.files = list(files)  # (path, size) in container order
+        self.index = 0
+        self.current = None
+        self.left = 0
+
+    def seek(self, offset):
+        if offset != 0 or self.index or self.current:
+            raise IOError("ConcatenatedFiles can only be read from the start")
+
+    def read(self, amount):
+        parts = []
+        while amount > 0:
+            if self.left == 0:
+                self.close()
+                if self.index == len(self.files):
+                    break
+                path, self.left = self.files[self.index]
+                self.index += 1
+                self.current = open(path, "rb")
+            data = self.current.read(min(amount, self.left))
+            if not data:
+                raise IOError(f"{self.files[self.index - 1][0]} is shorter than when it was packed")
+            parts.append(data)
+            self.left -= len(data)
+            amount -= len(data)
+        return b"".join(parts)
+
+    def close(self):
+        if self.current:
+            self.current.close()
+            self.current = None
+
+def send_block(filename, block, offset):
+    """
+    Stream one block to its assigned DataNodes through a write pipeline.
+    The block goes over the wire once, to the head DataNode, which forwards it down the
+    rest of the chain while writing it, so replication overlaps with the upload.
+    """
+    # every block gets its own handle so blocks of the same file can be read concurrently
+    with open(filename, 'rb') as file:
+        return put_block(block, file, offset)
+
+def send_container(container):
+    """Stream a container block, its packed small files one after the other, like any other block."""
+    files = ConcatenatedFiles((packed['filename'], packed['size']) for packed in container['files'])
     try:
-        with open(filename, 'rb') as file:
-            for block in blocks:
-                block_id = block['block_id']
-                block_size = block['size'] 
-                assigned_datanodes = block['assigned_datanodes']
-                
-                # Read the exact block_size bytes from file
-                block_data = file.read(block_size)
-                
-                # Sends this block to each assigned DataNode
-                for datanode_id in assigned_datanodes:
-                    url = f"http://{datanode_id}:8000/store_block"
-                    block_b64 = base64.b64encode(block_data).decode()
-                    payload = {
-                               "block_id": block_id,
-                               "block_data": block_b64
-                            }
-                    response = requests.post(url, json=payload, timeout=10)
-                    if response.status_code != 200:
-                        logger.error(f"Failed to send block {block_id} to {datanode_id}")
-                        return False
-                    else:
-                        logger.info(f"Successfully sent block {block_id} to {datanode_id}")
-                    
+        return put_block(container, files, 0)
+    finally:
+        files.close()
+
+def put_block(block, file, offset):
+    """PUT block['size'] bytes of file starting at offset through the block's DataNode pipeline."""
+    block_id = block['block_id']
+    block_size = block['size']
+    pipeline = datanode_load.order_by_load(block['assigned_datanodes'])
+    head = pipeline[0]
+    inflight_limiter.acquire(block_size)
+    try:
+        url = datanode_block_url(head, block_id)
+        headers = {
+            "Content-Type": "application/octet-stream",
+            "X-Replica-Pipeline": ",".join(pipeline[1:]),
+            CHECKSUM_HEADER: str(CHECKSUM_CHUNK_SIZE)
+        }
+        body = BlockStream(file, offset, block_size)
+        with phase_seconds.time("send"):
+            response = get_session().put(url, data=body, headers=headers, timeout=HTTP_TIMEOUT)
+        phase_seconds.observe(body.read_seconds, "read")
+    finally:
+        inflight_limiter.release(block_size)
+        datanode_load.done(head)
+
+    if response.status_code != 200:
+        logger.error(f"Failed to send block {block_id} to {head}: {response.status_code}")
+        return False
+    # every DataNode in the pipeline adds itself to the ack on the way back
+    replicas = response.json().get("replicas", [])
+    missing = [node for node in pipeline if node not in replicas]
+    if missing:
+        logger.error(f"Block {block_id} was not replicated to {missing}")
+        return False
+    logger.info(f"Successfully sent block {block_id} to {replicas}")
+    return True
+
+def send_block_with_retries(filename, block, offset, send=None):
+    """
+    Retry a single block on its own, so one flaky transfer doesn't restart the whole file.
+    send replaces send_block(filename, block, offset) for blocks that aren't a slice of one file.
+    """
+    for attempt in range(1, BLOCK_RETRIES + 1):
+        try:
+            if (send() if send else send_block(filename, block, offset)):
+                return True
+        except Exception as e:
+            logger.error(f"Error sending block {block['block_id']}: {e}")
+        if attempt < BLOCK_RETRIES:
+            logger.info(f"Retrying block {block['block_id']} (attempt {attempt + 1}/{BLOCK_RETRIES})")
+            time.sleep(BLOCK_RETRY_DELAY_SECONDS * attempt)
+    return False
+
+def block_stored(block):
+    """True if every DataNode in the block's pipeline already holds all of it."""
+    for datanode in block['assigned_datanodes']:
+        try:
+            r = get_session().head(datanode_block_url(datanode, block['block_id']), timeout=HTTP_TIMEOUT)
+        except Exception:
+            return False
+        if r.status_code != 200 or r.headers.get(BLOCK_SIZE_HEADER) != str(block['size']):
+            return False
+    return True
+
+def send_journaled_block(filename, block, offset, journal):
+    """
+    send_block_with_retries that records the block in the upload's journal once it is acked.
+    A resumed upload first asks the DataNodes, the block may have made it after all.
+    """
+    if journal and journal.resumed and block_stored(block):
+        sent = True
+    else:
+        sent = send_block_with_retries(filename, block, offset)
+    if sent and journal:
+        journal.block_committed(block['block_id'])
+    return sent
+
+def send_blocks_to_datanodes(filename, blocks, journal=None):
+    """
+    Upload the blocks of one file in parallel, bounded by MAX_PARALLEL_BLOCKS and MAX_INFLIGHT_BYTES.
+    Blocks the journal lists were sent by an earlier attempt and are skipped.
+    """
+    for block in blocks:
+        if not block['assigned_datanodes']:
+            logger.error(f"No DataNodes assigned for block {block['block_id']}")
+            return False
+
+    # blocks come back in file order, so each one starts where the previous one ended
+    pending = []
+    offset = 0
+    for block in blocks:
+        if not journal or block['block_id'] not in journal.committed:
+            pending.append((block, offset))
+        offset += block['size']
+    if len(pending) < len(blocks):
+        logger.info(f"Resuming {filename}: {len(blocks) - len(pending)} of {len(blocks)} blocks were already sent")
+    if not pending:
         return True
-    except Exception as e:
-        logger.error(f"Error sending blocks: {e}")
+
+    with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_BLOCKS, len(pending))) as executor:
+        futures = [executor.submit(send_journaled_block, filename, block, block_offset, journal)
+                   for block, block_offset in pending]
+        results = [future.result() for future in futures]
+
+    if not all(results):
+        logger.error(f"{results.count(False)} of {len(blocks)} blocks of {filename} failed after {BLOCK_RETRIES} attempts")
         return False
+    return True
 
-def upload(filename):
-    # Get block assignments from NameNode (existing code)
-    url = namenode_url + "/files"
+def send_chunks_to_datanodes(filename, blocks):
+    """
+    Dedup upload: send the chunks the NameNode placed, skip the ones it already has.
+    Each chunk carries its offset in the file, a chunk repeated in the file is only placed once.
+    """
+    new_blocks = [block for block in blocks if block['assigned_datanodes']]
+    if not new_blocks:
+        return True
+    with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_BLOCKS, len(new_blocks))) as executor:
+        futures = [executor.submit(send_block_with_retries, filename, block, block['offset']) for block in new_blocks]
+        results = [future.result() for future in futures]
+    if not all(results):
+        logger.error(f"{results.count(False)} of {len(new_blocks)} new chunks of {filename} failed after {BLOCK_RETRIES} attempts")
+        return False
+    return True
+
+class CellStream:
+    """
+    Request body for one internal block of an erasure coded block group.
+    The stripe encoder pushes the block's cells in with put(), read() frames them into
+    [chunk][crc32] packets like BlockStream, so a group is encoded and sent in one pass
+    with only EC_QUEUE_CELLS cells per internal block in memory.
+    """
+    def __init__(self, size, chunk_size=CHECKSUM_CHUNK_SIZE):
+        self.size = framed_size(size, chunk_size)
+        self.chunk_size = chunk_size
+        self.cells = queue.Queue(maxsize=EC_QUEUE_CELLS)
+        self.buffer = bytearray()
+        self.pending = memoryview(b"")
+        self.ended = False
+        self.aborted = False
+
+    def __len__(self):
+        return self.size
+
+    def put(self, cell):
+        """Queue a cell (None ends the block), gives up once the group is aborted."""
+        while not self.aborted:
+            try:
+                self.cells.put(cell, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def abort(self):
+        self.aborted = True
+
+    def _next_packet(self):
+        while len(self.buffer) < self.chunk_size and not self.ended:
+            try:
+                cell = self.cells.get(timeout=0.5)
+            except queue.Empty:
+                if self.aborted:
+                    raise IOError("Block group upload was aborted")
+                continue
+            if cell is None:
+                self.ended = True
+            else:
+                self.buffer += cell
+        data = bytes(self.buffer[:self.chunk_size])
+        del self.buffer[:self.chunk_size]
+        return data + struct.pack(">I", zlib.crc32(data)) if data else b""
+
+    def read(self, amount=-1):
+        if not self.pending:
+            self.pending = memoryview(self._next_packet())
+            if not self.pending:
+                return b""
+        if amount is None or amount < 0 or amount >= len(self.pending):
+            data, self.pending = bytes(self.pending), memoryview(b"")
+        else:
+            data, self.pending = bytes(self.pending[:amount]), self.pending[amount:]
+        return data
+
+def encode_block_group(filename, group, layout, streams):
+    """Read a block group stripe by stripe, compute its parity cells and feed every cell to its internal block."""
+    data_units, cell_size = layout["data_units"], layout["cell_size"]
+    codec = get_codec(data_units, layout["parity_units"])
+    stripe_size = data_units * cell_size
+    read_seconds, encode_seconds = 0.0, 0.0
+    with open(filename, "rb") as file:
+        file.seek(group["offset"])
+        for stripe_start in range(0, group["size"], stripe_size):
+            started = time.perf_counter()
+            stripe = file.read(min(stripe_size, group["size"] - stripe_start))
+            read_seconds += time.perf_counter() - started
+            lengths = stripe_cell_lengths(len(stripe), data_units, cell_size)
+            # short cells of the last stripe are zero padded for the maths, only their real bytes are stored
+            cells = np.zeros((data_units, lengths[0]), dtype=np.uint8)
+            for unit, length in enumerate(lengths):
+                if length:
+                    cell = stripe[unit * cell_size:unit * cell_size + length]
+                    cells[unit, :length] = np.frombuffer(cell, dtype=np.uint8)
+                    streams[unit].put(cell)
+            started = time.perf_counter()
+            parities = codec.encode(cells)
+            encode_seconds += time.perf_counter() - started
+            for parity_unit, parity in enumerate(parities):
+                streams[data_units + parity_unit].put(parity.tobytes())
+    for stream in streams:
+        stream.put(None)
+    phase_seconds.observe(read_seconds, "read")
+    phase_seconds.observe(encode_seconds, "encode")
+
+def send_internal_block(block, stream, streams):
+    """PUT one internal block to its DataNode, tearing the whole group down if it fails."""
+    node = block['assigned_datanodes'][0]
+    try:
+        headers = {"Content-Type": "application/octet-stream", CHECKSUM_HEADER: str(CHECKSUM_CHUNK_SIZE)}
+        with phase_seconds.time("send"):
+            response = get_session().put(datanode_block_url(node, block['block_id']), data=stream,
+                                         headers=headers, timeout=HTTP_TIMEOUT)
+        if response.status_code == 200:
+            return True
+        logger.error(f"Failed to send internal block {block['block_id']} to {node}: {response.status_code}")
+    except Exception as e:
+        logger.error(f"Error sending internal block {block['block_id']} to {node}: {e}")
+    for other in streams:
+        other.abort()
+    return False
+
+def send_block_group(filename, group, layout):
+    """Encode one block group and stream its data and parity blocks to their DataNodes at the same time."""
+    blocks = group['blocks']
+    streams = [CellStream(block['size']) for block in blocks]
+    inflight_limiter.acquire(group['size'])
+    try:
+        with ThreadPoolExecutor(max_workers=len(blocks)) as executor:
+            futures = [executor.submit(send_internal_block, block, stream, streams) for block, stream in zip(blocks, streams)]
+            try:
+                encode_block_group(filename, group, layout, streams)
+            except Exception as e:
+                logger.error(f"Error encoding block group at offset {group['offset']} of {filename}: {e}")
+                for stream in streams:
+                    stream.abort()
+            results = [future.result() for future in futures]
+    finally:
+        inflight_limiter.release(group['size'])
+    return all(results) and not any(stream.aborted for stream in streams)
+
+def send_block_groups_to_datanodes(filename, layout):
+    """Upload an erasure coded file group by group, each group is retried as a whole."""
+    for group in layout['block_groups']:
+        for attempt in range(1, BLOCK_RETRIES + 1):
+            if send_block_group(filename, group, layout):
+                logger.info(f"Sent block group at offset {group['offset']} of {filename} ({layout['storage_policy']})")
+                break
+            if attempt < BLOCK_RETRIES:
+                logger.info(f"Retrying block group at offset {group['offset']} (attempt {attempt + 1}/{BLOCK_RETRIES})")
+                time.sleep(BLOCK_RETRY_DELAY_SECONDS * attempt)
+        else:
+            return False
+    return True
+
+def upload_request(filename, storage_policy=STORAGE_POLICY, dedup=DEDUP):
+    """The POST /files body for one file, also one entry of a POST /files/batch."""
     file_size = os.path.getsize(filename)
     payload = {"filename": filename, "filesize_bytes": file_size}
-    
+    if storage_policy:
+        payload["storage_policy"] = storage_policy
+    if dedup and file_size > 0:
+        # the NameNode answers with the chunks it hasn't got, those are the only ones we send
+        with phase_seconds.time("chunk"):
+            payload["chunks"] = [{"fingerprint": fingerprint, "size": size}
+                                 for _, size, fingerprint in FastCDC().chunk_file(filename)]
+    return payload
+
+def send_file(filename, assignments, journal=None):
+    """
+    Send a file's data where the NameNode's allocation says, returns False if any of it failed.
+    journal (replicated uploads only) skips blocks an earlier attempt sent and is closed once the file made it.
+    """
+    blocks = assignments.get("blocks", [])
+    if assignments.get("block_groups"):
+        if not send_block_groups_to_datanodes(filename, assignments):
+            logger.error(f"Failed to upload block groups for {filename}")
+            return False
+    elif assignments.get("dedup"):
+        if not send_chunks_to_datanodes(filename, blocks):
+            logger.error(f"Failed to upload chunks for {filename}")
+            return False
+        summary = assignments["dedup"]
+        logger.info(f"{filename}: sent {summary['new_chunks']} of {summary['chunks']} chunks, "
+                    f"{summary['duplicate_bytes']:,} bytes were already stored")
+    elif blocks:
+        success = send_blocks_to_datanodes(filename, blocks, journal)
+        if not success:
+            logger.error(f"Failed to upload blocks for {filename}")
+            return False
+    if journal:
+        journal.finish()
+    return True
+
+def resumable(storage_policy=STORAGE_POLICY, dedup=DEDUP):
+    """Only plain replicated uploads keep a journal, dedup already skips what's stored and EC groups are sent whole."""
+    return not storage_policy and not dedup
+
+def start_journal(filename, assignments):
+    # a single block has nothing to skip on a resume, only keep those in memory for this run's retries
+    return UploadJournal.start(filename, persist=len(assignments.get("blocks", [])) > 1)
+
+def reopen_upload(filename, journal):
+    """POST /files/reopen: the allocation of an upload that failed partway, with the blocks the journal lists as sent."""
+    payload = {"filename": filename, "filesize_bytes": os.path.getsize(filename), "sent_blocks": sorted(journal.committed)}
+    with phase_seconds.time("allocate"):
+        return get_session().post(namenode_url + "/files/reopen", json=payload, timeout=HTTP_TIMEOUT)
+
+def resume_upload(filename, journal):
+    """
+    Finish an upload that failed partway with the block ids it was allocated, sending only the blocks
+    its journal doesn't list. Returns the allocation, None if it failed again.
+    """
+    try:
+        r = reopen_upload(filename, journal)
+        if r.status_code != 200:
+            logger.error(f"Could not reopen {filename}: {r.status_code} {r.text}")
+            if r.status_code in (400, 404):
+                # the NameNode can't resume it, the next run uploads the file from scratch
+                journal.finish()
+            return None
+        allocation = r.json()
+        journal.resumed = True
+        return allocation if send_file(filename, allocation, journal) else None
+    except Exception as e:
+        logger.error(f"Resuming {filename} failed with exception: {e}")
+        return None
+
+def upload(filename, storage_policy=STORAGE_POLICY, dedup=DEDUP):
+    # Get block assignments from NameNode (existing code)
+    url = namenode_url + "/files"
     try:
-        r = requests.post(url, json=payload)
+        journal = UploadJournal.load(filename) if resumable(storage_policy, dedup) else None
+        if journal:
+            # an earlier run died partway through this file, pick up where it stopped
+            r = reopen_upload(filename, journal)
+            if r.status_code == 200:
+                return r if send_file(filename, r.json(), journal) else None
+            logger.warning(f"Could not resume {filename} ({r.status_code}), uploading it from scratch")
+        payload = upload_request(filename, storage_policy, dedup)
+        with phase_seconds.time("allocate"):
+            r = get_session().post(url, json=payload, timeout=HTTP_TIMEOUT)
         if r.status_code != 200:
             return r
-            
         assignments = r.json()
-        blocks = assignments.get("blocks", [])
-        
-        if blocks:
-            success = send_blocks_to_datanodes(filename, blocks)
-            if not success:
-                logger.error(f"Failed to upload blocks for {filename}")
-                return None
-        
+        journal = start_journal(filename, assignments) if resumable(storage_policy, dedup) else None
+        if not send_file(filename, assignments, journal):
+            return None
         return r
         
     except Exception as e:
         logger.error(f"Upload error: {e}")
         return None
 
+def allocate_batch(files, storage_policy=STORAGE_POLICY, dedup=DEDUP):
+    """
+    Allocate blocks for several files with one POST /files/batch.
+    Returns {filename: allocation} for the files the NameNode could place (the others are logged),
+    or None if the whole request failed.
+    """
+    payload = {"files": [upload_request(filename, storage_policy, dedup) for filename in files]}
+    with phase_seconds.time("allocate"):
+        r = get_session().post(namenode_url + "/files/batch", json=payload, timeout=HTTP_TIMEOUT)
+    if r.status_code != 200:
+        logger.error(f"Batch allocation of {len(files)} files failed: {r.status_code} {r.text}")
+        return None
+    allocations = {}
+    for result in r.json()["files"]:
+        if "error" in result:
+            logger.error(f"NameNode could not allocate {result['filename']}: {result['error']}")
+        else:
+            allocations[result["filename"]] = result
+    return allocations
+
+def allocate_containers(files):
+    """
+    Pack small files into container blocks with one POST /files/pack.
+    Returns the containers (each lists the files inside it) with the files the NameNode refused
+    logged, or None if the whole request failed.
+    """
+    payload = {"files": [{"filename": filename, "filesize_bytes": os.path.getsize(filename)} for filename in files]}
+    with phase_seconds.time("allocate"):
+        r = get_session().post(namenode_url + "/files/pack", json=payload, timeout=HTTP_TIMEOUT)
+    if r.status_code != 200:
+        logger.error(f"Packing {len(files)} files failed: {r.status_code} {r.text}")
+        return None
+    packing = r.json()
+    for error in packing["errors"]:
+        logger.error(f"NameNode could not pack {error['filename']}: {error['error']}")
+    return packing["containers"]
+
+def send_container_with_retries(container):
+    return send_block_with_retries(container['block_id'], container, 0, lambda: send_container(container))
+
+def packed_allocation(container, packed):
+    """What display_upload_result shows for a packed file: its slice of the container block."""
+    return {"blocks": [{"block_id": container['block_id'], "offset": 0, "size": packed['size'],
+                        "container_offset": packed['offset'],
+                        "assigned_datanodes": container['assigned_datanodes']}]}
+
+def packable(filename):
+    """True if filename is small enough to pack. Files we can't stat stay on the normal path, which fails them one by one."""
+    try:
+        return 0 < os.path.getsize(filename) <= PACK_MAX_FILE_BYTES
+    except OSError:
+        return False
+
 def upload_multiple_files(files_list, max_concurrent=5):
+    """
+    Upload many files: they are allocated UPLOAD_BATCH_SIZE at a time with one NameNode round trip
+    per batch, and their blocks are sent by max_concurrent upload threads meanwhile.
+    With PACK_SMALL_FILES the small ones are packed into container blocks first and a container is sent
+    as one block. If it fails, its files are uploaded again one by one so only the bad file is lost.
+    Replicated files keep a journal of their sent blocks: files an earlier run left half uploaded are
+    resumed instead of allocated again, and files that fail are resumed up to UPLOAD_RESUME_ATTEMPTS times.
+    Files the NameNode didn't allocate (the request failed or it refused them) and files of failed containers
+    are allocated once more on their own.
+    """
     if not files_list:
         logger.info("No files to upload")
         return
     logger.info(f"Starting concurrent upload of {len(files_list)} files (max {max_concurrent} at once)")
 
-    failed_files=[] # This is to retry the upload again on case of failure
+    failed_files=[]
+    unallocated=[] # failed before any block was sent or in a failed container, these get uploaded again from scratch
     successful_uploads=[]
+    small_files = []
+    if PACK_SMALL_FILES and not STORAGE_POLICY and not DEDUP:
+        small_files = [filename for filename in files_list if packable(filename)]
+        packed = set(small_files)
+        files_list = [filename for filename in files_list if filename not in packed]
     with ThreadPoolExecutor(max_workers=max_concurrent) as executor:
-        #Dictionary which maps the file being uploaded to it's file name
-        future_to_file = {executor.submit(upload, file): file for file in files_list}
+        #Dictionary which maps the file being uploaded to it's file name and allocation
+        future_to_file = {}
+        # containers map to every (filename, allocation) inside them
+        future_to_container = {}
+        journals = {}
+        for start in range(0, len(small_files), PACK_BATCH_FILES):
+            batch = small_files[start:start + PACK_BATCH_FILES]
+            try:
+                containers = allocate_containers(batch)
+            except Exception as e:
+                logger.error(f"Packing {len(batch)} files failed with exception: {e}")
+                containers = None
+            if containers is None:
+                unallocated.extend(batch)
+                continue
+            packed = set()
+            for container in containers:
+                future = executor.submit(send_container_with_retries, container)
+                future_to_container[future] = [(packed_file['filename'], packed_allocation(container, packed_file))
+                                               for packed_file in container['files']]
+                packed.update(packed_file['filename'] for packed_file in container['files'])
+            unallocated.extend(filename for filename in batch if filename not in packed)
+
+        for start in range(0, len(files_list), UPLOAD_BATCH_SIZE):
+            batch = files_list[start:start + UPLOAD_BATCH_SIZE]
+            if resumable():
+                for filename in batch:
+                    journal = UploadJournal.load(filename)
+                    if journal:
+                        journals[filename] = journal
+                        future = executor.submit(resume_upload, filename, journal)
+                        future_to_file[future] = (filename, None)
+                batch = [filename for filename in batch if filename not in journals]
+                if not batch:
+                    continue
+            try:
+                allocations = allocate_batch(batch)
+            except Exception as e:
+                logger.error(f"Batch allocation of {len(batch)} files failed with exception: {e}")
+                allocations = None
+            if allocations is None:
+                unallocated.extend(batch)
+                continue
+            # this batch uploads in the background while the next one is being allocated
+            for filename in batch:
+                if filename in allocations:
+                    if resumable():
+                        journals[filename] = start_journal(filename, allocations[filename])
+                    future = executor.submit(send_file, filename, allocations[filename], journals.get(filename))
+                    future_to_file[future] = (filename, allocations[filename])
+                else:
+                    unallocated.append(filename)
+
+        for future in as_completed(future_to_container):
+            packed_files = future_to_container[future]
+            try:
+                sent = future.result()
+            except Exception as e:
+                logger.error(f"Container with {len(packed_files)} files failed with exception: {e}")
+                sent = False
+            if sent:
+                logger.info(f"{len(packed_files)} packed files uploaded successfully")
+                successful_uploads.extend(packed_files)
+            else:
+                # one unreadable file fails the whole container, send them on their own so it only fails itself
+                logger.error(f"Container with {len(packed_files)} files failed to upload, retrying them one by one")
+                unallocated.extend(filename for filename, _ in packed_files)
 
          # Process results as they complete
         for future in as_completed(future_to_file):
-            filename = future_to_file[future] #get's da filename from the key
+            filename, allocation = future_to_file[future] #get's da filename from the key
             try:
-                response = future.result()
-                if response and response.status_code == 200:
+                result = future.result()
+                if result:
                     logger.info(f"{filename} uploaded successfully")
-                    successful_uploads.append((filename, response))
+                    # resumed files only learn their allocation when they are reopened
+                    successful_uploads.append((filename, allocation or result))
                 else:
                     #This is to catch errors which occurred after the upload began
                     logger.error(f"{filename} upload failed")
                     failed_files.append(filename)
 
             except Exception as e:
-                #errors before uploading
                 logger.error(f"{filename} failed with exception: {e}")
                 failed_files.append(filename)
 
-    #Failed upload handler
-    if failed_files:
-        logger.info(f"Retrying {len(failed_files)} failed files after 2 second delay...")
-        time.sleep(2)  
-    
+    # Blocks are already retried one by one inside send_blocks_to_datanodes, so a failed file here has
+    # exhausted its block retries. It is reopened with the block ids it has and only its unsent blocks go again
+    for attempt in range(1, UPLOAD_RESUME_ATTEMPTS + 1):
+        retry = [filename for filename in failed_files if filename in journals]
+        if not retry:
+            break
+        logger.info(f"Resuming {len(retry)} failed uploads (attempt {attempt}/{UPLOAD_RESUME_ATTEMPTS})")
+        time.sleep(BLOCK_RETRY_DELAY_SECONDS * attempt)
         with ThreadPoolExecutor(max_workers=max_concurrent) as executor:
-            future_to_file = {executor.submit(upload, file): file for file in failed_files}
-        
-            for future in as_completed(future_to_file):
-                filename = future_to_file[future]
-                try:
-                    response = future.result()
-                    if response and response.status_code == 200:
-                        logger.info(f"{filename} retry successful")
-                        successful_uploads.append((filename,response))
-                    else:
-                        logger.error(f"{filename} retry failed - giving up")
-                except Exception as e:
-                    logger.error(f"{filename} retry failed with exception: {e}") 
+            results = dict(zip(retry, executor.map(lambda filename: resume_upload(filename, journals[filename]), retry)))
+        failed_files = [filename for filename in failed_files if not results.get(filename)]
+        successful_uploads.extend((filename, results[filename]) for filename in retry if results[filename])
+
+    #Failed allocation handler, like the old per file retry pass but only for files nothing was sent for yet
+    if unallocated:
+        logger.info(f"Retrying {len(unallocated)} unallocated or packed files on their own after 2 second delay...")
+        time.sleep(2)
+        with ThreadPoolExecutor(max_workers=max_concurrent) as executor:
+            responses = dict(zip(unallocated, executor.map(upload, unallocated)))
+        for filename in unallocated:
+            response = responses[filename]
+            if response is not None and response.status_code == 200:
+                logger.info(f"{filename} retry successful")
+                successful_uploads.append((filename, response.json()))
+            else:
+                logger.error(f"{filename} retry failed - giving up")
+                failed_files.append(filename)
+
+    if failed_files:
+        logger.error(f"{len(failed_files)} files failed to upload: {failed_files}")
+    log_connection_stats(logger)
+    log_phase_timings()
     if successful_uploads:
         logger.info(f"\nDisplaying block information for {len(successful_uploads)} successful uploads:")
-        for filename, response in successful_uploads:
+        for filename, allocation in successful_uploads:
             print(f"\n--- Results for {filename} ---")
-            display_upload_result(response)   
+            display_upload_result(allocation)   
 
-def display_upload_result(response):
-    # This function is purely for aesthetics  
-    print(f"Raw response: {response.text}")
+def fetch_block(fd, block):
+    """
+    Read one block into its place in the output file, trying the least busy replica first.
+    If a replica dies mid-transfer the next one is asked with a Range header for the bytes
+    we are still missing, so nothing already written is downloaded twice.
+    A packed file is a slice of a container block starting at container_offset, that is a Range too.
+    """
+    block_id = block['block_id']
+    replicas = datanode_load.order_by_load(block['locations'])
+    packed = block.get('container_offset') is not None
+    base = block['container_offset'] if packed else 0
+    received = 0
     try:
-        data = response.json()
-        blocks = data.get("blocks", [])
+        for datanode_id in replicas:
+            ranged = packed or received > 0
+            headers = {"Range": f"bytes={base + received}-{base + block['size'] - 1}"} if ranged else {}
+            try:
+                with get_session().get(datanode_block_url(datanode_id, block_id), headers=headers,
+                                       stream=True, timeout=HTTP_TIMEOUT) as response:
+                    if response.status_code not in (200, 206) or (ranged and response.status_code != 206):
+                        logger.error(f"{datanode_id} could not serve block {block_id}: {response.status_code}")
+                        continue
+                    for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                        os.pwrite(fd, chunk, block['offset'] + received)
+                        received += len(chunk)
+                if received == block['size']:
+                    logger.info(f"Fetched block {block_id} from {datanode_id}")
+                    return True
+                logger.error(f"Short read of block {block_id} from {datanode_id}: {received}/{block['size']} bytes")
+            except Exception as e:
+                logger.error(f"Error reading block {block_id} from {datanode_id}: {e}")
+        return False
+    finally:
+        datanode_load.done(replicas[0])
+
+def fetch_internal_blocks(blocks, directory):
+    """Fetch internal blocks in parallel into temp files, returns {index: file} for the ones that could be read."""
+    def fetch(block):
+        temp = tempfile.TemporaryFile(dir=directory)
+        if fetch_block(temp.fileno(), {**block, 'offset': 0}):
+            return block['index'], temp
+        temp.close()
+        return block['index'], None
+    readable = [block for block in blocks if block['locations']]
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_PARALLEL_BLOCKS, len(readable)))) as executor:
+        return {index: temp for index, temp in executor.map(fetch, readable) if temp is not None}
+
+def fetch_block_group(fd, group, layout, directory):
+    """
+    Read one erasure coded block group into its place in the output file.
+    The data blocks are fetched first, parity blocks only if some data block can't be read.
+    Stripes with a missing data cell are decoded from any data_units cells that did arrive.
+    """
+    data_units, parity_units, cell_size = layout['data_units'], layout['parity_units'], layout['cell_size']
+    blocks = sorted(group['blocks'], key=lambda block: block['index'])
+    fetched = fetch_internal_blocks(blocks[:data_units], directory)
+    try:
+        missing = [index for index in range(data_units) if index not in fetched]
+        if missing:
+            logger.warning(f"Data blocks {missing} of the group at offset {group['offset']} are unreadable, decoding from parity")
+            fetched.update(fetch_internal_blocks(blocks[data_units:], directory))
+            if len(fetched) < data_units:
+                logger.error(f"Only {len(fetched)} of the {data_units} blocks needed for the group at offset {group['offset']} are readable")
+                return False
+        codec = get_codec(data_units, parity_units)
+        stripe_size = data_units * cell_size
+        for stripe_number, stripe_start in enumerate(range(0, group['size'], stripe_size)):
+            lengths = stripe_cell_lengths(min(stripe_size, group['size'] - stripe_start), data_units, cell_size)
+            cell_offset = stripe_number * cell_size
+            if missing:
+                cells = {}
+                for index in sorted(fetched)[:data_units]:
+                    cell = os.pread(fetched[index].fileno(), lengths[index] if index < data_units else lengths[0], cell_offset)
+                    padded = np.zeros(lengths[0], dtype=np.uint8)
+                    padded[:len(cell)] = np.frombuffer(cell, dtype=np.uint8)
+                    cells[index] = padded
+                data = codec.decode(cells, lengths[0])
+                stripe_cells = [data[unit, :length].tobytes() for unit, length in enumerate(lengths)]
+            else:
+                stripe_cells = [os.pread(fetched[unit].fileno(), length, cell_offset) for unit, length in enumerate(lengths)]
+            for unit, cell in enumerate(stripe_cells):
+                os.pwrite(fd, cell, group['offset'] + stripe_start + unit * cell_size)
+        return True
+    finally:
+        for temp in fetched.values():
+            temp.close()
+
+def download(filename, output_path):
+    """
+    Download a file by fetching its blocks from the DataNodes in parallel.
+    Blocks are written at their offsets with pwrite into a .part file that is renamed once complete.
+    """
+    try:
+        r = get_session().get(f"{namenode_url}/files/{quote(filename)}", timeout=HTTP_TIMEOUT)
+        if r.status_code != 200:
+            logger.error(f"NameNode lookup of {filename} failed: {r.status_code} {r.text}")
+            return False
+        file_info = r.json()
+        if file_info.get("block_groups"):
+            return download_block_groups(filename, output_path, file_info)
+        blocks = file_info.get("blocks", [])
+        for block in blocks:
+            if not block['locations']:
+                logger.error(f"Block {block['block_id']} of {filename} has no replicas")
+                return False
+
+        temp_path = output_path + ".part"
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, file_info["filesize"])
+            with ThreadPoolExecutor(max_workers=max(1, min(MAX_PARALLEL_BLOCKS, len(blocks)))) as executor:
+                results = list(executor.map(lambda block: fetch_block(fd, block), blocks))
+        finally:
+            os.close(fd)
+
+        if not all(results):
+            logger.error(f"{results.count(False)} of {len(blocks)} blocks of {filename} could not be read from any replica")
+            os.remove(temp_path)
+            return False
+        os.replace(temp_path, output_path)
+        logger.info(f"Downloaded {filename} to {output_path} ({file_info['filesize']:,} bytes)")
+        return True
+    except Exception as e:
+        logger.error(f"Download error: {e}")
+        return False
+
+def download_block_groups(filename, output_path, file_info):
+    """download() for erasure coded files, one block group at a time (each fetches its blocks in parallel)."""
+    temp_path = output_path + ".part"
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.ftruncate(fd, file_info["filesize"])
+        directory = os.path.dirname(os.path.abspath(output_path))
+        ok = all(fetch_block_group(fd, group, file_info, directory) for group in file_info["block_groups"])
+    finally:
+        os.close(fd)
+    if not ok:
+        logger.error(f"{filename} could not be reconstructed")
+        os.remove(temp_path)
+        return False
+    os.replace(temp_path, output_path)
+    logger.info(f"Downloaded {filename} to {output_path} ({file_info['filesize']:,} bytes, {file_info['storage_policy']})")
+    return True
+
+def log_phase_timings():
+    """Log where the upload time went and, with CLIENT_METRICS_FILE, leave it for a Prometheus textfile collector."""
+    for phase in PHASES:
+        count, seconds = phase_seconds.snapshot(phase)
+        if count:
+            logger.info(f"{phase}: {seconds:.3f}s over {count} calls ({seconds / count * 1000:.2f}ms each)")
+    if CLIENT_METRICS_FILE:
+        temp_path = CLIENT_METRICS_FILE + ".tmp"
+        with open(temp_path, "w") as f:
+            f.write(render())
+        os.replace(temp_path, CLIENT_METRICS_FILE)
+
+def display_upload_result(data):
+    # This function is purely for aesthetics, data is the NameNode's allocation for one file
+    print(f"Raw response: {json.dumps(data)}")
+    try:
+        # erasure coded uploads list their data and parity blocks group by group
+        blocks = data.get("blocks") or [block for group in data.get("block_groups", []) for block in group["blocks"]]
         print("\n" + "="*80)
         print("FILE UPLOAD RESULT")
         print("="*80)
+        if data.get("storage_policy"):
+            print(f"Storage policy: {data['storage_policy']} (sizes below include parity blocks)")
+        if data.get("dedup"):
+            print(f"Dedup: {data['dedup']['new_chunks']} of {data['dedup']['chunks']} chunks were new "
+                  f"(chunks without DataNodes were already stored)")
         if blocks:
             total_size = sum(block["size"] for block in blocks)
             print(f"Total file size: {total_size:,} bytes ({total_size / 1024 / 1024:.1f} MB)")
@@ -181,14 +944,17 @@ def display_upload_result(response):
         print("="*80)
     except Exception as e:
         logger.error(f"Error parsing response: {e}")
-        print(f"Raw response: {response.text}")
 
 if __name__ == "__main__":
     logger.info("Starting client...")
-    files = scan_directory()
-    print(files)  
-    if namenode_healthcheck():
+    if not namenode_healthcheck():
+        logger.error("NameNode is not reachable")
+    elif len(sys.argv) == 4 and sys.argv[1] == "download":
+        # python client.py download <filename in HaHa-Dope> <local output path>
         logger.info("NameNode is healthy!")
-        upload_multiple_files(files)  
+        download(sys.argv[2], sys.argv[3])
     else:
-        logger.error("NameNode is not reachable")
+        files = scan_directory()
+        print(files)  
+        logger.info("NameNode is healthy!")
+        upload_multiple_files(files)  
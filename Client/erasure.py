@@ -0,0 +1,133 @@
+from functools import lru_cache
+
+import numpy as np
+
+# GF(256) with the usual Reed-Solomon polynomial x^8 + x^4 + x^3 + x^2 + 1, generator 2
+GF_POLYNOMIAL = 0x11d
+
+
+def _build_tables():
+    exp = np.zeros(512, dtype=np.uint8)
+    log = np.zeros(256, dtype=np.int32)
+    value = 1
+    for power in range(255):
+        exp[power] = value
+        log[value] = power
+        value <<= 1
+        if value & 0x100:
+            value ^= GF_POLYNOMIAL
+    exp[255:510] = exp[:255]
+    # full 256 x 256 product table (64KB), MUL[a] is the "multiply by a" lookup table
+    a = np.arange(256)
+    mul = exp[(log[a][:, None] + log[a][None, :]) % 255]
+    mul[0, :] = 0
+    mul[:, 0] = 0
+    return exp, log, mul.astype(np.uint8)
+
+
+EXP, LOG, MUL = _build_tables()
+# the same rows as bytes.translate tables, translate runs a 256-entry lookup over a whole cell in C
+# without the intp index copy np.take makes, about twice as fast
+MUL_TABLES = [MUL[coefficient].tobytes() for coefficient in range(256)]
+
+
+def gf_mul(a, b):
+    return int(MUL[a, b])
+
+
+def gf_inv(a):
+    if a == 0:
+        raise ZeroDivisionError("0 has no inverse in GF(256)")
+    return int(EXP[255 - LOG[a]])
+
+
+def gf_invert_matrix(matrix):
+    """Gauss-Jordan inverse of a small square matrix over GF(256), rows are lists of ints."""
+    size = len(matrix)
+    work = [list(row) + [int(col == row_index) for col in range(size)] for row_index, row in enumerate(matrix)]
+    for col in range(size):
+        pivot = next((row for row in range(col, size) if work[row][col]), None)
+        if pivot is None:
+            raise ValueError("Matrix is singular")
+        work[col], work[pivot] = work[pivot], work[col]
+        scale = gf_inv(work[col][col])
+        work[col] = [gf_mul(scale, value) for value in work[col]]
+        for row in range(size):
+            factor = work[row][col]
+            if row != col and factor:
+                work[row] = [value ^ gf_mul(factor, pivot_value) for value, pivot_value in zip(work[row], work[col])]
+    return [row[size:] for row in work]
+
+
+class ReedSolomon:
+    """
+    Systematic RS(k, m) erasure code over GF(256).
+    The k data cells are stored as is, the m parity cells come from a Cauchy matrix, so any k of
+    the k + m cells of a stripe are enough to get the data back. Cells are numpy uint8 arrays,
+    every multiply is a table lookup over the whole cell and the sums are numpy xors, so the
+    Python loop is only over the k x m coefficients, never over bytes.
+    """
+    def __init__(self, data_units, parity_units):
+        if data_units + parity_units > 256:
+            raise ValueError("RS over GF(256) supports at most 256 cells per stripe")
+        self.data_units = data_units
+        self.parity_units = parity_units
+        # Cauchy rows 1 / (x_j + y_i) with x_j = k + j and y_i = i, every square submatrix is invertible
+        self.parity_matrix = [[gf_inv((data_units + j) ^ i) for i in range(data_units)] for j in range(parity_units)]
+        identity = [[int(i == j) for j in range(data_units)] for i in range(data_units)]
+        self.encode_matrix = identity + self.parity_matrix
+
+    @staticmethod
+    def _combine(coefficients, cells, out):
+        """out = sum of coefficient * cell over GF(256), addition is xor. cells are bytes."""
+        out[:] = 0
+        for coefficient, cell in zip(coefficients, cells):
+            if coefficient == 0:
+                continue
+            if coefficient != 1:
+                cell = cell.translate(MUL_TABLES[coefficient])
+            np.bitwise_xor(out, np.frombuffer(cell, dtype=np.uint8), out=out)
+        return out
+
+    def encode(self, data):
+        """data is a (k, cell_length) uint8 array, returns the (m, cell_length) parity cells."""
+        parity = np.empty((self.parity_units, data.shape[1]), dtype=np.uint8)
+        cells = [row.tobytes() for row in data]
+        for j, coefficients in enumerate(self.parity_matrix):
+            self._combine(coefficients, cells, parity[j])
+        return parity
+
+    @lru_cache(maxsize=64)
+    def _decode_matrix(self, indexes):
+        return gf_invert_matrix([self.encode_matrix[index] for index in indexes])
+
+    def decode(self, cells, cell_length):
+        """
+        Rebuild the data cells of a stripe from any k surviving cells.
+        cells maps cell index (0..k-1 data, k.. parity) to a uint8 array of cell_length bytes.
+        Returns a (k, cell_length) array of the data cells.
+        """
+        if len(cells) < self.data_units:
+            raise ValueError(f"Need {self.data_units} cells to decode, only {len(cells)} survived")
+        indexes = tuple(sorted(cells)[:self.data_units])
+        data = np.empty((self.data_units, cell_length), dtype=np.uint8)
+        missing = [i for i in range(self.data_units) if i not in cells]
+        for i in range(self.data_units):
+            if i in cells:
+                data[i] = cells[i]
+        if missing:
+            inverse = self._decode_matrix(indexes)
+            available = [np.ascontiguousarray(cells[index], dtype=np.uint8).tobytes() for index in indexes]
+            for i in missing:
+                self._combine(inverse[i], available, data[i])
+        return data
+
+
+@lru_cache(maxsize=None)
+def get_codec(data_units, parity_units):
+    return ReedSolomon(data_units, parity_units)
+
+
+def stripe_cell_lengths(stripe_length, data_units, cell_size):
+    """Bytes of each data cell in a stripe, only the last stripe of a group can have short or empty cells."""
+    return [max(0, min(cell_size, stripe_length - i * cell_size)) for i in range(data_units)]
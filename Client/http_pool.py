@@ -0,0 +1,67 @@
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Number of distinct hosts (NameNode + DataNodes) that keep their own connection pool
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "32"))
+# Keep-alive connections kept open per host, should cover files * blocks uploading at once
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "32"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+# (connect, read) tuple that every client call passes to requests
+HTTP_TIMEOUT = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Shared requests.Session for every call the client makes.
+    urllib3 keeps one thread-safe pool per host underneath it, so the upload threads reuse
+    keep-alive connections to the NameNode and DataNodes instead of handshaking per block.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+def connection_stats():
+    """Requests sent and new TCP connections opened per host, read from urllib3's pools."""
+    stats = {}
+    pools = get_session().get_adapter("http://").poolmanager.pools
+    for key in pools.keys():
+        try:
+            pool = pools[key]
+        except KeyError:
+            continue  # evicted between keys() and the lookup
+        host = f"{pool.host}:{pool.port}"
+        requests_sent = pool.num_requests
+        new_connections = pool.num_connections
+        stats[host] = {
+            "requests": requests_sent,
+            "new_connections": new_connections,
+            "reuse_rate": (requests_sent - new_connections) / requests_sent if requests_sent else 0.0
+        }
+    return stats
+
+
+def log_connection_stats(logger):
+    stats = connection_stats()
+    total_requests = sum(host["requests"] for host in stats.values())
+    total_connections = sum(host["new_connections"] for host in stats.values())
+    for host, host_stats in sorted(stats.items()):
+        logger.info(f"{host}: {host_stats['requests']} requests over {host_stats['new_connections']} connections "
+                    f"({host_stats['reuse_rate']:.1%} reused)")
+    if total_requests:
+        logger.info(f"Connection reuse: {total_requests - total_connections}/{total_requests} requests "
+                    f"({(total_requests - total_connections) / total_requests:.1%}) skipped the TCP handshake")
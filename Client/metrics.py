@@ -0,0 +1,144 @@
+import bisect
+import functools
+import threading
+import time
+
+# Prometheus text exposition format, served as is by GET /metrics
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds, from a sub-millisecond fsync to a slow multi-GB block
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Bytes per second of a single transfer, 1MB/s to 2GB/s
+THROUGHPUT_BUCKETS = tuple(mb * 1024 * 1024 for mb in (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2000))
+
+# Every metric created in this process, in creation order
+registry = []
+
+
+class Metric:
+    """
+    Base for counters, gauges and histograms, one value (or bucket array) per label combination.
+    Updates take one lock and touch a dict entry, cheap enough for every request and block.
+    """
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+        registry.append(self)
+
+    def label_text(self, labelvalues, extra=""):
+        pairs = [f'{name}="{value}"' for name, value in zip(self.labelnames, labelvalues)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def samples(self):
+        with self.lock:
+            values = dict(self.values)
+        for labelvalues, value in sorted(values.items()):
+            yield f"{self.name}{self.label_text(labelvalues)} {value}"
+
+    def render(self):
+        return "\n".join([f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self.samples()])
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, *labelvalues):
+        with self.lock:
+            self.values[labelvalues] = self.values.get(labelvalues, 0) + amount
+
+
+class Gauge(Metric):
+    """A value that is set, or worked out by function() when scraped so the hot path never touches it."""
+    kind = "gauge"
+
+    def __init__(self, name, help, function=None):
+        super().__init__(name, help)
+        self.function = function
+
+    def set(self, value):
+        with self.lock:
+            self.values[()] = value
+
+    def samples(self):
+        if self.function is None:
+            return super().samples()
+        return [f"{self.name} {self.function()}"]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labelvalues):
+        # counts are per bucket here and only summed into Prometheus' cumulative buckets when scraped
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(labelvalues)
+            if state is None:
+                state = self.values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, *labelvalues):
+        return Timer(self, labelvalues)
+
+    def snapshot(self, *labelvalues):
+        """(count, sum) observed for one label combination."""
+        with self.lock:
+            state = self.values.get(labelvalues)
+            return (state[2], state[1]) if state else (0, 0.0)
+
+    def samples(self):
+        with self.lock:
+            values = {labelvalues: (list(state[0]), state[1], state[2]) for labelvalues, state in self.values.items()}
+        for labelvalues, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                yield f"{self.name}_bucket{self.label_text(labelvalues, le)} {cumulative}"
+            yield f"{self.name}_sum{self.label_text(labelvalues)} {total}"
+            yield f"{self.name}_count{self.label_text(labelvalues)} {count}"
+
+
+class Timer:
+    """with histogram.time(...): observes the seconds the block took, also when it raises."""
+    __slots__ = ("histogram", "labelvalues", "start")
+
+    def __init__(self, histogram, labelvalues):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labelvalues)
+
+
+def timed(histogram, *labelvalues):
+    """Decorator for async endpoints, observes how long each call took."""
+    def decorator(function):
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            with histogram.time(*labelvalues):
+                return await function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def render():
+    """Every registered metric in Prometheus text format."""
+    return "\n".join(metric.render() for metric in registry) + "\n"
@@ -0,0 +1,81 @@
+import hashlib
+import os
+import random
+
+import numpy as np
+import pytest
+
+import chunking
+from chunking import GEAR, FastCDC, gear_hashes
+
+MIN, AVG, MAX = 64, 256, 1024
+
+
+def random_bytes(size, seed=0):
+    return random.Random(seed).randbytes(size)
+
+
+def chunks_of(data, chunker):
+    start = 0
+    chunks = []
+    for end in chunker.cut_points(data):
+        chunks.append(hashlib.sha256(data[start:end]).hexdigest())
+        start = end
+    return chunks
+
+
+def test_gear_hashes_match_the_rolling_definition():
+    data = random_bytes(300)
+    expected = []
+    value = 0
+    for byte in data:
+        value = ((value << 1) + int(GEAR[byte])) & 0xFFFFFFFF
+        expected.append(value)
+    assert gear_hashes(data).tolist() == expected
+
+
+def test_cut_points_cover_the_data_within_the_size_limits():
+    data = random_bytes(200_000)
+    cuts = FastCDC(MIN, AVG, MAX).cut_points(data)
+    sizes = np.diff([0] + cuts)
+    assert cuts[-1] == len(data)
+    assert all(MIN <= size <= MAX for size in sizes[:-1])
+    assert AVG / 2 < sizes.mean() < AVG * 2
+
+
+def test_cut_points_leave_the_tail_unless_final():
+    data = random_bytes(10_000)
+    chunker = FastCDC(MIN, AVG, MAX)
+    partial = chunker.cut_points(data, final=False)
+    assert partial == chunker.cut_points(data)[:len(partial)]
+    assert 0 < len(data) - partial[-1] < MAX
+
+
+def test_an_insert_only_changes_the_chunks_around_it():
+    data = random_bytes(100_000)
+    edited = data[:50_000] + b"inserted bytes" + data[50_000:]
+    chunker = FastCDC(MIN, AVG, MAX)
+    before, after = chunks_of(data, chunker), chunks_of(edited, chunker)
+    assert len(set(before) - set(after)) <= 3
+
+
+def test_chunk_file_matches_cut_points_across_segments(tmp_path, monkeypatch):
+    data = random_bytes(50_000)
+    path = tmp_path / "file.bin"
+    path.write_bytes(data)
+    chunker = FastCDC(MIN, AVG, MAX)
+    # several reads per file, so chunks have to carry over between segments
+    monkeypatch.setattr(chunking, "CHUNK_SEGMENT_SIZE", 3000)
+    chunks = list(chunker.chunk_file(str(path)))
+    assert [fingerprint for _, _, fingerprint in chunks] == chunks_of(data, chunker)
+    assert [offset for offset, _, _ in chunks] == list(np.cumsum([0] + [size for _, size, _ in chunks[:-1]]))
+    empty = tmp_path / "empty.bin"
+    empty.write_bytes(b"")
+    assert list(chunker.chunk_file(str(empty))) == []
+
+
+def test_chunk_sizes_must_be_ordered():
+    with pytest.raises(ValueError):
+        FastCDC(1024, 256, 4096)
+    with pytest.raises(ValueError):
+        FastCDC(8, 256, 4096)
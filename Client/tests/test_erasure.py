@@ -0,0 +1,53 @@
+from itertools import combinations
+
+import numpy as np
+import pytest
+
+from erasure import gf_inv, gf_invert_matrix, gf_mul, get_codec, stripe_cell_lengths
+
+
+def test_gf_inverse():
+    for a in range(1, 256):
+        assert gf_mul(a, gf_inv(a)) == 1
+    with pytest.raises(ZeroDivisionError):
+        gf_inv(0)
+
+
+def test_matrix_inverse():
+    codec = get_codec(3, 2)
+    rows = [codec.encode_matrix[index] for index in (0, 3, 4)]
+    inverse = gf_invert_matrix(rows)
+    product = [[0] * 3 for _ in range(3)]
+    for i in range(3):
+        for j in range(3):
+            for k in range(3):
+                product[i][j] ^= gf_mul(rows[i][k], inverse[k][j])
+    assert product == [[1, 0, 0], [0, 1, 0], [0, 0, 1]]
+    with pytest.raises(ValueError):
+        gf_invert_matrix([[1, 2], [1, 2]])
+
+
+@pytest.mark.parametrize("data_units, parity_units", [(3, 2), (6, 3)])
+def test_decode_survives_any_parity_units_erasures(data_units, parity_units):
+    codec = get_codec(data_units, parity_units)
+    rng = np.random.default_rng(data_units)
+    data = rng.integers(0, 256, size=(data_units, 1000), dtype=np.uint8)
+    cells = dict(enumerate(np.concatenate([data, codec.encode(data)])))
+    for lost_count in range(parity_units + 1):
+        for lost in combinations(range(data_units + parity_units), lost_count):
+            surviving = {index: cell for index, cell in cells.items() if index not in lost}
+            assert np.array_equal(codec.decode(surviving, 1000), data), lost
+
+
+def test_decode_needs_data_units_cells():
+    codec = get_codec(3, 2)
+    data = np.arange(30, dtype=np.uint8).reshape(3, 10)
+    parity = codec.encode(data)
+    with pytest.raises(ValueError):
+        codec.decode({0: data[0], 3: parity[0]}, 10)
+
+
+def test_stripe_cell_lengths():
+    assert stripe_cell_lengths(30, 3, 10) == [10, 10, 10]
+    assert stripe_cell_lengths(12, 3, 10) == [10, 2, 0]
+    assert stripe_cell_lengths(0, 3, 10) == [0, 0, 0]
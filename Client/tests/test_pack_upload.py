@@ -0,0 +1,80 @@
+import logging
+import os
+
+import pytest
+
+pytest.importorskip("requests")
+
+import client
+
+
+class Response:
+    status_code = 200
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def json(self):
+        return {"filename": self.filename}
+
+
+@pytest.fixture
+def packing(monkeypatch):
+    monkeypatch.setattr(client, "PACK_SMALL_FILES", True)
+    monkeypatch.setattr(client, "STORAGE_POLICY", None)
+    monkeypatch.setattr(client, "DEDUP", False)
+    monkeypatch.setattr(client, "BLOCK_RETRY_DELAY_SECONDS", 0)
+    monkeypatch.setattr(client.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(client, "log_connection_stats", lambda logger: None)
+
+
+def test_a_bad_file_only_fails_itself_when_its_container_fails(tmp_path, monkeypatch, caplog, packing):
+    files = []
+    for n in range(5):
+        path = tmp_path / f"small{n}.txt"
+        path.write_bytes(bytes([n]) * (100 + n))
+        files.append(str(path))
+    bad = files[2]
+
+    def allocate_containers(batch):
+        packed, offset = [], 0
+        for filename in batch:
+            packed.append({"filename": filename, "offset": offset, "size": os.path.getsize(filename)})
+            offset += packed[-1]["size"]
+        # deleted after the NameNode packed it, the container can't be read to the end any more
+        os.remove(bad)
+        return [{"block_id": "container_1", "size": offset, "assigned_datanodes": ["dn1"], "files": packed}]
+
+    def put_block(block, file, offset):
+        return len(file.read(block["size"])) == block["size"]
+
+    sent_alone = []
+
+    def upload(filename):
+        sent_alone.append(filename)
+        return Response(filename) if os.path.exists(filename) else None
+
+    shown = []
+    monkeypatch.setattr(client, "allocate_containers", allocate_containers)
+    monkeypatch.setattr(client, "put_block", put_block)
+    monkeypatch.setattr(client, "upload", upload)
+    monkeypatch.setattr(client, "display_upload_result", lambda allocation: shown.append(allocation["filename"]))
+    with caplog.at_level(logging.ERROR, logger=client.logger.name):
+        client.upload_multiple_files(files)
+    assert sorted(sent_alone) == files
+    assert sorted(shown) == [filename for filename in files if filename != bad]
+    assert f"1 files failed to upload: {[bad]}" in caplog.text
+
+
+def test_a_file_that_cannot_be_stated_does_not_stop_the_others(tmp_path, monkeypatch, packing):
+    small = tmp_path / "small.txt"
+    small.write_bytes(b"x" * 10)
+    missing = str(tmp_path / "missing.txt")
+    packed, batched = [], []
+    monkeypatch.setattr(client, "allocate_containers", lambda batch: packed.extend(batch) or [])
+    monkeypatch.setattr(client, "allocate_batch", lambda batch: batched.extend(batch) or {})
+    monkeypatch.setattr(client, "upload", lambda filename: None)
+    monkeypatch.setattr(client, "display_upload_result", lambda allocation: None)
+    client.upload_multiple_files([missing, str(small)])
+    assert packed == [str(small)]
+    assert batched == [missing]
@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+import upload_journal
+from upload_journal import UploadJournal, journal_path
+
+
+@pytest.fixture
+def upload(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_journal, "UPLOAD_JOURNAL_DIR", str(tmp_path / "journal"))
+    path = tmp_path / "file.bin"
+    path.write_bytes(b"x" * 1000)
+    return str(path)
+
+
+def test_committed_blocks_survive_a_restart(upload):
+    journal = UploadJournal.start(upload)
+    journal.block_committed("block_0")
+    journal.block_committed("block_2")
+    loaded = UploadJournal.load(upload)
+    assert loaded.committed == {"block_0", "block_2"}
+    assert loaded.resumed
+    loaded.finish()
+    assert UploadJournal.load(upload) is None
+
+
+def test_a_torn_last_line_is_dropped(upload):
+    journal = UploadJournal.start(upload)
+    journal.block_committed("block_0")
+    with open(journal.path, "a") as f:
+        f.write('{"block_id": "blo')
+    assert UploadJournal.load(upload).committed == {"block_0"}
+
+
+def test_an_edited_file_is_not_resumed(upload):
+    UploadJournal.start(upload).block_committed("block_0")
+    with open(upload, "ab") as f:
+        f.write(b"more")
+    assert UploadJournal.load(upload) is None
+    assert not os.path.exists(journal_path(upload))
+
+
+def test_a_broken_header_is_not_resumed(upload):
+    journal = UploadJournal.start(upload)
+    with open(journal.path, "w") as f:
+        f.write("not json\n")
+    assert UploadJournal.load(upload) is None
+
+
+def test_start_replaces_an_older_journal(upload):
+    UploadJournal.start(upload).block_committed("block_0")
+    UploadJournal.start(upload)
+    assert UploadJournal.load(upload).committed == set()
+
+
+def test_in_memory_journal_writes_nothing(upload):
+    journal = UploadJournal.start(upload, persist=False)
+    journal.block_committed("block_0")
+    journal.finish()
+    assert journal.committed == {"block_0"}
+    assert not os.path.exists(upload_journal.UPLOAD_JOURNAL_DIR)
@@ -0,0 +1,85 @@
+import hashlib
+import json
+import os
+import threading
+
+# Where upload progress is kept, one journal per file that is being uploaded
+UPLOAD_JOURNAL_DIR = os.getenv("UPLOAD_JOURNAL_DIR", ".upload_journal")
+
+
+def journal_path(filename):
+    # hashed so any filename (slashes and all) maps to one flat file
+    digest = hashlib.sha1(os.path.abspath(filename).encode()).hexdigest()
+    return os.path.join(UPLOAD_JOURNAL_DIR, f"{digest}.journal")
+
+
+def file_identity(filename):
+    stat = os.stat(filename)
+    return {"filename": filename, "filesize": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+class UploadJournal:
+    """
+    Local record of an upload in progress: a header line naming the file (size + mtime, so an
+    edited file is never resumed) followed by one line per block that every DataNode in its
+    pipeline acked. It outlives the client process, so a retry or the next run only sends the
+    blocks that aren't listed. Deleted once the whole file made it.
+    Without a path it only lives in memory, enough for retries within one run.
+    Lines aren't fsync'd: a resumed upload asks the DataNodes about every block the journal doesn't
+    list before sending it, so losing the last few lines only costs those questions.
+    """
+    def __init__(self, filename, committed=(), resumed=False, path=None):
+        self.filename = filename
+        self.path = path
+        self.committed = set(committed)
+        self.resumed = resumed
+        self.lock = threading.Lock()
+
+    @classmethod
+    def start(cls, filename, persist=True):
+        """A fresh journal for a file that was just allocated, replaces any older one. persist=False keeps it in memory."""
+        if not persist:
+            return cls(filename)
+        os.makedirs(UPLOAD_JOURNAL_DIR, exist_ok=True)
+        journal = cls(filename, path=journal_path(filename))
+        temp_path = journal.path + ".tmp"
+        with open(temp_path, "w") as f:
+            f.write(json.dumps(file_identity(filename)) + "\n")
+        os.replace(temp_path, journal.path)
+        return journal
+
+    @classmethod
+    def load(cls, filename):
+        """The journal of an unfinished upload of this file, None if there is none or the file changed since."""
+        path = journal_path(filename)
+        try:
+            with open(path) as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return None
+        try:
+            header = json.loads(lines[0])
+        except (IndexError, ValueError):
+            header = None
+        if header != file_identity(filename):
+            os.remove(path)
+            return None
+        committed = []
+        for line in lines[1:]:
+            try:
+                committed.append(json.loads(line)["block_id"])
+            except (ValueError, KeyError):
+                break  # the last line may be cut short if we died while writing it
+        return cls(filename, committed, resumed=True, path=path)
+
+    def block_committed(self, block_id):
+        with self.lock:
+            self.committed.add(block_id)
+            if self.path:
+                with open(self.path, "a") as f:
+                    f.write(json.dumps({"block_id": block_id}) + "\n")
+
+    def finish(self):
+        """The upload is complete, nothing left to resume."""
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
@@ -1,87 +1,283 @@
-from fastapi import FastAPI, HTTPException
-import requests
-import os
-import logging
-import time
-from datetime import datetime, timezone
-import threading
-from contextlib import asynccontextmanager
-from pydantic import BaseModel
-import base64
-
-# logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s: %(name)s: %(levelname)s: %(message)s'
-)
-logger = logging.getLogger(__name__)
-
-NODE_ID = os.getenv("NODE_ID", "datanode")
-DATA_DIR = f"/usr/local/app/data/{NODE_ID}"
-os.makedirs(DATA_DIR, exist_ok=True)
-HEARTBEAT_URL = f"http://namenode:9870/nodes/{NODE_ID}/heartbeat"
-
-# Request model for storing a block
-class BlockStorageRequest(BaseModel):
-    block_id: str
-    block_data: str  # base64-encoded
-
-# Background thread: send heartbeats to NameNode
-def send_heartbeats():
-    while True:
-        timestamp = datetime.now(timezone.utc)
-        payload = {"node_id": NODE_ID, "timestamp": timestamp.isoformat()}
-        try:
-            response = requests.post(HEARTBEAT_URL, json=payload)
-            logger.info(f"{timestamp} | {response.status_code} | {response.json()}")
-        except Exception as e:
-            logger.error(f"{timestamp} | Error: {e}")
-        time.sleep(1)
-
-# FastAPI lifespan event: start heartbeat thread
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    thread = threading.Thread(target=send_heartbeats, daemon=True)
-    thread.start()
-    logger.info(f"DataNode {NODE_ID} started, sending heartbeats to NameNode")
-    yield
-
-app = FastAPI(title=f"DataNode {NODE_ID}", lifespan=lifespan)
-
-# Health endpoint for monitoring
-@app.get("/health")
-async def datanode_health():
-    return {"status": "ok", "node_id": NODE_ID}
-
-# Endpoint to store a file block
-@app.post("/store_block")
-async def store_block(request: BlockStorageRequest):
-    """
-    Store a file block on this DataNode
-    """
-    try:
-        # Decode the base64 block data
-        block_data = base64.b64decode(request.block_data)
-        # Create the file path using DATA_DIR and block_id
-        block_path = os.path.join(DATA_DIR, f"{request.block_id}.dat")
-        # Write the block data to a .dat file
-        with open(block_path, "wb") as f:
-            f.write(block_data)
-        # Return success response with file info
-        return {
-            "status": "success",
-            "node_id": NODE_ID,
-            "block_id": request.block_id,
-            "block_path": block_path,
-            "block_size": os.path.getsize(block_path),
-            "message": f"Block stored successfully"
-        }
-    except Exception as e:
-        logger.error(f"Failed to store block {request.block_id}: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to store block: {str(e)}")
-
-
-if __name__ == "__main__":
-    import uvicorn
-
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, Response
+import asyncio
+import os
+import re
+import hashlib
+import logging
+import time
+import random
+from datetime import datetime, timezone
+import threading
+from contextlib import asynccontextmanager
+from pipeline import PIPELINE_HEADER, PipelineForwarder, parse_pipeline_header
+from http_pool import get_session, HTTP_CONNECT_TIMEOUT
+from storage_stats import StorageStats
+from checksums import (CHECKSUM_HEADER, CHECKSUM_CHUNK_SIZE, ChecksumComputer, ChecksumError,
+                       FramedChecksumVerifier, chunk_fingerprint)
+from scrubber import BlockScrubber
+from block_report import BlockReportTracker
+from replicator import BlockReplicator
+from volumes import BlockWriter, VolumeSet
+from metrics import CONTENT_TYPE, THROUGHPUT_BUCKETS, Counter, Gauge, Histogram, render
+
+# logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s: %(name)s: %(levelname)s: %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+NODE_ID = os.getenv("NODE_ID", "datanode")
+DATA_DIR = os.getenv("DATA_DIR", f"/usr/local/app/data/{NODE_ID}")
+# Comma separated data directories, one per disk, new blocks go round robin over them. Defaults to just DATA_DIR
+DATA_DIRS = [path.strip() for path in os.getenv("DATA_DIRS", DATA_DIR).split(",") if path.strip()]
+volumes = VolumeSet(DATA_DIRS)
+NAMENODE_URL = os.getenv("NAMENODE_URL", "http://namenode:9870")
+HEARTBEAT_URL = f"{NAMENODE_URL}/nodes/{NODE_ID}/heartbeat"
+BLOCK_REPORT_URL = f"{NAMENODE_URL}/nodes/{NODE_ID}/block_report"
+HEARTBEAT_INTERVAL_SECONDS = float(os.getenv("HEARTBEAT_INTERVAL_SECONDS", "3"))
+# +/- fraction of the interval added at random so a cluster restarted together doesn't heartbeat in lockstep
+HEARTBEAT_JITTER = float(os.getenv("HEARTBEAT_JITTER", "0.1"))
+# How long uvicorn keeps idle client/pipeline connections open for reuse
+KEEPALIVE_TIMEOUT_SECONDS = int(os.getenv("KEEPALIVE_TIMEOUT_SECONDS", "30"))
+# Full block report after startup and then this often, incremental reports ride on every heartbeat
+BLOCK_REPORT_INTERVAL_SECONDS = int(os.getenv("BLOCK_REPORT_INTERVAL_SECONDS", str(6 * 3600)))
+
+# HEAD /blocks/{block_id} answers with the stored block's size in this header
+BLOCK_SIZE_HEADER = "X-Block-Size"
+
+# Block ids are generated by the NameNode as block_<sanitized name>_<index>_<uuid8>
+BLOCK_ID_PATTERN = re.compile(r'^[A-Za-z0-9_]+$')
+
+def check_block_id(block_id):
+    """Reject ids that could escape the data dirs."""
+    if not BLOCK_ID_PATTERN.match(block_id):
+        raise HTTPException(status_code=400, detail=f"Invalid block id: {block_id}")
+
+def get_block_path(block_id):
+    """Return the on-disk path of a stored block on whichever data dir holds it, None if none does."""
+    _, block_path = volumes.find(block_id)
+    return block_path
+
+storage_stats = StorageStats(DATA_DIRS)
+block_reports = BlockReportTracker(DATA_DIRS)
+scrubber = BlockScrubber(NODE_ID, DATA_DIRS, NAMENODE_URL, storage_stats, block_reports)
+replicator = BlockReplicator(get_block_path)
+
+# Served by GET /metrics, gauges are read when scraped so they cost nothing in between
+block_write_seconds = Histogram("datanode_block_write_seconds", "Time to receive, verify and store a block (downstream pipeline acks included)")
+block_write_throughput = Histogram("datanode_block_write_bytes_per_second", "Throughput of each stored block", buckets=THROUGHPUT_BUCKETS)
+bytes_written_total = Counter("datanode_bytes_written_total", "Block bytes stored on this DataNode")
+block_write_failures = Counter("datanode_block_write_failures_total", "Block writes that were rejected or failed", ("reason",))
+block_reads = Counter("datanode_block_reads_total", "Block reads served")
+Gauge("datanode_used_bytes", "Bytes of stored blocks", lambda: storage_stats.used_bytes)
+Gauge("datanode_blocks", "Blocks stored", lambda: storage_stats.block_count)
+Gauge("datanode_inflight_writes", "Block writes in progress", lambda: storage_stats.inflight_writes)
+Gauge("datanode_replication_queue", "Block copies waiting for a replication worker", lambda: replicator.queue.qsize())
+
+def send_full_block_report():
+    block_ids = block_reports.full_report()
+    response = get_session().post(BLOCK_REPORT_URL, json={"block_ids": block_ids}, timeout=(HTTP_CONNECT_TIMEOUT, 60))
+    response.raise_for_status()
+    logger.info(f"Sent full block report ({len(block_ids)} blocks)")
+
+# Background thread: send heartbeats (with a storage report and the blocks stored since the last one) to NameNode,
+# the NameNode answers with block copies it wants this node to make
+def send_heartbeats():
+    connected = None
+    next_full_report = 0
+    while True:
+        timestamp = datetime.now(timezone.utc)
+        blocks_added, blocks_removed = block_reports.take_incremental()
+        replication_failed = replicator.take_failed()
+        payload = {"node_id": NODE_ID, "timestamp": timestamp.isoformat(), **storage_stats.report(),
+                   "blocks_added": blocks_added, "blocks_removed": blocks_removed,
+                   "replication_failed": replication_failed}
+        try:
+            # one keep-alive connection carries every heartbeat instead of a handshake per interval
+            response = get_session().post(HEARTBEAT_URL, json=payload, timeout=(HTTP_CONNECT_TIMEOUT, 5))
+            response.raise_for_status()
+            replicator.submit(response.json().get("commands", []))
+            # only log when the connection state changes, not every heartbeat
+            if connected is not True:
+                logger.info(f"{timestamp} | Heartbeating to NameNode every ~{HEARTBEAT_INTERVAL_SECONDS}s")
+                # (re)connected, the NameNode may have restarted or written us off, tell it everything we hold
+                next_full_report = 0
+            connected = True
+        except Exception as e:
+            block_reports.restore(blocks_added, blocks_removed)
+            replicator.restore_failed(replication_failed)
+            if connected is not False:
+                logger.error(f"{timestamp} | Heartbeat failed: {e}")
+            connected = False
+        if connected and time.monotonic() >= next_full_report:
+            try:
+                send_full_block_report()
+                next_full_report = time.monotonic() + BLOCK_REPORT_INTERVAL_SECONDS
+            except Exception as e:
+                logger.error(f"Full block report failed: {e}")
+        jitter = random.uniform(-HEARTBEAT_JITTER, HEARTBEAT_JITTER) * HEARTBEAT_INTERVAL_SECONDS
+        time.sleep(max(0.0, HEARTBEAT_INTERVAL_SECONDS + jitter))
+
+# FastAPI lifespan event: start heartbeat thread
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    thread = threading.Thread(target=send_heartbeats, daemon=True)
+    thread.start()
+    threading.Thread(target=scrubber.run, daemon=True).start()
+    replicator.start()
+    logger.info(f"DataNode {NODE_ID} started, sending heartbeats to NameNode")
+    yield
+
+app = FastAPI(title=f"DataNode {NODE_ID}", lifespan=lifespan)
+
+# Health endpoint for monitoring
+@app.get("/health")
+async def datanode_health():
+    return {"status": "ok", "node_id": NODE_ID}
+
+# Prometheus scrape endpoint, see metrics.py for what is exported
+@app.get("/metrics")
+async def metrics():
+    return Response(render(), media_type=CONTENT_TYPE)
+
+# Endpoint to store a file block, the body is the raw block bytes (application/octet-stream)
+@app.put("/blocks/{block_id}")
+async def store_block(block_id: str, request: Request):
+    """
+    Stream a file block to disk on this DataNode.
+    Chunks are written to a temp file as they arrive and renamed into place once complete,
+    so a half-received block never shows up as a .dat file. The disk work runs on the threads of
+    the data dir the block lands on (see volumes.py) and the ack waits until FSYNC_MODE is satisfied.
+    If the X-Replica-Pipeline header lists more DataNodes, every chunk is also forwarded to the
+    next one as it arrives and we only ack once the rest of the pipeline has acked.
+    With X-Checksum-Chunk-Size the body is [chunk][crc32] packets and every chunk is verified
+    before it hits the disk, otherwise we checksum the raw bytes ourselves. Either way the
+    checksums are kept in a .meta sidecar next to the .dat for the scrubber.
+    Dedup chunks (chunk_<sha256>) must also hash to their name, other files will share them.
+    """
+    check_block_id(block_id)
+    expected_size = request.headers.get("content-length")
+    downstream = [node for node in parse_pipeline_header(request.headers.get(PIPELINE_HEADER)) if node != NODE_ID]
+    framed_chunk_size = request.headers.get(CHECKSUM_HEADER)
+    if framed_chunk_size:
+        if not framed_chunk_size.isdigit() or int(framed_chunk_size) == 0:
+            raise HTTPException(status_code=400, detail=f"Invalid {CHECKSUM_HEADER}: {framed_chunk_size}")
+        checksummer = FramedChecksumVerifier(int(framed_chunk_size))
+    else:
+        checksummer = ChecksumComputer(CHECKSUM_CHUNK_SIZE)
+    expected_fingerprint = chunk_fingerprint(block_id)
+    content_hash = hashlib.sha256() if expected_fingerprint else None
+    forwarder = None
+    writer = None
+    storage_stats.write_started()
+    started = time.perf_counter()
+    try:
+        volume = await asyncio.to_thread(volumes.choose, block_id, int(expected_size or 0))
+        writer = BlockWriter(volume, block_id)
+        await writer.open()
+        if downstream:
+            size = int(expected_size) if expected_size is not None else None
+            # forward the body untouched (checksums included) so every replica verifies it too
+            headers = {CHECKSUM_HEADER: framed_chunk_size} if framed_chunk_size else {}
+            forwarder = PipelineForwarder(block_id, downstream, size, headers).start()
+        bytes_received = 0
+        bytes_written = 0
+        async for chunk in request.stream():
+            if forwarder:
+                await forwarder.send(chunk)
+            data = checksummer.feed(chunk)
+            await writer.write(data)
+            if content_hash:
+                content_hash.update(data)
+            bytes_received += len(chunk)
+            bytes_written += len(data)
+        data = checksummer.finish()
+        await writer.write(data)
+        if content_hash:
+            content_hash.update(data)
+        bytes_written += len(data)
+        if content_hash and content_hash.hexdigest() != expected_fingerprint:
+            raise ChecksumError(f"Chunk content hashes to {content_hash.hexdigest()}, not its fingerprint")
+        if expected_size is not None and bytes_received != int(expected_size):
+            raise HTTPException(status_code=400, detail=f"Incomplete block: got {bytes_received} of {expected_size} bytes")
+        replaced_size = await writer.commit(checksummer.chunk_size, checksummer.checksums)
+        storage_stats.block_stored(bytes_written, replaced_size)
+        block_reports.block_added(block_id)
+        # acks flow back up the chain, each node adds itself to the replica list
+        replicas = [NODE_ID]
+        if forwarder:
+            replicas += await forwarder.finish()
+        seconds = time.perf_counter() - started
+        block_write_seconds.observe(seconds)
+        block_write_throughput.observe(bytes_written / seconds)
+        bytes_written_total.inc(bytes_written)
+        return {
+            "status": "success",
+            "node_id": NODE_ID,
+            "block_id": block_id,
+            "block_path": writer.block_path,
+            "block_size": bytes_written,
+            "replicas": replicas,
+            "message": f"Block stored successfully"
+        }
+    except HTTPException as e:
+        if forwarder:
+            forwarder.abort()
+        if writer:
+            await writer.abort()
+        block_write_failures.inc(1, "rejected" if e.status_code < 500 else "error")
+        raise
+    except ChecksumError as e:
+        if forwarder:
+            forwarder.abort()
+        if writer:
+            await writer.abort()
+        block_write_failures.inc(1, "checksum")
+        logger.error(f"Rejected block {block_id}: {e}")
+        raise HTTPException(status_code=400, detail=f"Block {block_id} failed checksum verification: {e}")
+    except Exception as e:
+        if forwarder:
+            forwarder.abort()
+        if writer:
+            await writer.abort()
+        block_write_failures.inc(1, "error")
+        logger.error(f"Failed to store block {block_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to store block: {str(e)}")
+    finally:
+        storage_stats.write_finished()
+
+# Endpoint to read a block back, honours Range headers so readers can resume or fetch a slice
+@app.get("/blocks/{block_id}")
+async def read_block(block_id: str):
+    """
+    Serve a stored block straight from disk.
+    FileResponse streams the file without loading it into memory and answers
+    Range requests with 206 Partial Content itself.
+    """
+    check_block_id(block_id)
+    block_path = await asyncio.to_thread(get_block_path, block_id)
+    if block_path is None:
+        raise HTTPException(status_code=404, detail=f"Block {block_id} not found on {NODE_ID}")
+    block_reads.inc()
+    return FileResponse(block_path, media_type="application/octet-stream")
+
+# Whether a block is stored here, resumed uploads ask before sending a block again
+@app.head("/blocks/{block_id}")
+async def block_status(block_id: str):
+    """
+    200 with the block's size in X-Block-Size if it is stored, 404 if not.
+    Blocks only get their .dat name once they are complete and checksum verified, so one that exists is whole.
+    """
+    check_block_id(block_id)
+    block_path = await asyncio.to_thread(get_block_path, block_id)
+    if block_path is None:
+        return Response(status_code=404)
+    size = await asyncio.to_thread(os.path.getsize, block_path)
+    return Response(status_code=200, headers={BLOCK_SIZE_HEADER: str(size)})
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=8000, timeout_keep_alive=KEEPALIVE_TIMEOUT_SECONDS)
\ No newline at end of file
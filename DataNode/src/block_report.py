@@ -0,0 +1,47 @@
+import os
+import threading
+
+
+class BlockReportTracker:
+    """
+    What this DataNode tells the NameNode about the blocks it holds.
+    Blocks stored or removed since the last heartbeat ride along with it as an incremental report,
+    the full report lists every .dat file in the data dirs and is sent at startup and every few hours
+    so the NameNode can fix whatever drifted (lost heartbeats, a disk swapped under us, ...).
+    """
+    def __init__(self, data_dirs):
+        self.data_dirs = data_dirs
+        self.added = set()
+        self.removed = set()
+        self.lock = threading.Lock()
+
+    def block_added(self, block_id):
+        with self.lock:
+            self.removed.discard(block_id)
+            self.added.add(block_id)
+
+    def block_removed(self, block_id):
+        with self.lock:
+            self.added.discard(block_id)
+            self.removed.add(block_id)
+
+    def take_incremental(self):
+        """Blocks (added, removed) since the last call, hand them back with restore() if the heartbeat fails."""
+        with self.lock:
+            added, removed = list(self.added), list(self.removed)
+            self.added.clear()
+            self.removed.clear()
+        return added, removed
+
+    def restore(self, added, removed):
+        with self.lock:
+            # anything that changed again in the meantime wins
+            self.added.update(block_id for block_id in added if block_id not in self.removed)
+            self.removed.update(block_id for block_id in removed if block_id not in self.added)
+
+    def full_report(self):
+        block_ids = []
+        for data_dir in self.data_dirs:
+            with os.scandir(data_dir) as entries:
+                block_ids += [entry.name[:-len(".dat")] for entry in entries if entry.name.endswith(".dat")]
+        return block_ids
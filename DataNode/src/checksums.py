@@ -0,0 +1,162 @@
+import os
+import struct
+import zlib
+from uuid import uuid4
+
+# Client sends this when the body is framed as [chunk][crc32] packets, its value is the chunk size
+CHECKSUM_HEADER = "X-Checksum-Chunk-Size"
+# Chunk size used when a client sends raw bytes and we checksum on our own
+CHECKSUM_CHUNK_SIZE = int(os.getenv("CHECKSUM_CHUNK_SIZE", str(64 * 1024)))
+CRC_SIZE = 4
+
+# .meta sidecar layout: magic, version, algorithm, chunk size, then one big-endian crc32 per chunk
+META_MAGIC = b"HDMETA"
+META_VERSION = 1
+ALGORITHM_CRC32 = 1
+META_HEADER = struct.Struct(">6sBBI")
+
+
+# Dedup chunks are stored as chunk_<sha256 hex of their content>
+CHUNK_BLOCK_PREFIX = "chunk_"
+
+
+class ChecksumError(Exception):
+    pass
+
+
+def chunk_fingerprint(block_id):
+    """The sha256 hex a dedup chunk's bytes must hash to, None for ordinary blocks."""
+    if block_id.startswith(CHUNK_BLOCK_PREFIX):
+        return block_id[len(CHUNK_BLOCK_PREFIX):]
+    return None
+
+
+def framed_length(data_size, chunk_size):
+    """Body length of a block of data_size bytes framed in chunk_size packets."""
+    return data_size + CRC_SIZE * ((data_size + chunk_size - 1) // chunk_size)
+
+
+class FramedChecksumVerifier:
+    """
+    Unpacks a [chunk][crc32][chunk][crc32]... body as it streams in and checks every chunk,
+    so corruption on the wire is caught before the block is renamed into place.
+    feed() returns the verified data to write, finish() handles the last short chunk.
+    """
+    def __init__(self, chunk_size):
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+        self.checksums = []
+
+    def feed(self, data):
+        self.buffer += data
+        packet_size = self.chunk_size + CRC_SIZE
+        offset = 0
+        with memoryview(self.buffer) as view:
+            verified = []
+            while len(view) - offset >= packet_size:
+                verified.append(self._verify(view, offset, self.chunk_size))
+                offset += packet_size
+            # one copy out of the buffer, the views must be gone before it is resized
+            result = b"".join(verified)
+            verified.clear()
+        del self.buffer[:offset]
+        return result
+
+    def finish(self):
+        if not self.buffer:
+            return b""
+        if len(self.buffer) <= CRC_SIZE:
+            raise ChecksumError("Truncated checksum packet at end of block")
+        with memoryview(self.buffer) as view:
+            data = bytes(self._verify(view, 0, len(self.buffer) - CRC_SIZE))
+        self.buffer.clear()
+        return data
+
+    def _verify(self, view, offset, length):
+        data = view[offset:offset + length]
+        expected, = struct.unpack_from(">I", view, offset + length)
+        actual = zlib.crc32(data)
+        if actual != expected:
+            data.release()
+            raise ChecksumError(f"Checksum mismatch in chunk {len(self.checksums)}: expected {expected:08x}, got {actual:08x}")
+        self.checksums.append(actual)
+        return data
+
+
+class ChecksumComputer:
+    """Checksums a raw (unframed) body chunk by chunk, for clients that don't send checksums."""
+    def __init__(self, chunk_size):
+        self.chunk_size = chunk_size
+        self.crc = 0
+        self.pending = 0
+        self.checksums = []
+
+    def feed(self, data):
+        view = memoryview(data)
+        while view:
+            take = min(len(view), self.chunk_size - self.pending)
+            self.crc = zlib.crc32(view[:take], self.crc)
+            self.pending += take
+            view = view[take:]
+            if self.pending == self.chunk_size:
+                self.checksums.append(self.crc)
+                self.crc = 0
+                self.pending = 0
+        return data
+
+    def finish(self):
+        if self.pending:
+            self.checksums.append(self.crc)
+            self.crc = 0
+            self.pending = 0
+        return b""
+
+
+def meta_path_for(block_path):
+    return block_path[:-len(".dat")] + ".meta"
+
+
+def write_meta_file(path, chunk_size, checksums, fsync=False):
+    """Write a .meta sidecar to path as is, callers rename it into place."""
+    with open(path, "wb") as f:
+        f.write(META_HEADER.pack(META_MAGIC, META_VERSION, ALGORITHM_CRC32, chunk_size))
+        f.write(struct.pack(f">{len(checksums)}I", *checksums))
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def write_meta(meta_path, chunk_size, checksums, fsync=False):
+    """Write the sidecar atomically (temp + rename) so a .meta is never half written."""
+    temp_path = f"{meta_path}.{uuid4().hex}.tmp"
+    write_meta_file(temp_path, chunk_size, checksums, fsync)
+    os.replace(temp_path, meta_path)
+
+
+def read_meta(meta_path):
+    """Return (chunk_size, checksums) from a .meta sidecar."""
+    with open(meta_path, "rb") as f:
+        magic, version, algorithm, chunk_size = META_HEADER.unpack(f.read(META_HEADER.size))
+        if magic != META_MAGIC or version != META_VERSION or algorithm != ALGORITHM_CRC32:
+            raise ChecksumError(f"Unsupported checksum file {meta_path}")
+        body = f.read()
+    return chunk_size, list(struct.unpack(f">{len(body) // CRC_SIZE}I", body))
+
+
+def verify_block_file(block_path, meta_path, on_chunk=None):
+    """
+    Re-read a stored block and compare it against its .meta.
+    Returns None if it matches, otherwise a description of the first mismatch.
+    on_chunk(n_bytes) is called after every chunk so callers can rate limit the scan.
+    """
+    chunk_size, checksums = read_meta(meta_path)
+    with open(block_path, "rb") as f:
+        for index, expected in enumerate(checksums):
+            data = f.read(chunk_size)
+            if zlib.crc32(data) != expected:
+                return f"chunk {index} checksum mismatch"
+            if on_chunk:
+                on_chunk(len(data))
+        if f.read(1):
+            return f"block is longer than its {len(checksums)} checksummed chunks"
+    return None
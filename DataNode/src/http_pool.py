@@ -0,0 +1,27 @@
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Hosts kept pooled (the NameNode plus the DataNodes we forward pipeline writes to)
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "16"))
+# Keep-alive connections per host, bounds concurrent pipeline forwards to a single DataNode
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "16"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Shared keep-alive session for heartbeats and pipeline forwards, safe to use from any thread."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
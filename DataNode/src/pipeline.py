@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+
+from http_pool import get_session, HTTP_CONNECT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+DATANODE_PORT = int(os.getenv("DATANODE_PORT", "8000"))
+# Comma separated list of the DataNodes that still need this block after us
+PIPELINE_HEADER = "X-Replica-Pipeline"
+# Chunks buffered between the incoming upload and the outgoing forward, this is the backpressure window
+PIPELINE_QUEUE_CHUNKS = int(os.getenv("PIPELINE_QUEUE_CHUNKS", "16"))
+PIPELINE_TIMEOUT_SECONDS = int(os.getenv("PIPELINE_TIMEOUT_SECONDS", "30"))
+
+
+def parse_pipeline_header(value):
+    """Turn the pipeline header into a list of downstream DataNode ids."""
+    if not value:
+        return []
+    return [node.strip() for node in value.split(",") if node.strip()]
+
+
+def datanode_block_url(datanode_id, block_id):
+    return f"http://{datanode_id}:{DATANODE_PORT}/blocks/{block_id}"
+
+
+class PipelineForwarder:
+    """
+    Forwards a block to the next DataNode in the write pipeline while we are still receiving it.
+    The request handler pushes chunks in with send(), a background thread streams them out
+    with requests (this object is the request body), and finish() waits for the downstream ack.
+    """
+    def __init__(self, block_id, downstream, size=None, headers=None):
+        self.block_id = block_id
+        self.extra_headers = headers or {}
+        self.next_node = downstream[0]
+        self.remaining_nodes = downstream[1:]
+        self.size = size
+        self.queue = queue.Queue(maxsize=PIPELINE_QUEUE_CHUNKS)
+        self.replicas = []
+        self.error = None
+        self.aborted = False
+        self.finished = False
+        self.thread = threading.Thread(target=self._forward, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    # file-like interface used by requests to stream the body downstream
+    def __len__(self):
+        return self.size
+
+    def read(self, amount=-1):
+        if self.finished:
+            return b""
+        chunk = self.queue.get()
+        if self.aborted:
+            raise IOError(f"Upstream upload of {self.block_id} was aborted")
+        if chunk is None:
+            self.finished = True
+            return b""
+        return chunk
+
+    def iter_chunks(self):
+        while True:
+            chunk = self.read()
+            if not chunk:
+                return
+            yield chunk
+
+    def _forward(self):
+        url = datanode_block_url(self.next_node, self.block_id)
+        headers = {"Content-Type": "application/octet-stream", **self.extra_headers}
+        if self.remaining_nodes:
+            headers[PIPELINE_HEADER] = ",".join(self.remaining_nodes)
+        # without a known size requests falls back to chunked transfer encoding
+        body = self if self.size is not None else self.iter_chunks()
+        try:
+            response = get_session().put(url, data=body, headers=headers,
+                                         timeout=(HTTP_CONNECT_TIMEOUT, PIPELINE_TIMEOUT_SECONDS))
+            if response.status_code != 200:
+                self.error = f"{self.next_node} returned {response.status_code}: {response.text}"
+            else:
+                self.replicas = response.json().get("replicas", [self.next_node])
+        except Exception as e:
+            self.error = f"{self.next_node} unreachable: {e}"
+
+    def _put_blocking(self, item):
+        # keeps checking the forward thread so a dead downstream can't wedge the upload
+        while self.error is None and self.thread.is_alive():
+            try:
+                self.queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    async def send(self, chunk):
+        """Queue a chunk for the next DataNode, waiting (off the event loop) if the window is full."""
+        if self.error is not None:
+            return
+        try:
+            self.queue.put_nowait(chunk)
+        except queue.Full:
+            await asyncio.to_thread(self._put_blocking, chunk)
+
+    async def finish(self):
+        """Signal end of block and return the DataNodes downstream that acked it."""
+        if self.error is None:
+            await asyncio.to_thread(self._put_blocking, None)
+        await asyncio.to_thread(self.thread.join, PIPELINE_TIMEOUT_SECONDS)
+        if self.error is not None:
+            logger.error(f"Pipeline forward of block {self.block_id} failed: {self.error}")
+            return []
+        return self.replicas
+
+    def abort(self):
+        """Tear down the downstream request so the rest of the pipeline drops its partial block."""
+        self.aborted = True
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
@@ -0,0 +1,129 @@
+import logging
+import os
+import queue
+import struct
+import threading
+import zlib
+
+from checksums import CHECKSUM_HEADER, CHECKSUM_CHUNK_SIZE, framed_length, meta_path_for, read_meta
+from http_pool import get_session, HTTP_CONNECT_TIMEOUT
+from pipeline import PIPELINE_HEADER, PIPELINE_TIMEOUT_SECONDS, datanode_block_url
+from throttle import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Bandwidth all re-replication copies from this node share, so recovery never starves client traffic
+REPLICATION_BYTES_PER_SECOND = int(os.getenv("REPLICATION_BYTES_PER_SECOND", str(20 * 1024 * 1024)))
+# Copies sent at once, the NameNode won't ask for more than MAX_REPLICATION_STREAMS anyway
+REPLICATION_WORKERS = int(os.getenv("REPLICATION_WORKERS", "2"))
+
+
+class StoredBlockStream:
+    """
+    File-like body that sends a stored block as [chunk][crc32] packets.
+    The crcs come from the block's .meta, so the target checks the bytes against the checksums
+    taken when the block was first written and a copy can't spread disk corruption.
+    """
+    def __init__(self, block_path, limiter):
+        meta_path = meta_path_for(block_path)
+        if os.path.exists(meta_path):
+            self.chunk_size, self.checksums = read_meta(meta_path)
+        else:
+            # stored before checksums existed, checksum while reading instead
+            self.chunk_size, self.checksums = CHECKSUM_CHUNK_SIZE, None
+        self.file = open(block_path, "rb")
+        self.size = framed_length(os.fstat(self.file.fileno()).st_size, self.chunk_size)
+        self.chunk_index = 0
+        self.limiter = limiter
+        self.pending = memoryview(b"")
+
+    def __len__(self):
+        return self.size
+
+    def read(self, amount=-1):
+        if not self.pending:
+            data = self.file.read(self.chunk_size)
+            if not data:
+                return b""
+            crc = self.checksums[self.chunk_index] if self.checksums else zlib.crc32(data)
+            self.chunk_index += 1
+            self.limiter.consume(len(data))
+            self.pending = memoryview(data + struct.pack(">I", crc))
+        if amount is None or amount < 0 or amount >= len(self.pending):
+            data, self.pending = bytes(self.pending), memoryview(b"")
+        else:
+            data, self.pending = bytes(self.pending[:amount]), self.pending[amount:]
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+class BlockReplicator:
+    """
+    Runs the block copies the NameNode hands out in heartbeat responses.
+    A copy is a normal pipelined PUT of the stored block to the first target (which forwards it
+    to the rest), so the targets verify checksums and report the block like any upload.
+    Copies that fail are handed back to the NameNode with the next heartbeat.
+    """
+    def __init__(self, get_block_path, bytes_per_second=REPLICATION_BYTES_PER_SECOND, workers=REPLICATION_WORKERS):
+        self.get_block_path = get_block_path
+        self.limiter = RateLimiter(bytes_per_second)
+        self.workers = workers
+        self.queue = queue.Queue()
+        self.failed = []
+        self.lock = threading.Lock()
+
+    def start(self):
+        for _ in range(self.workers):
+            threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def submit(self, commands):
+        for command in commands:
+            if command.get("op") == "replicate":
+                self.queue.put(command)
+            else:
+                logger.warning(f"Ignoring unknown command from the NameNode: {command}")
+
+    def take_failed(self):
+        with self.lock:
+            failed, self.failed = self.failed, []
+        return failed
+
+    def restore_failed(self, block_ids):
+        with self.lock:
+            self.failed.extend(block_ids)
+
+    def _run(self):
+        while True:
+            command = self.queue.get()
+            block_id = command["block_id"]
+            try:
+                self.replicate(block_id, command["targets"])
+            except Exception as e:
+                logger.error(f"Failed to replicate block {block_id} to {command['targets']}: {e}")
+                with self.lock:
+                    self.failed.append(block_id)
+
+    def replicate(self, block_id, targets):
+        block_path = self.get_block_path(block_id)
+        if block_path is None:
+            raise IOError(f"block {block_id} is not stored here")
+        body = StoredBlockStream(block_path, self.limiter)
+        try:
+            headers = {
+                "Content-Type": "application/octet-stream",
+                CHECKSUM_HEADER: str(body.chunk_size),
+                PIPELINE_HEADER: ",".join(targets[1:])
+            }
+            response = get_session().put(datanode_block_url(targets[0], block_id), data=body, headers=headers,
+                                         timeout=(HTTP_CONNECT_TIMEOUT, PIPELINE_TIMEOUT_SECONDS))
+        finally:
+            body.close()
+        if response.status_code != 200:
+            raise IOError(f"{targets[0]} returned {response.status_code}: {response.text}")
+        missing = [node for node in targets if node not in response.json().get("replicas", [])]
+        if missing:
+            raise IOError(f"not stored on {missing}")
+        logger.info(f"Replicated block {block_id} to {targets}")
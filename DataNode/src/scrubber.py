@@ -0,0 +1,95 @@
+import logging
+import os
+import time
+
+from checksums import ChecksumError, meta_path_for, verify_block_file
+from http_pool import get_session, HTTP_CONNECT_TIMEOUT
+from throttle import RateLimiter
+from volumes import block_lock
+
+logger = logging.getLogger(__name__)
+
+# Pause between full passes over the data dirs
+SCRUB_INTERVAL_SECONDS = int(os.getenv("SCRUB_INTERVAL_SECONDS", str(6 * 3600)))
+# Disk read budget for scrubbing so it never competes with client traffic
+SCRUB_BYTES_PER_SECOND = int(os.getenv("SCRUB_BYTES_PER_SECOND", str(10 * 1024 * 1024)))
+
+
+def pair_stat(block_path, meta_path):
+    """Identity of a block's .dat/.meta pair, a writer putting a new copy in place changes it."""
+    return tuple((st.st_ino, st.st_size, st.st_mtime_ns) for st in (os.stat(block_path), os.stat(meta_path)))
+
+
+class BlockScrubber:
+    """
+    Background thread that re-reads every stored block and checks it against its .meta sidecar.
+    Corrupt blocks are moved aside as .corrupt (so they are never served again) and reported to
+    the NameNode, which drops this replica from the block's locations.
+    A block a writer replaced while it was being read is left alone until the next pass.
+    """
+    def __init__(self, node_id, data_dirs, namenode_url, storage_stats, block_reports=None):
+        self.node_id = node_id
+        self.data_dirs = data_dirs
+        self.report_url = f"{namenode_url}/nodes/{node_id}/corrupt_blocks"
+        self.storage_stats = storage_stats
+        self.block_reports = block_reports
+
+    def run(self):
+        while True:
+            try:
+                self.scrub_once()
+            except Exception as e:
+                logger.error(f"Block scrub pass failed: {e}")
+            time.sleep(SCRUB_INTERVAL_SECONDS)
+
+    def scrub_once(self):
+        limiter = RateLimiter(SCRUB_BYTES_PER_SECOND)
+        scanned, corrupt = 0, []
+        block_files = []
+        for data_dir in self.data_dirs:
+            with os.scandir(data_dir) as entries:
+                block_files += [entry.path for entry in entries if entry.name.endswith(".dat")]
+        for block_path in block_files:
+            meta_path = meta_path_for(block_path)
+            try:
+                verified = pair_stat(block_path, meta_path)
+            except FileNotFoundError:
+                continue  # written before checksums existed, or deleted since the listing
+            try:
+                problem = verify_block_file(block_path, meta_path, on_chunk=limiter.consume)
+            except (ChecksumError, OSError) as e:
+                problem = str(e)
+            scanned += 1
+            if problem:
+                block_id = os.path.basename(block_path)[:-len(".dat")]
+                if not self.quarantine(block_path, meta_path, verified):
+                    logger.info(f"Block {block_id} was rewritten while it was scrubbed, checking it next pass")
+                    continue
+                logger.error(f"Block {block_id} is corrupt on disk: {problem}")
+                corrupt.append(block_id)
+                if self.block_reports:
+                    # also goes out with the next heartbeat in case the report below doesn't make it
+                    self.block_reports.block_removed(block_id)
+        if corrupt:
+            self.report(corrupt)
+        logger.info(f"Scrubbed {scanned} blocks, {len(corrupt)} corrupt")
+        return corrupt
+
+    def quarantine(self, block_path, meta_path, verified):
+        """Move a corrupt block aside unless it changed since it was verified, True if it was moved."""
+        with block_lock(block_path):
+            try:
+                if pair_stat(block_path, meta_path) != verified:
+                    return False
+            except FileNotFoundError:
+                return False
+            os.replace(block_path, block_path[:-len(".dat")] + ".corrupt")
+            os.remove(meta_path)
+        self.storage_stats.block_removed(verified[0][1])
+        return True
+
+    def report(self, block_ids):
+        try:
+            get_session().post(self.report_url, json={"block_ids": block_ids}, timeout=(HTTP_CONNECT_TIMEOUT, 30))
+        except Exception as e:
+            logger.error(f"Failed to report {len(block_ids)} corrupt blocks to the NameNode: {e}")
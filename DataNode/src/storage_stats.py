@@ -0,0 +1,65 @@
+import os
+import shutil
+import threading
+
+# Override the capacity reported to the NameNode (handy when several DataNodes share one disk)
+CAPACITY_BYTES = os.getenv("CAPACITY_BYTES")
+
+
+class StorageStats:
+    """
+    Running totals of what this DataNode stores, sent with every heartbeat.
+    Counted once from the data dirs at startup and then kept up to date by the write path,
+    so a heartbeat never has to walk the directories.
+    """
+    def __init__(self, data_dirs):
+        self.data_dirs = data_dirs
+        self.used_bytes = 0
+        self.block_count = 0
+        self.inflight_writes = 0
+        self.lock = threading.Lock()
+        for data_dir in data_dirs:
+            with os.scandir(data_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".dat") and entry.is_file():
+                        self.used_bytes += entry.stat().st_size
+                        self.block_count += 1
+
+    def write_started(self):
+        with self.lock:
+            self.inflight_writes += 1
+
+    def write_finished(self):
+        with self.lock:
+            self.inflight_writes -= 1
+
+    def block_stored(self, size, replaced_size=None):
+        """Account for a block that was renamed into place, replaced_size if it overwrote an older copy."""
+        with self.lock:
+            self.used_bytes += size
+            if replaced_size is None:
+                self.block_count += 1
+            else:
+                self.used_bytes -= replaced_size
+
+    def block_removed(self, size):
+        with self.lock:
+            self.used_bytes -= size
+            self.block_count -= 1
+
+    def capacity(self):
+        """Size of every filesystem holding a data dir, counted once even if several dirs share it."""
+        if CAPACITY_BYTES:
+            return int(CAPACITY_BYTES)
+        devices = {os.stat(data_dir).st_dev: data_dir for data_dir in self.data_dirs}
+        return sum(shutil.disk_usage(data_dir).total for data_dir in devices.values())
+
+    def report(self):
+        capacity = self.capacity()
+        with self.lock:
+            return {
+                "capacity_bytes": capacity,
+                "used_bytes": self.used_bytes,
+                "block_count": self.block_count,
+                "inflight_writes": self.inflight_writes
+            }
@@ -0,0 +1,25 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Sleeps just enough to keep the average rate under bytes_per_second, safe to share between threads.
+    Credit from idle time is capped at a second's worth so a limiter that sat unused doesn't allow a burst.
+    """
+    def __init__(self, bytes_per_second):
+        self.bytes_per_second = bytes_per_second
+        self.start = time.monotonic()
+        self.consumed = 0
+        self.lock = threading.Lock()
+
+    def consume(self, n_bytes):
+        with self.lock:
+            now = time.monotonic()
+            if self.consumed / self.bytes_per_second < now - self.start - 1:
+                self.start = now - 1
+                self.consumed = self.bytes_per_second
+            self.consumed += n_bytes
+            ahead = self.consumed / self.bytes_per_second - (now - self.start)
+        if ahead > 0:
+            time.sleep(ahead)
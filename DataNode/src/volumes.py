@@ -0,0 +1,284 @@
+import asyncio
+import logging
+import os
+import shutil
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from uuid import uuid4
+
+from checksums import meta_path_for, write_meta_file
+
+logger = logging.getLogger(__name__)
+
+# Disk threads per data directory, a slow disk only backs up the writes that landed on it
+IO_THREADS_PER_VOLUME = int(os.getenv("IO_THREADS_PER_VOLUME", "4"))
+# none: leave it to the page cache (HDFS' default), block: fsync every block before acking it,
+# group: blocks finishing within FSYNC_GROUP_MS on a volume are fsync'd together and then acked
+FSYNC_MODE = os.getenv("FSYNC_MODE", "none")
+FSYNC_GROUP_MS = int(os.getenv("FSYNC_GROUP_MS", "10"))
+FSYNC_MODES = ("none", "block", "group")
+# Incoming block data is gathered into writes of this size and handed to the volume's threads,
+# the next piece is received from the network while the previous one is being written
+WRITE_BEHIND_BYTES = int(os.getenv("WRITE_BEHIND_BYTES", str(4 * 1024 * 1024)))
+# A block's .meta and .dat only change under its lock (the scrubber takes it before quarantining),
+# striped so there is no per-block bookkeeping
+BLOCK_LOCK_STRIPES = 64
+block_locks = [threading.Lock() for _ in range(BLOCK_LOCK_STRIPES)]
+
+
+def fsync_path(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def block_lock(block_path):
+    return block_locks[hash(block_path) % BLOCK_LOCK_STRIPES]
+
+
+def meta_temp_path(temp_path):
+    """Where a block's .meta is written next to its temp file until both are put in place."""
+    return temp_path[:-len(".tmp")] + ".meta.tmp"
+
+
+def install_block(temp_path, block_path):
+    """Rename a written block and its .meta into place, sidecar first so every .dat that exists has its checksums."""
+    with block_lock(block_path):
+        os.replace(meta_temp_path(temp_path), meta_path_for(block_path))
+        os.replace(temp_path, block_path)
+
+
+class GroupSyncer:
+    """
+    Group commit for block files on one volume, like the NameNode's edit log does for edits.
+    Finished blocks are queued with commit() without an fsync of their own. Every FSYNC_GROUP_MS a
+    background thread fsyncs the data and .meta files of everything that arrived, all at once on
+    its own threads so the filesystem can fold them into one journal commit, renames the blocks into
+    place and fsyncs the directory once for all of those renames.
+    """
+    def __init__(self, directory, interval_ms, threads=IO_THREADS_PER_VOLUME):
+        self.directory = directory
+        self.interval = interval_ms / 1000
+        self.pending = []  # (temp path, block path, future)
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.fsync_executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix=f"group-fsync-{os.path.basename(directory)}")
+        threading.Thread(target=self._run, daemon=True, name=f"group-sync-{directory}").start()
+
+    def commit(self, temp_path, block_path):
+        """Returns a Future that resolves once the block and its .meta are durable under their final names."""
+        future = Future()
+        with self.lock:
+            self.pending.append((temp_path, block_path, future))
+        self.wakeup.set()
+        return future
+
+    def _run(self):
+        while True:
+            self.wakeup.wait()
+            # let the rest of the group arrive
+            threading.Event().wait(self.interval)
+            with self.lock:
+                group, self.pending = self.pending, []
+                self.wakeup.clear()
+            if group:
+                self._sync_group(group)
+
+    def _sync_files(self, temp_path):
+        fsync_path(temp_path)
+        fsync_path(meta_temp_path(temp_path))
+
+    def _fail(self, temp_path, future, e):
+        """One block of the group failed, only its writer hears about it and its temp files go away."""
+        logger.error(f"Group fsync of {temp_path} failed: {e}")
+        future.set_exception(e)
+        for path in (temp_path, meta_temp_path(temp_path)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _sync_group(self, group):
+        synced = [(entry, self.fsync_executor.submit(self._sync_files, entry[0])) for entry in group]
+        renamed = []
+        for (temp_path, block_path, future), fsync in synced:
+            try:
+                fsync.result()
+                install_block(temp_path, block_path)
+            except Exception as e:
+                self._fail(temp_path, future, e)
+                continue
+            renamed.append(future)
+        if not renamed:
+            return
+        try:
+            fsync_path(self.directory)
+        except Exception as e:
+            logger.error(f"Directory fsync of {len(renamed)} blocks in {self.directory} failed: {e}")
+            for future in renamed:
+                future.set_exception(e)
+            return
+        for future in renamed:
+            future.set_result(None)
+
+
+class Volume:
+    """One data directory (usually one disk) with its own pool of disk threads."""
+    def __init__(self, path, threads=IO_THREADS_PER_VOLUME, fsync_mode=FSYNC_MODE, group_ms=FSYNC_GROUP_MS):
+        if fsync_mode not in FSYNC_MODES:
+            raise ValueError(f"FSYNC_MODE must be one of {FSYNC_MODES}, got {fsync_mode}")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.fsync_mode = fsync_mode
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix=f"volume-{os.path.basename(path)}")
+        self.syncer = GroupSyncer(path, group_ms, threads) if fsync_mode == "group" else None
+        self.remove_temp_files()
+
+    def remove_temp_files(self):
+        """Temp files of writes a crash cut short, nothing is writing yet when the volume is opened."""
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if entry.name.endswith(".tmp"):
+                    os.remove(entry.path)
+
+    def block_path(self, block_id):
+        return os.path.join(self.path, f"{block_id}.dat")
+
+    def run(self, function, *args):
+        """Run function on this volume's disk threads, awaitable from the event loop."""
+        return asyncio.wrap_future(self.executor.submit(function, *args))
+
+    def free_bytes(self):
+        return shutil.disk_usage(self.path).free
+
+    async def commit(self, file, temp_path, block_path, chunk_size, checksums):
+        """
+        Close a fully written temp file and make it the block, durable as FSYNC_MODE says.
+        Returns the size of the copy of the block it replaced, None if there was none.
+        """
+        replaced_size = await self.run(self._finish, file, temp_path, block_path, chunk_size, checksums)
+        if self.syncer is not None:
+            await asyncio.wrap_future(self.syncer.commit(temp_path, block_path))
+        return replaced_size
+
+    def _finish(self, file, temp_path, block_path, chunk_size, checksums):
+        # group mode leaves the fsyncs to the GroupSyncer
+        durable = self.fsync_mode == "block"
+        try:
+            if durable:
+                file.flush()
+                os.fsync(file.fileno())
+        finally:
+            file.close()
+        replaced_size = os.path.getsize(block_path) if os.path.exists(block_path) else None
+        write_meta_file(meta_temp_path(temp_path), chunk_size, checksums, fsync=durable)
+        if self.syncer is None:
+            # atomic moves so readers only ever see complete blocks
+            install_block(temp_path, block_path)
+            if durable:
+                fsync_path(self.path)
+        return replaced_size
+
+
+class VolumeSet:
+    """
+    Every data directory of this DataNode. New blocks go round robin over the volumes with room
+    for them (like HDFS' RoundRobinVolumeChoosingPolicy), a block that is already stored is
+    rewritten on the volume that holds it.
+    """
+    def __init__(self, paths, **volume_options):
+        self.volumes = [Volume(path, **volume_options) for path in paths]
+        self.next = 0
+        self.lock = threading.Lock()
+
+    @property
+    def paths(self):
+        return [volume.path for volume in self.volumes]
+
+    def find(self, block_id):
+        """(volume, block path) of a stored block, (None, None) if no volume has it."""
+        for volume in self.volumes:
+            block_path = volume.block_path(block_id)
+            if os.path.exists(block_path):
+                return volume, block_path
+        return None, None
+
+    def choose(self, block_id, size=0):
+        """Volume to write block_id to. Blocks for a while on disk stats, so call it off the event loop."""
+        volume, _ = self.find(block_id)
+        if volume is not None:
+            return volume
+        with self.lock:
+            start = self.next
+            self.next = (self.next + 1) % len(self.volumes)
+        for i in range(len(self.volumes)):
+            volume = self.volumes[(start + i) % len(self.volumes)]
+            if volume.free_bytes() > size:
+                return volume
+        raise IOError(f"No data directory has {size} bytes free")
+
+
+class BlockWriter:
+    """
+    Writes one incoming block to a temp file on a volume without blocking the event loop.
+    Data is gathered into WRITE_BEHIND_BYTES pieces and each piece is written by the volume's
+    threads while the next one is received. Only one piece per block is in flight, so they land in order.
+    """
+    def __init__(self, volume, block_id):
+        self.volume = volume
+        self.block_path = volume.block_path(block_id)
+        # unique per writer, two uploads of the same block id must not write into each other's file
+        self.temp_path = f"{self.block_path}.{uuid4().hex}.tmp"
+        self.file = None
+        self.buffer = []
+        self.buffered = 0
+        self.inflight = None
+
+    async def open(self):
+        self.file = await self.volume.run(open, self.temp_path, "wb")
+
+    async def write(self, data):
+        if not data:
+            return
+        self.buffer.append(data)
+        self.buffered += len(data)
+        if self.buffered >= WRITE_BEHIND_BYTES:
+            await self._write_buffer()
+
+    async def _write_buffer(self):
+        if self.inflight is not None:
+            await self.inflight
+            self.inflight = None
+        if self.buffered:
+            data = b"".join(self.buffer)
+            self.buffer, self.buffered = [], 0
+            self.inflight = self.volume.run(self.file.write, data)
+
+    async def commit(self, chunk_size, checksums):
+        """Write what is left and put the block in place, returns the size of the copy it replaced (or None)."""
+        await self._write_buffer()
+        if self.inflight is not None:
+            await self.inflight
+            self.inflight = None
+        return await self.volume.commit(self.file, self.temp_path, self.block_path, chunk_size, checksums)
+
+    async def abort(self):
+        """Drop a partially written block, only the temp file goes away."""
+        if self.inflight is not None:
+            try:
+                await self.inflight
+            except Exception:
+                pass
+        await self.volume.run(self._remove_temp)
+
+    def _remove_temp(self):
+        if self.file is not None and not self.file.closed:
+            self.file.close()
+        for path in (self.temp_path, meta_temp_path(self.temp_path)):
+            if os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
@@ -0,0 +1,75 @@
+import os
+import struct
+import zlib
+
+import pytest
+
+from checksums import (ChecksumComputer, ChecksumError, FramedChecksumVerifier, framed_length, meta_path_for, read_meta,
+                       verify_block_file, write_meta)
+
+CHUNK = 16
+
+
+def frame(data, chunk_size=CHUNK):
+    """[chunk][crc32] packets, how the client sends a block."""
+    return b"".join(data[i:i + chunk_size] + struct.pack(">I", zlib.crc32(data[i:i + chunk_size]))
+                    for i in range(0, len(data), chunk_size))
+
+
+def unframe(body, pieces, chunk_size=CHUNK):
+    verifier = FramedChecksumVerifier(chunk_size)
+    out = b"".join(verifier.feed(body[i:i + pieces]) for i in range(0, len(body), pieces)) + verifier.finish()
+    return out, verifier.checksums
+
+
+@pytest.mark.parametrize("size", [0, 1, CHUNK - 1, CHUNK, CHUNK + 1, 5 * CHUNK, 5 * CHUNK + 3])
+@pytest.mark.parametrize("pieces", [1, 7, CHUNK + 4, 1000])
+def test_framed_body_unpacks_to_the_data(size, pieces):
+    data = os.urandom(size)
+    body = frame(data)
+    assert len(body) == framed_length(size, CHUNK)
+    out, checksums = unframe(body, pieces)
+    assert out == data
+    assert checksums == [zlib.crc32(data[i:i + CHUNK]) for i in range(0, size, CHUNK)]
+
+
+def test_corrupt_chunk_is_caught():
+    body = bytearray(frame(os.urandom(3 * CHUNK)))
+    body[CHUNK + 4 + 2] ^= 0xFF
+    with pytest.raises(ChecksumError, match="chunk 1"):
+        unframe(bytes(body), 5)
+
+
+def test_truncated_last_packet_is_caught():
+    body = frame(os.urandom(2 * CHUNK + 5))
+    with pytest.raises(ChecksumError):
+        unframe(body[:2 * (CHUNK + 4) + 3], 100)
+
+
+def test_computer_matches_the_client_checksums():
+    data = os.urandom(4 * CHUNK + 9)
+    computer = ChecksumComputer(CHUNK)
+    for i in range(0, len(data), 5):
+        computer.feed(data[i:i + 5])
+    computer.finish()
+    assert computer.checksums == unframe(frame(data), 100)[1]
+
+
+def test_meta_round_trip_and_block_verification(tmp_path):
+    data = os.urandom(3 * CHUNK)
+    block_path = str(tmp_path / "block_a.dat")
+    with open(block_path, "wb") as f:
+        f.write(data)
+    checksums = unframe(frame(data), 100)[1]
+    write_meta(meta_path_for(block_path), CHUNK, checksums)
+    assert read_meta(meta_path_for(block_path)) == (CHUNK, checksums)
+    assert sorted(os.listdir(tmp_path)) == ["block_a.dat", "block_a.meta"]
+    assert verify_block_file(block_path, meta_path_for(block_path)) is None
+
+    with open(block_path, "r+b") as f:
+        f.seek(2 * CHUNK)
+        f.write(b"\0")
+    assert verify_block_file(block_path, meta_path_for(block_path)) == "chunk 2 checksum mismatch"
+    with open(block_path, "wb") as f:
+        f.write(data + b"extra")
+    assert "longer" in verify_block_file(block_path, meta_path_for(block_path))
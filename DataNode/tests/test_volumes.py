@@ -0,0 +1,87 @@
+import asyncio
+import os
+import zlib
+
+import pytest
+
+from checksums import CHECKSUM_CHUNK_SIZE, meta_path_for, read_meta, verify_block_file
+from volumes import BlockWriter, GroupSyncer, Volume, VolumeSet
+
+
+async def put(volume, block_id, data, piece=65536):
+    writer = BlockWriter(volume, block_id)
+    await writer.open()
+    for i in range(0, len(data), piece):
+        await writer.write(data[i:i + piece])
+        await asyncio.sleep(0)
+    checksums = [zlib.crc32(data[i:i + CHECKSUM_CHUNK_SIZE]) for i in range(0, len(data), CHECKSUM_CHUNK_SIZE)]
+    return await writer.commit(CHECKSUM_CHUNK_SIZE, checksums)
+
+
+@pytest.mark.parametrize("fsync_mode", ["none", "block", "group"])
+def test_concurrent_writes_of_one_block_do_not_mix(tmp_path, fsync_mode):
+    volume = Volume(str(tmp_path), fsync_mode=fsync_mode, group_ms=1)
+
+    async def main():
+        return await asyncio.gather(put(volume, "b1", b"\1" * 300_000), put(volume, "b1", b"\2" * 300_000))
+
+    asyncio.run(main())
+    block_path = volume.block_path("b1")
+    with open(block_path, "rb") as f:
+        data = f.read()
+    assert len(data) == 300_000 and len(set(data)) == 1
+    assert verify_block_file(block_path, meta_path_for(block_path)) is None
+    assert sorted(os.listdir(tmp_path)) == ["b1.dat", "b1.meta"]
+
+
+def test_rewrite_returns_the_replaced_size(tmp_path):
+    volume = Volume(str(tmp_path))
+    assert asyncio.run(put(volume, "b1", b"x" * 1000)) is None
+    assert asyncio.run(put(volume, "b1", b"y" * 10)) == 1000
+    assert read_meta(meta_path_for(volume.block_path("b1")))[1] == [zlib.crc32(b"y" * 10)]
+
+
+def test_abort_leaves_no_files(tmp_path):
+    volume = Volume(str(tmp_path))
+
+    async def main():
+        writer = BlockWriter(volume, "b1")
+        await writer.open()
+        await writer.write(b"partial")
+        await writer.abort()
+
+    asyncio.run(main())
+    assert os.listdir(tmp_path) == []
+
+
+def test_opening_a_volume_removes_leftover_temp_files(tmp_path):
+    (tmp_path / "b1.dat.0123.tmp").write_bytes(b"cut short")
+    (tmp_path / "b2.dat").write_bytes(b"kept")
+    Volume(str(tmp_path))
+    assert os.listdir(tmp_path) == ["b2.dat"]
+
+
+def test_group_failure_only_fails_its_own_block(tmp_path):
+    syncer = GroupSyncer(str(tmp_path), 1)
+    futures = []
+    for name in ("good", "bad"):
+        temp_path = str(tmp_path / f"{name}.dat.0123.tmp")
+        with open(temp_path, "wb") as f:
+            f.write(b"data")
+        if name == "good":
+            with open(str(tmp_path / f"{name}.dat.0123.meta.tmp"), "wb") as f:
+                f.write(b"meta")
+        futures.append(syncer.commit(temp_path, str(tmp_path / f"{name}.dat")))
+    assert futures[0].result(5) is None
+    with pytest.raises(FileNotFoundError):
+        futures[1].result(5)
+    assert sorted(os.listdir(tmp_path)) == ["good.dat", "good.meta"]
+
+
+def test_volume_set_keeps_a_block_on_its_volume(tmp_path):
+    volumes = VolumeSet([str(tmp_path / "a"), str(tmp_path / "b")])
+    first = volumes.choose("b1")
+    asyncio.run(put(first, "b1", b"data"))
+    assert all(volumes.choose("b1") is first for _ in range(4))
+    assert {volumes.choose(f"new{n}").path for n in range(4)} == set(volumes.paths)
+    assert volumes.find("b1") == (first, first.block_path("b1"))
@@ -1,47 +1,208 @@
-
-from fastapi import FastAPI, Request
-from block_manager import split_file_into_blocks
-from pydantic import BaseModel
-import os 
-from metadata_manager import update_datanode_heartbeat,assign_blocks_to_datanode, load_metadata
-from namenode_logger import get_namenode_logger
-
-REPLICATION_FACTOR = int(os.getenv('REPLICATION_FACTOR', '2'))
-
-
-logger = get_namenode_logger()
-# Logger done initialized above 🥀
-logger.info(f"NameNode starting with replication factor: {REPLICATION_FACTOR}")
-logger.info("Loading metadat on Namenode Startup ...")
-load_metadata()
-logger.info("Namenode ready to serve request")
-
-app = FastAPI()
-
-
-#pydantic class for file upload
-class FileUploadRequest(BaseModel):
-    filename:str
-    filesize_bytes:int
-
-#below function be beating only if Namenode is up and running 
-@app.get("/health")
-async def namenode_healthcheck():
-    return {"status": "ok"}
-
-
-# ts is to just for namenode to know that datanode is alive
-@app.post("/nodes/{node_id}/heartbeat")
-async def recieve_heartbeats(node_id: str, request: Request):
-    payload = await request.json()
-    logger.info(f"Heartbeat received from {node_id}: {payload}")
-    update_datanode_heartbeat(node_id)
-    return {"recieved from": node_id, "payload": payload}
-
-# This one is when client upload the file so namenode has to split it up 
-@app.post("/files")
-async def upload_file(file_request: FileUploadRequest):
-    filename = file_request.filename
-    filesize_bytes = file_request.filesize_bytes
-    assignment = assign_blocks_to_datanode(filename, filesize_bytes, REPLICATION_FACTOR)
-    return assignment
\ No newline at end of file
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
+from block_manager import split_file_into_blocks
+from pydantic import BaseModel
+from typing import List, Optional
+import os 
+from metadata_manager import update_datanode_heartbeat,allocate_blocks, allocate_files, allocate_containers, reopen_file, wait_until_durable, get_file_blocks, report_corrupt_replicas
+from metadata_manager import (process_block_report, process_incremental_report, replication_failed,
+                              take_replication_commands, get_replication_status, get_dedup_status)
+from metadata_manager import start_metadata_loader, wait_until_loaded, is_namespace_loaded
+from namenode_logger import get_namenode_logger
+from liveness import HeartbeatStats
+from metrics import CONTENT_TYPE, Counter, Histogram, render, timed
+
+REPLICATION_FACTOR = int(os.getenv('REPLICATION_FACTOR', '2'))
+# heartbeats are summarized in namenode.log once per this many seconds instead of logged one by one
+HEARTBEAT_LOG_INTERVAL_SECONDS = int(os.getenv('HEARTBEAT_LOG_INTERVAL_SECONDS', '60'))
+# most files one POST /files/batch may allocate, keeps a single request from holding the namespace lock for long
+MAX_BATCH_FILES = int(os.getenv('MAX_BATCH_FILES', '1000'))
+# packed files are tiny, so a POST /files/pack may carry more of them
+MAX_PACK_FILES = int(os.getenv('MAX_PACK_FILES', '10000'))
+
+
+logger = get_namenode_logger()
+# Logger done initialized above 🥀
+logger.info(f"NameNode starting with replication factor: {REPLICATION_FACTOR}")
+logger.info("Loading metadat on Namenode Startup ...")
+# loads in the background: health checks and heartbeats are served right away, the rest waits for the namespace
+start_metadata_loader()
+logger.info("Namenode ready to serve request")
+
+app = FastAPI()
+heartbeat_stats = HeartbeatStats(HEARTBEAT_LOG_INTERVAL_SECONDS)
+# request latency including the wait for the edit log fsync, what the client actually sees
+allocation_seconds = Histogram("namenode_allocation_seconds", "Time to allocate and durably log blocks per request", ("endpoint",))
+heartbeats_received = Counter("namenode_heartbeats_total", "Heartbeats received from DataNodes")
+
+
+#pydantic class for file upload
+class ChunkInfo(BaseModel):
+    fingerprint: str  # sha256 hex of the chunk's bytes
+    size: int
+
+class FileUploadRequest(BaseModel):
+    filename:str
+    filesize_bytes:int
+    storage_policy: Optional[str] = None  # "replicated" (default) or an erasure coding policy like "RS-6-3"
+    chunks: Optional[List[ChunkInfo]] = None  # content-defined chunks in file order, makes it a dedup upload
+
+class FileBatchRequest(BaseModel):
+    files: List[FileUploadRequest]
+
+class FileReopenRequest(BaseModel):
+    filename: str
+    filesize_bytes: int
+    sent_blocks: List[str] = []  # block ids the client already got to every DataNode, they keep their DataNodes
+
+#below function be beating only if Namenode is up and running 
+@app.get("/health")
+async def namenode_healthcheck():
+    return {"status": "ok", "namespace_loaded": is_namespace_loaded()}
+
+# Prometheus scrape endpoint, see metrics.py for what is exported
+@app.get("/metrics")
+async def metrics():
+    return Response(await run_in_threadpool(render), media_type=CONTENT_TYPE)
+
+
+# ts is to just for namenode to know that datanode is alive, it also carries the node's storage report
+# and an incremental block report (blocks stored/removed since the last heartbeat).
+# The response hands the DataNode any block copies the replication monitor wants it to make.
+@app.post("/nodes/{node_id}/heartbeat")
+async def recieve_heartbeats(node_id: str, request: Request):
+    heartbeats_received.inc()
+    payload = await request.json()
+    update_datanode_heartbeat(node_id, payload.get("capacity_bytes"), payload.get("used_bytes"),
+                              payload.get("inflight_writes"), payload.get("block_count"))
+    blocks_added = payload.get("blocks_added", [])
+    blocks_removed = payload.get("blocks_removed", [])
+    if blocks_added or blocks_removed:
+        txid = await run_in_threadpool(process_incremental_report, node_id, blocks_added, blocks_removed)
+        if txid is not None:
+            await wait_until_durable(txid)
+    if payload.get("replication_failed"):
+        await run_in_threadpool(replication_failed, node_id, payload["replication_failed"])
+    summary = heartbeat_stats.record(node_id)
+    if summary:
+        logger.info(summary)
+    return {"recieved from": node_id, "commands": take_replication_commands(node_id)}
+
+# Full block report, every block the DataNode has on disk (sent at startup and every few hours)
+@app.post("/nodes/{node_id}/block_report")
+async def recieve_block_report(node_id: str, request: Request):
+    await wait_until_loaded()
+    payload = await request.json()
+    block_ids = payload.get("block_ids", [])
+    txid = await run_in_threadpool(process_block_report, node_id, block_ids)
+    if txid is not None:
+        await wait_until_durable(txid)
+    return {"recieved from": node_id, "blocks": len(block_ids)}
+
+# How far re-replication has got: blocks queued, copies running, blocks with no live replica
+@app.get("/replication")
+async def replication_status():
+    await wait_until_loaded()
+    return await run_in_threadpool(get_replication_status)
+
+# How much dedup uploads share: file bytes vs bytes of the distinct chunks behind them
+@app.get("/dedup")
+async def dedup_status():
+    await wait_until_loaded()
+    return await run_in_threadpool(get_dedup_status)
+
+# DataNode scrubber found blocks that no longer match their checksums and quarantined them
+@app.post("/nodes/{node_id}/corrupt_blocks")
+async def recieve_corrupt_blocks(node_id: str, request: Request):
+    await wait_until_loaded()
+    payload = await request.json()
+    block_ids = payload.get("block_ids", [])
+    txid = await run_in_threadpool(report_corrupt_replicas, node_id, block_ids)
+    if txid is not None:
+        await wait_until_durable(txid)
+    return {"recieved from": node_id, "blocks": len(block_ids)}
+
+# This one is when client upload the file so namenode has to split it up 
+# Placement runs in a worker thread and the fsync on the edit log writer thread,
+# so a huge allocation never stalls heartbeats or other requests on the event loop
+@app.post("/files")
+@timed(allocation_seconds, "files")
+async def upload_file(file_request: FileUploadRequest):
+    await wait_until_loaded()
+    filename = file_request.filename
+    filesize_bytes = file_request.filesize_bytes
+    chunks = None
+    if file_request.chunks is not None:
+        chunks = [{"fingerprint": chunk.fingerprint, "size": chunk.size} for chunk in file_request.chunks]
+    try:
+        assignment, txid = await run_in_threadpool(allocate_blocks, filename, filesize_bytes, REPLICATION_FACTOR,
+                                                   file_request.storage_policy, chunks)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if txid is not None:
+        await wait_until_durable(txid)
+    return assignment
+
+# Same as POST /files for many files at once: one round trip and one edit log fsync for the whole batch.
+# Every file gets its own entry back, files that could not be allocated carry an "error" instead of blocks
+@app.post("/files/batch")
+@timed(allocation_seconds, "files_batch")
+async def upload_files(batch_request: FileBatchRequest):
+    await wait_until_loaded()
+    if len(batch_request.files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"{len(batch_request.files)} files in one batch, at most {MAX_BATCH_FILES}")
+    file_requests = []
+    for file_request in batch_request.files:
+        chunks = None
+        if file_request.chunks is not None:
+            chunks = [{"fingerprint": chunk.fingerprint, "size": chunk.size} for chunk in file_request.chunks]
+        file_requests.append({"filename": file_request.filename, "filesize_bytes": file_request.filesize_bytes,
+                              "storage_policy": file_request.storage_policy, "chunks": chunks})
+    results, txid = await run_in_threadpool(allocate_files, file_requests, REPLICATION_FACTOR)
+    if txid is not None:
+        await wait_until_durable(txid)
+    return {"files": results}
+
+# Small files packed into shared container blocks: the client sends the files' names and sizes, gets back
+# containers (block id, DataNodes, and where each file sits inside) and uploads each container as one block
+@app.post("/files/pack")
+@timed(allocation_seconds, "files_pack")
+async def pack_files(batch_request: FileBatchRequest):
+    await wait_until_loaded()
+    if len(batch_request.files) > MAX_PACK_FILES:
+        raise HTTPException(status_code=400, detail=f"{len(batch_request.files)} files in one pack, at most {MAX_PACK_FILES}")
+    file_requests = [{"filename": file_request.filename, "filesize_bytes": file_request.filesize_bytes,
+                      "storage_policy": file_request.storage_policy, "chunks": file_request.chunks}
+                     for file_request in batch_request.files]
+    packing, txid = await run_in_threadpool(allocate_containers, file_requests, REPLICATION_FACTOR)
+    if txid is not None:
+        await wait_until_durable(txid)
+    return packing
+
+# Resume an upload that failed partway: the file's blocks come back with the ids they were allocated with
+# (dead DataNodes swapped out of the pipelines of blocks still to send) and the client only sends what is missing
+@app.post("/files/reopen")
+@timed(allocation_seconds, "files_reopen")
+async def reopen_upload(reopen_request: FileReopenRequest):
+    await wait_until_loaded()
+    try:
+        assignment, txid = await run_in_threadpool(reopen_file, reopen_request.filename, reopen_request.filesize_bytes,
+                                                   reopen_request.sent_blocks)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if assignment is None:
+        raise HTTPException(status_code=404, detail=f"File {reopen_request.filename} not found")
+    if txid is not None:
+        await wait_until_durable(txid)
+    return assignment
+
+# Client asks where a file's blocks live so it can read them straight from the DataNodes
+@app.get("/files/{filename:path}")
+async def get_file(filename: str):
+    await wait_until_loaded()
+    file_blocks = await run_in_threadpool(get_file_blocks, filename)
+    if file_blocks is None:
+        raise HTTPException(status_code=404, detail=f"File {filename} not found")
+    return file_blocks
\ No newline at end of file
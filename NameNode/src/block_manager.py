@@ -1,50 +1,133 @@
-import os
-import uuid
-import re
-
-from namenode_logger import get_blocks_logger
-
-logger = get_blocks_logger()
-
-block_size=int(os.getenv("BLOCK_SIZE_BYTES", "33554432")) 
-#sets the block size to 32MB but in bytes for manipulation
-
-def sanitize_filename(filename="unknown_file"):
-    sanitized = re.sub(r'[^a-zA-Z0-9]', '_', filename) #removing non alphanumeric characters in the filename
-    sanitized = re.sub(r'_+', '_', sanitized) # replacing consecutive underscores with _
-    return sanitized.strip('_')  
-
-
-def generate_block_id(filename="unknown_file", block_index=0):
-    sanitized_name = sanitize_filename(os.path.basename(filename))
-    short_uuid = str(uuid.uuid4())[:8]
-    return f"block_{sanitized_name}_{block_index:04d}_{short_uuid}"
-
-
-def split_file_into_blocks(filename="unknown_file",filesize=0):
-    if not filename:  # this is to handle in the edge case of when "None" is passed onto to the function as an argument
-        filename = "unknown_file"
-    if filesize <= 0:
-        logger.warning(f"File '{filename}' has invalid size: {filesize}")  
-        return []
-    
-    blocks=[] #Empty list of dictionaries to store the block data 
-    num_blocks= (filesize+ block_size-1 )//block_size
-    
-    for i in range(num_blocks):
-        start_byte= i*block_size
-        end_byte= min((i+1)*block_size,filesize)
-        size=end_byte-start_byte
-        block_id= generate_block_id(filename,i)
-
-        blocks.append({
-            "block_id": block_id,
-            "start_byte":start_byte,
-            "end_byte":end_byte,
-            "size": size
-
-        })
-    logger.info(f"Splitting {filename} of size {filesize} into {num_blocks} blocks")
-
-    return blocks
-    
+import os
+import uuid
+import re
+
+from namenode_logger import get_blocks_logger
+
+logger = get_blocks_logger()
+
+block_size=int(os.getenv("BLOCK_SIZE_BYTES", "33554432")) 
+#sets the block size to 32MB but in bytes for manipulation
+
+def sanitize_filename(filename="unknown_file"):
+    sanitized = re.sub(r'[^a-zA-Z0-9]', '_', filename) #removing non alphanumeric characters in the filename
+    sanitized = re.sub(r'_+', '_', sanitized) # replacing consecutive underscores with _
+    return sanitized.strip('_')  
+
+
+def generate_block_id(filename="unknown_file", block_index=0):
+    sanitized_name = sanitize_filename(os.path.basename(filename))
+    short_uuid = str(uuid.uuid4())[:8]
+    return f"block_{sanitized_name}_{block_index:04d}_{short_uuid}"
+
+
+def split_file_into_blocks(filename="unknown_file",filesize=0,log=True):
+    if not filename:  # this is to handle in the edge case of when "None" is passed onto to the function as an argument
+        filename = "unknown_file"
+    if filesize <= 0:
+        logger.warning(f"File '{filename}' has invalid size: {filesize}")  
+        return []
+    
+    blocks=[] #Empty list of dictionaries to store the block data 
+    num_blocks= (filesize+ block_size-1 )//block_size
+    
+    for i in range(num_blocks):
+        start_byte= i*block_size
+        end_byte= min((i+1)*block_size,filesize)
+        size=end_byte-start_byte
+        block_id= generate_block_id(filename,i)
+
+        blocks.append({
+            "block_id": block_id,
+            "start_byte":start_byte,
+            "end_byte":end_byte,
+            "size": size
+
+        })
+    if log:  # batch allocations log one line per batch instead
+        logger.info(f"Splitting {filename} of size {filesize} into {num_blocks} blocks")
+
+    return blocks
+    
+
+
+def split_file_into_block_groups(filename="unknown_file", filesize=0, policy=None):
+    """
+    Erasure coded counterpart of split_file_into_blocks: one entry per block group with its
+    offset in the file, its size and the data + parity internal blocks it is striped over.
+    """
+    if not filename:
+        filename = "unknown_file"
+    if filesize <= 0:
+        logger.warning(f"File '{filename}' has invalid size: {filesize}")
+        return []
+
+    groups = []
+    group_size = policy.group_size(block_size)
+    num_groups = (filesize + group_size - 1) // group_size
+    for group_index in range(num_groups):
+        start_byte = group_index * group_size
+        size = min(group_size, filesize - start_byte)
+        blocks = []
+        for unit, unit_size in enumerate(policy.internal_block_sizes(size)):
+            blocks.append({
+                "block_id": generate_block_id(filename, group_index * policy.width + unit),
+                "index": unit,
+                "size": unit_size
+            })
+        groups.append({"offset": start_byte, "size": size, "blocks": blocks})
+    logger.info(f"Splitting {filename} of size {filesize} into {num_groups} {policy.name} block groups")
+
+    return groups
+
+
+# Dedup chunks are named after the sha256 of their content, so the same bytes always map to the same block
+CHUNK_BLOCK_PREFIX = "chunk_"
+FINGERPRINT_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+def chunk_block_id(fingerprint):
+    return f"{CHUNK_BLOCK_PREFIX}{fingerprint}"
+
+
+def validate_chunks(filename, filesize, chunks):
+    """
+    Check the chunk list a client sent for a dedup upload: lowercase sha256 hex fingerprints,
+    sizes between 1 and block_size that add up to the file size. Raises ValueError otherwise.
+    """
+    if filesize <= 0 or not chunks:
+        raise ValueError(f"Dedup upload of {filename} needs a non-empty file and its chunk list")
+    for chunk in chunks:
+        if not FINGERPRINT_PATTERN.match(chunk["fingerprint"]):
+            raise ValueError(f"Invalid chunk fingerprint {chunk['fingerprint']!r}, expected a sha256 hex digest")
+        if not 0 < chunk["size"] <= block_size:
+            raise ValueError(f"Chunk {chunk['fingerprint']} has size {chunk['size']}, must be 1 to {block_size} bytes")
+    total = sum(chunk["size"] for chunk in chunks)
+    if total != filesize:
+        raise ValueError(f"Chunks of {filename} add up to {total} bytes, file is {filesize}")
+    logger.info(f"Splitting {filename} of size {filesize} into {len(chunks)} content-defined chunks")
+
+
+def log_batch_split(files, blocks):
+    logger.info(f"Splitting a batch of {files} files into {blocks} blocks")
+
+
+def generate_container_id():
+    return f"container_{uuid.uuid4().hex[:16]}"
+
+
+def pack_files_into_containers(files):
+    """
+    Lay small files end to end in container blocks of at most block_size bytes, in the order given.
+    files are (filename, filesize), returns [{"block_id", "size", "files": [{"filename", "offset", "size"}]}].
+    """
+    containers = []
+    current = None
+    for filename, filesize in files:
+        if current is None or current["size"] + filesize > block_size:
+            current = {"block_id": generate_container_id(), "size": 0, "files": []}
+            containers.append(current)
+        current["files"].append({"filename": filename, "offset": current["size"], "size": filesize})
+        current["size"] += filesize
+    logger.info(f"Packing {len(files)} small files into {len(containers)} container blocks")
+    return containers
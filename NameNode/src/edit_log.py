@@ -0,0 +1,132 @@
+import json
+import os
+import threading
+import time
+
+from namenode_logger import get_namenode_logger
+
+EDITS_PREFIX = "edits_"
+EDITS_SUFFIX = ".log"
+
+logger = get_namenode_logger()
+
+
+def segment_name(first_txid):
+    # zero padded so segments sort by name in txid order
+    return f"{EDITS_PREFIX}{first_txid:020d}{EDITS_SUFFIX}"
+
+
+def list_segments(directory):
+    """Return (first_txid, path) for every edit log segment in the directory, oldest first."""
+    segments = []
+    for name in os.listdir(directory):
+        if name.startswith(EDITS_PREFIX) and name.endswith(EDITS_SUFFIX):
+            first_txid = int(name[len(EDITS_PREFIX):-len(EDITS_SUFFIX)])
+            segments.append((first_txid, os.path.join(directory, name)))
+    return sorted(segments)
+
+
+def read_edits(directory, after_txid=0):
+    """
+    Yield every logged edit with a txid greater than after_txid, in order.
+    A torn last line (NameNode died mid-append) is skipped, the edit was never acked anyway.
+    A bad record with more after it is corruption and raises.
+    """
+    for _, path in list_segments(directory):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    if f.read():
+                        raise ValueError(f"Corrupt edit log record in {path}: {line[:100]!r}")
+                    logger.warning(f"Skipping torn edit log record at the end of {path}")
+                    break
+                if record["txid"] > after_txid:
+                    yield record
+
+
+class EditLog:
+    """
+    Append-only log of namespace mutations, HDFS style.
+    Each edit is one JSON line tagged with a txid. append() only buffers the line, sync() makes
+    everything up to a txid durable. Callers that sync while another fsync is running queue up
+    behind it and are then covered by a single fsync (group commit), EDIT_LOG_GROUP_COMMIT_MS
+    optionally holds the leader back a little to batch even more.
+    The log is split in segments named after their first txid so a checkpoint can roll to a new
+    segment and delete the ones it has folded into the snapshot.
+    """
+    def __init__(self, directory, group_commit_ms=0):
+        self.directory = directory
+        self.group_commit_ms = group_commit_ms
+        self.lock = threading.Lock()        # guards the file handle and txid
+        self.sync_lock = threading.Lock()   # one fsync at a time, waiters get batched
+        self.file = None
+        self.txid = 0
+        self.synced_txid = 0
+        self.segment_first_txid = 1
+
+    def open(self, last_txid):
+        """Start a fresh segment after last_txid, old segments are never appended to (they may end torn)."""
+        with self.lock:
+            self.txid = last_txid
+            self.synced_txid = last_txid
+            self._open_segment(last_txid + 1)
+
+    def _open_segment(self, first_txid):
+        # a leftover file with this name can only hold a torn edit that was never replayed, so truncate it
+        self.segment_first_txid = first_txid
+        self.file = open(os.path.join(self.directory, segment_name(first_txid)), "w", encoding="utf-8")
+
+    def append(self, record):
+        """Write an edit to the log buffer and return its txid, call sync(txid) before acking it."""
+        with self.lock:
+            self.txid += 1
+            record["txid"] = self.txid
+            self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+            return self.txid
+
+    def sync(self, txid):
+        """Block until every edit up to txid is on disk."""
+        with self.sync_lock:
+            if self.synced_txid >= txid:
+                return  # someone else's fsync already covered us
+            if self.group_commit_ms:
+                time.sleep(self.group_commit_ms / 1000)
+            with self.lock:
+                self.file.flush()
+                target_txid = self.txid
+                fd = self.file.fileno()
+            os.fsync(fd)
+            self.synced_txid = target_txid
+
+    def roll(self):
+        """
+        Close the current segment and start a new one, returning the last txid of the closed segment.
+        Must be called while the namespace is not being mutated so a snapshot taken alongside it
+        matches the returned txid exactly.
+        """
+        with self.sync_lock, self.lock:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+            self.synced_txid = self.txid
+            self._open_segment(self.txid + 1)
+            return self.txid
+
+    def purge_before(self, first_txid):
+        """Delete segments that only hold edits older than first_txid (already in a snapshot)."""
+        for segment_first_txid, path in list_segments(self.directory):
+            if segment_first_txid < first_txid:
+                os.remove(path)
+
+    def edits_since(self, txid):
+        return self.txid - txid
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.file.close()
+                self.file = None
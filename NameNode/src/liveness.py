@@ -0,0 +1,96 @@
+import heapq
+import threading
+import time
+
+
+class LivenessTracker:
+    """
+    Tracks which DataNodes are alive without scanning them all.
+    Every heartbeat pushes (deadline, node) on a min-heap keyed on the monotonic clock; expiring
+    only pops entries whose deadline passed and drops the node if no newer heartbeat moved its
+    deadline. live_nodes() hands out a cached tuple that is only rebuilt when membership changes,
+    so the common case is O(1) and a heartbeat is O(log n).
+    """
+    def __init__(self, timeout_seconds, on_change=None):
+        self.timeout = timeout_seconds
+        self.on_change = on_change  # called as on_change(node_id, alive) outside the lock
+        self.deadlines = {}
+        self.heap = []
+        self.live = set()
+        self.live_cache = ()
+        self.lock = threading.Lock()
+
+    def heartbeat(self, node_id):
+        now = time.monotonic()
+        deadline = now + self.timeout
+        joined = False
+        with self.lock:
+            self.deadlines[node_id] = deadline
+            heapq.heappush(self.heap, (deadline, node_id))
+            if node_id not in self.live:
+                self.live.add(node_id)
+                self.live_cache = None
+                joined = True
+            expired = self._expire(now)
+        self._notify(expired, joined and node_id)
+
+    def _expire(self, now):
+        expired = []
+        while self.heap and self.heap[0][0] < now:
+            deadline, node_id = heapq.heappop(self.heap)
+            # an older heap entry, the node has heartbeated since
+            if self.deadlines.get(node_id) != deadline:
+                continue
+            del self.deadlines[node_id]
+            self.live.discard(node_id)
+            self.live_cache = None
+            expired.append(node_id)
+        return expired
+
+    def _notify(self, expired, joined=None):
+        if self.on_change is None:
+            return
+        for node_id in expired:
+            self.on_change(node_id, False)
+        if joined:
+            self.on_change(joined, True)
+
+    def live_nodes(self):
+        """Tuple of DataNodes that heartbeated within the timeout."""
+        with self.lock:
+            expired = self._expire(time.monotonic())
+            if self.live_cache is None:
+                self.live_cache = tuple(sorted(self.live))
+            live = self.live_cache
+        self._notify(expired)
+        return live
+
+    def is_live(self, node_id):
+        with self.lock:
+            deadline = self.deadlines.get(node_id)
+        return deadline is not None and deadline >= time.monotonic()
+
+
+class HeartbeatStats:
+    """Aggregates heartbeats so the NameNode logs one summary line per interval instead of one per heartbeat."""
+    def __init__(self, interval_seconds):
+        self.interval = interval_seconds
+        self.count = 0
+        self.nodes = set()
+        self.window_start = time.monotonic()
+        self.lock = threading.Lock()
+
+    def record(self, node_id):
+        """Count a heartbeat, returns a summary string when an interval has elapsed."""
+        now = time.monotonic()
+        with self.lock:
+            self.count += 1
+            self.nodes.add(node_id)
+            elapsed = now - self.window_start
+            if elapsed < self.interval:
+                return None
+            summary = f"{self.count} heartbeats from {len(self.nodes)} DataNodes in the last {elapsed:.0f}s"
+            self.count = 0
+            self.nodes = set()
+            self.window_start = now
+        return summary
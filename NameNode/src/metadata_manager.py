@@ -1,136 +1,953 @@
-from datetime import datetime, timedelta
-from block_manager import split_file_into_blocks
-from typing import Dict, Any
-import os 
-import json
-
-METADATA_DIR = "/usr/local/app/namenode_metadata"
-active_datanodes = {}  
-file_metadata={}
-block_assignments={}
-HEARTBEAT_TIMEOUT_SECONDS = 30  # Node considered alive if heartbeat within this window
-
-
-os.makedirs(METADATA_DIR, exist_ok=True)
-
-def update_datanode_heartbeat(node_id):
-    """Update heartbeat timestamp for a DataNode."""
-    active_datanodes[node_id] = datetime.now()
-
-def get_available_datanodes():
-    """Return list of DataNodes with recent heartbeats (alive)."""
-    current_time = datetime.now()
-    available_nodes = []
-    for node_id, last_heartbeat in active_datanodes.items():
-        # Only include nodes with heartbeat within timeout
-        if (current_time - last_heartbeat).total_seconds() <= HEARTBEAT_TIMEOUT_SECONDS:
-            available_nodes.append(node_id)
-    return available_nodes
-
-def assign_blocks_to_datanode(filename, filesize, replication_factor=2):
-    """
-    Assign each block to a set of DataNodes for replication.
-    Returns a dict with block info and assigned datanodes.
-    """
-    available_nodes = get_available_datanodes()  # Get all alive DataNodes
-    blocks = split_file_into_blocks(filename, filesize)  # Split file into blocks
-    if not available_nodes:
-        print(f"WARNING: No available datanodes for file {filename}")
-        return {"blocks": []}
-    result_blocks = []
-    for block_index, block in enumerate(blocks):
-        assigned_datanodes = []
-        # Assign block to consecutive datanodes (n, n+1, ...)
-        num_replicas = min(replication_factor, len(available_nodes))
-        for i in range(num_replicas):
-            node_index = (block_index + i) % len(available_nodes)
-            assigned_datanodes.append(available_nodes[node_index])
-        result_blocks.append({
-            "block_id": block["block_id"],
-            "size": block["size"],
-            "assigned_datanodes": assigned_datanodes
-        })
-        print(f"Assigned block {block['block_id']} to datanodes: {assigned_datanodes}")
-        #updates block assignements to the global var for persistent metatda
-        block_assignments[block["block_id"]] = assigned_datanodes
-    #updates file metadata to the global var so we can persist fr 
-    file_metadata[filename] = {
-        "filesize": filesize,
-        "total_blocks": len(blocks),
-        "created_at": datetime.now().isoformat(),
-        "replication_factor": replication_factor
-    }
-    store_metadata()
-
-    return {"blocks": result_blocks}
-
-
-
-def store_metadata():
-    """
-    Persist all metadata to disk in JSON format.
-    """
-    try:
-        # convert datetime to string
-        metadata = {
-            "active_datanodes": {
-                node_id: dt.isoformat() for node_id,dt in active_datanodes.items()
-            },
-            "file_metadata": file_metadata,
-            "block_assignments": block_assignments,
-            "last_updated": datetime.now().isoformat()
-        }
-        temp_file = os.path.join(METADATA_DIR, "metadata.json.tmp")
-        final_file = os.path.join(METADATA_DIR, "metadata.json")
-        
-        # json.dump() to write metadata into temp
-        with open(temp_file,"w",encoding="utf-8") as f:
-            json.dump(metadata,f,indent=2)
-
-        # atomic move temp_file to final_file to prevent partial writes
-        os.rename(temp_file,final_file)
-        
-        print(f"✅ Metadata saved to {final_file}")
-        
-    except Exception as e:
-        print(f"Failed to save metadata: {e}")
-         # only remove if file exists
-        if os.path.exists(temp_file):
-            try:
-                os.remove(temp_file)
-            except Exception:
-                pass  
-
-
-def load_metadata():
-    """
-    Load metadata from disk on NameNode startup.
-    """
-    global active_datanodes, file_metadata, block_assignments
-    
-    metadata_file = os.path.join(METADATA_DIR, "metadata.json")
-    
-    # Check if file exists
-    if not os.path.exists(metadata_file):
-        print("No existing metadata found. Starting fresh.")
-        return
-    
-    try:
-        # read the JSON file
-        with open(metadata_file,"r",encoding="utf-8") as f:
-            metadata= json.load(f)
-        
-        # Restore active_datanodes (convert ISO strings back to datetime)
-        active_datanodes={
-            node_id: datetime.fromisoformat(dt_str) for node_id, dt_str in metadata["active_datanodes"].items()
-        }
-        # Restore file_metadata and block_assignments
-        file_metadata=metadata["file_metadata"]
-        block_assignments=metadata["block_assignments"]
-        print(f"Metadata loaded successfully")
-        
-    except Exception as e:
-        print(f"Failed to load metadata: {e}")
-        active_datanodes={}
-        file_metadata={}
-        block_assignments={}
\ No newline at end of file
+from datetime import datetime, timedelta
+from block_manager import (split_file_into_blocks, split_file_into_block_groups, block_size, chunk_block_id,
+                           validate_chunks, log_batch_split, pack_files_into_containers)
+from storage_policy import get_storage_policy
+from edit_log import EditLog, read_edits
+from namespace import Namespace
+from snapshot import read_snapshot, store_snapshot
+from placement import NodeStatsTable, get_placement_policy
+from liveness import LivenessTracker
+from replication import ReplicationScheduler
+from namenode_logger import get_namenode_logger
+from metrics import Counter, Gauge, Histogram
+from typing import Dict, Any
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections import deque
+import asyncio
+import os 
+import json
+import threading
+import time
+
+METADATA_DIR = os.getenv("METADATA_DIR", "/usr/local/app/namenode_metadata")
+SNAPSHOT_FILE = os.path.join(METADATA_DIR, "metadata.snap")  # binary checkpoint, see snapshot.py
+LEGACY_METADATA_FILE = os.path.join(METADATA_DIR, "metadata.json")  # JSON checkpoint of older versions, still loaded
+active_datanodes = {}  
+datanodes_lock = threading.Lock()  # heartbeats write active_datanodes while allocations read it
+namespace = Namespace()  # files, blocks and where they live
+HEARTBEAT_TIMEOUT_SECONDS = int(os.getenv("HEARTBEAT_TIMEOUT_SECONDS", "30"))  # Node considered alive if heartbeat within this window
+PLACEMENT_POLICY = os.getenv("PLACEMENT_POLICY", "p2c")  # p2c (load/capacity aware) or round_robin
+
+# Edit log + checkpoint settings
+EDIT_LOG_GROUP_COMMIT_MS = int(os.getenv("EDIT_LOG_GROUP_COMMIT_MS", "0"))  # extra wait to batch fsyncs, 0 = fsync right away
+CHECKPOINT_INTERVAL_SECONDS = int(os.getenv("CHECKPOINT_INTERVAL_SECONDS", "300"))
+CHECKPOINT_TXNS = int(os.getenv("CHECKPOINT_TXNS", "100000"))  # checkpoint early once this many edits piled up
+CHECKPOINT_CHECK_SECONDS = 5
+
+# Re-replication settings
+REPLICATION_CHECK_SECONDS = float(os.getenv("REPLICATION_CHECK_SECONDS", "3"))  # how often the monitor schedules copies
+REPLICATION_WORK_PER_CHECK = int(os.getenv("REPLICATION_WORK_PER_CHECK", "1000"))  # blocks looked at per pass
+REPLICATION_SCAN_BATCH = 10000  # blocks of a dead node queued per namespace_lock hold
+# blocks allocated this recently may still be on their way to a DataNode, block reports don't count them missing
+BLOCK_REPORT_GRACE_SECONDS = int(os.getenv("BLOCK_REPORT_GRACE_SECONDS", "600"))
+NODE_INDEX_BATCH = 100000  # blocks of a loaded snapshot added to the node -> blocks index per namespace_lock hold
+
+os.makedirs(METADATA_DIR, exist_ok=True)
+
+edit_log = EditLog(METADATA_DIR, EDIT_LOG_GROUP_COMMIT_MS)
+# held while the namespace is mutated + logged, while it is read, and while the checkpointer copies it
+namespace_lock = threading.RLock()
+checkpoint_txid = 0
+# single writer thread that fsyncs the edit log, so request handlers never block on disk
+edit_log_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="edit-log-writer")
+node_stats = NodeStatsTable()
+placement_policy = get_placement_policy(PLACEMENT_POLICY, node_stats)
+logger = get_namenode_logger()
+replication = ReplicationScheduler()
+dead_nodes = deque()  # DataNodes marked dead whose blocks the replication monitor hasn't queued yet
+missing_blocks = set()  # block indexes with no live replica left, nothing to copy them from
+# (monotonic time, first block index) per allocation, block indexes only grow so this is ordered both ways
+recent_allocations = deque()
+# done once the snapshot and edit log are loaded, requests that touch the namespace wait for it (see start_metadata_loader)
+namespace_loaded = Future()
+# incremental block reports that came with heartbeats while the namespace was loading, applied right after
+early_reports = []
+early_reports_lock = threading.Lock()
+
+def log_liveness_change(node_id, alive):
+    if alive:
+        logger.info(f"DataNode {node_id} is alive")
+    else:
+        logger.warning(f"DataNode {node_id} missed heartbeats for {HEARTBEAT_TIMEOUT_SECONDS}s, marking it dead")
+        dead_nodes.append(node_id)
+
+liveness = LivenessTracker(HEARTBEAT_TIMEOUT_SECONDS, on_change=log_liveness_change)
+
+# Served by GET /metrics, gauges are read when scraped so they cost nothing in between
+edit_log_sync_seconds = Histogram("namenode_edit_log_sync_seconds", "Time until an edit is durable in the edit log (fsync and group commit wait)")
+checkpoint_seconds = Histogram("namenode_checkpoint_seconds", "Time to write a metadata snapshot")
+blocks_allocated = Counter("namenode_blocks_allocated_total", "Blocks handed out to uploads (chunks, containers and EC internal blocks included)")
+Gauge("namenode_live_datanodes", "DataNodes with a recent heartbeat", lambda: len(get_available_datanodes()))
+Gauge("namenode_under_replicated_blocks", "Blocks queued for re-replication", lambda: replication.stats()["under_replicated"])
+Gauge("namenode_pending_replications", "Block copies handed to DataNodes and not yet reported", lambda: replication.stats()["pending_replications"])
+Gauge("namenode_missing_blocks", "Blocks with no live replica left", lambda: len(missing_blocks))
+Gauge("namenode_files", "Files in the namespace", lambda: namespace.num_files())
+Gauge("namenode_blocks", "Blocks in the namespace", lambda: namespace.num_blocks())
+Gauge("namenode_edit_log_txid", "Last txid written to the edit log", lambda: edit_log.txid)
+Gauge("namenode_namespace_loaded", "1 once the snapshot and edit log are loaded at startup", lambda: int(namespace_loaded.done()))
+namespace_load_seconds = Gauge("namenode_namespace_load_seconds", "Time startup took to load the snapshot and replay the edit log")
+
+def update_datanode_heartbeat(node_id, capacity_bytes=None, used_bytes=None, inflight_writes=None, block_count=None):
+    """Update heartbeat timestamp for a DataNode, plus its storage report if the heartbeat carried one."""
+    with datanodes_lock:
+        # wall clock time, only kept for the metadata snapshot
+        active_datanodes[node_id] = datetime.now()
+    liveness.heartbeat(node_id)
+    node_stats.update_report(node_id, capacity_bytes, used_bytes, inflight_writes, block_count)
+
+def get_available_datanodes():
+    """Return the DataNodes with recent heartbeats (alive), without scanning every known node."""
+    return liveness.live_nodes()
+
+def log_allocation(edit):
+    """Apply and log an edit that adds new blocks, returns its txid. Caller holds namespace_lock."""
+    first_block = namespace.num_blocks()
+    recent_allocations.append((time.monotonic(), first_block))
+    apply_edit(edit)
+    blocks_allocated.inc(namespace.num_blocks() - first_block)
+    return edit_log.append(edit)
+
+def assign_blocks_to_datanode(filename, filesize, replication_factor=2):
+    """
+    Assign each block to a set of DataNodes for replication and wait until it is durable.
+    Returns a dict with block info and assigned datanodes.
+    """
+    assignment, txid = allocate_blocks(filename, filesize, replication_factor)
+    if txid is not None:
+        edit_log.sync(txid)
+    return assignment
+
+def allocate_blocks(filename, filesize, replication_factor=2, storage_policy=None, chunks=None):
+    """
+    Place a file's blocks and apply + log the edit, without waiting for the fsync.
+    Returns (assignment, txid), pass txid to wait_until_durable before acking the client.
+    storage_policy picks erasure coding (e.g. "RS-6-3") instead of replication, raises ValueError
+    for unknown policies or too few live DataNodes.
+    chunks (the client's content-defined chunks) makes it a dedup upload, see allocate_chunks.
+    CPU bound, so async callers should run it in a worker thread.
+    """
+    policy = get_storage_policy(storage_policy)
+    if chunks is not None:
+        if policy is not None:
+            raise ValueError("Dedup uploads are replicated, they can't use an erasure coding policy")
+        return allocate_chunks(filename, filesize, chunks, replication_factor)
+    if policy is not None:
+        return allocate_block_groups(filename, filesize, policy)
+    available_nodes = get_available_datanodes()  # Get all alive DataNodes
+    if not available_nodes:
+        logger.warning(f"No available datanodes for file {filename}")
+        return {"blocks": []}, None
+    result_blocks, edit = plan_file(filename, filesize, replication_factor, available_nodes)
+    with namespace_lock:
+        txid = log_allocation(edit)
+
+    return {"blocks": result_blocks}, txid
+
+
+def plan_file(filename, filesize, replication_factor, available_nodes, log=True):
+    """Split a replicated file into blocks and place them, returns (blocks, add_file edit) without applying anything."""
+    blocks = split_file_into_blocks(filename, filesize, log)  # Split file into blocks
+    result_blocks = []
+    for block in blocks:
+        # the placement policy never puts two replicas on one node
+        assigned_datanodes = placement_policy.place(block["size"], replication_factor, available_nodes)
+        result_blocks.append({
+            "block_id": block["block_id"],
+            "size": block["size"],
+            "assigned_datanodes": assigned_datanodes
+        })
+    # one edit per file: its metadata plus the block -> datanodes assignments
+    edit = {
+        "op": "add_file",
+        "filename": filename,
+        "metadata": {
+            "filesize": filesize,
+            "total_blocks": len(blocks),
+            "block_size": block_size,
+            "blocks": [block["block_id"] for block in blocks],
+            "created_at": datetime.now().isoformat(),
+            "replication_factor": replication_factor
+        },
+        "block_assignments": {block["block_id"]: block["assigned_datanodes"] for block in result_blocks}
+    }
+    return result_blocks, edit
+
+
+def allocate_files(file_requests, replication_factor=2):
+    """
+    Batch allocation for uploads of many (small) files.
+    file_requests are {"filename", "filesize_bytes", "storage_policy", "chunks"} like POST /files.
+    Plain replicated files are placed together and logged as a single add_files edit, so the
+    whole batch costs one namespace_lock hold and one fsync instead of one per file. Erasure coded
+    and dedup files go through allocate_blocks one by one. A file that can't be allocated gets an
+    "error" entry instead of failing the batch.
+    Returns (one result per request in order, txid to wait on or None).
+    """
+    available_nodes = get_available_datanodes()
+    results = []
+    file_edits = []
+    txid = None
+    for request in file_requests:
+        filename = request["filename"]
+        try:
+            chunks = request.get("chunks")
+            if get_storage_policy(request.get("storage_policy")) is not None or chunks is not None:
+                assignment, file_txid = allocate_blocks(filename, request["filesize_bytes"], replication_factor,
+                                                        request.get("storage_policy"), chunks)
+                txid = file_txid if file_txid is not None else txid
+                results.append({"filename": filename, **assignment})
+                continue
+            if not available_nodes:
+                raise ValueError(f"No live DataNodes to place {filename} on")
+            result_blocks, edit = plan_file(filename, request["filesize_bytes"], replication_factor, available_nodes,
+                                            log=False)
+            file_edits.append(edit)
+            results.append({"filename": filename, "blocks": result_blocks})
+        except ValueError as e:
+            results.append({"filename": filename, "error": str(e)})
+    if file_edits:
+        edit = {"op": "add_files", "files": file_edits}
+        with namespace_lock:
+            txid = log_allocation(edit)
+        log_batch_split(len(file_edits), sum(file_edit["metadata"]["total_blocks"] for file_edit in file_edits))
+    return results, txid
+
+
+def allocate_block_groups(filename, filesize, policy):
+    """
+    Erasure coded allocation: every internal block of a group goes to a different DataNode,
+    so a group survives losing any parity_units of them.
+    """
+    available_nodes = get_available_datanodes()
+    if len(available_nodes) < policy.width:
+        raise ValueError(f"{policy.name} needs {policy.width} live DataNodes, only {len(available_nodes)} available")
+    groups = split_file_into_block_groups(filename, filesize, policy)
+    for group in groups:
+        nodes = placement_policy.place(group["blocks"][0]["size"], policy.width, available_nodes)
+        for block, node in zip(group["blocks"], nodes):
+            block["assigned_datanodes"] = [node]
+    blocks = [block for group in groups for block in group["blocks"]]
+    edit = {
+        "op": "add_file",
+        "filename": filename,
+        "metadata": {
+            "filesize": filesize,
+            "total_blocks": len(blocks),
+            "block_size": block_size,
+            "blocks": [block["block_id"] for block in blocks],
+            "created_at": datetime.now().isoformat(),
+            "replication_factor": 1,
+            "storage_policy": policy.name,
+            "block_sizes": [block["size"] for block in blocks]
+        },
+        "block_assignments": {block["block_id"]: block["assigned_datanodes"] for block in blocks}
+    }
+    with namespace_lock:
+        txid = log_allocation(edit)
+
+    return {**policy.describe(), "block_groups": groups}, txid
+
+
+def allocate_chunks(filename, filesize, chunks, replication_factor=2):
+    """
+    Dedup allocation. chunks are {"fingerprint", "size"} in file order; each one is the block
+    chunk_<fingerprint>. Chunks the namespace already has with a live replica are reused as they are
+    (assigned_datanodes empty, nothing to send), only unseen chunks, or ones whose replicas are all
+    dead, are placed. A chunk repeated inside the file is placed once.
+    A reused chunk counts as stored as soon as its first upload was allocated; if that upload never
+    finishes, block reports drop its replicas and the next upload of the same bytes sends it again.
+    """
+    validate_chunks(filename, filesize, chunks)
+    available_nodes = get_available_datanodes()
+    if not available_nodes:
+        logger.warning(f"No available datanodes for file {filename}")
+        return {"blocks": []}, None
+    result_blocks = []
+    assignments = {}
+    offset = 0
+    # lookup and placement under one lock hold, so two uploads of the same new chunk don't both place it
+    with namespace_lock:
+        for chunk in chunks:
+            block_id = chunk_block_id(chunk["fingerprint"])
+            block_index = namespace.get_block_index(block_id)
+            if block_index is not None and namespace.block_size(block_index) != chunk["size"]:
+                raise ValueError(f"Chunk {chunk['fingerprint']} is {chunk['size']} bytes in {filename} "
+                                 f"but was stored with {namespace.block_size(block_index)}")
+            duplicate = block_id in assignments or (block_index is not None and bool(live_replicas(block_index)))
+            assigned_datanodes = []
+            if not duplicate:
+                assigned_datanodes = placement_policy.place(chunk["size"], replication_factor, available_nodes)
+                assignments[block_id] = assigned_datanodes
+            result_blocks.append({
+                "block_id": block_id,
+                "offset": offset,
+                "size": chunk["size"],
+                "assigned_datanodes": assigned_datanodes,
+                "duplicate": duplicate
+            })
+            offset += chunk["size"]
+        edit = {
+            "op": "add_file",
+            "filename": filename,
+            "metadata": {
+                "filesize": filesize,
+                "total_blocks": len(result_blocks),
+                "block_size": block_size,
+                "blocks": [block["block_id"] for block in result_blocks],
+                "created_at": datetime.now().isoformat(),
+                "replication_factor": replication_factor,
+                "dedup": True,
+                "block_sizes": [block["size"] for block in result_blocks]
+            },
+            # only the chunks this upload sends, the reused ones keep the replicas they have
+            "block_assignments": assignments
+        }
+        txid = log_allocation(edit)
+        for block_id in assignments:
+            missing_blocks.discard(namespace.get_block_index(block_id))
+
+    new_bytes = sum(block["size"] for block in result_blocks if not block["duplicate"])
+    logger.info(f"Dedup upload of {filename}: {len(assignments)} of {len(result_blocks)} chunks are new "
+                f"({new_bytes} of {filesize} bytes)")
+    summary = {"chunks": len(result_blocks), "new_chunks": len(assignments), "new_bytes": new_bytes,
+               "duplicate_bytes": filesize - new_bytes}
+    return {"blocks": result_blocks, "dedup": summary}, txid
+
+
+def allocate_containers(file_requests, replication_factor=2):
+    """
+    Small-file packing, HAR style: the files are laid end to end in shared container blocks of up to
+    block_size bytes, and each one is recorded as (container block, offset, length) instead of getting
+    a block of its own. A million tiny files then cost a few thousand blocks on the DataNodes and in
+    the namespace. The whole request is one add_containers edit.
+    Empty files and files bigger than a block get an "error" entry, they go through POST /files.
+    Returns ({"containers": [...], "errors": [...]}, txid or None).
+    """
+    errors = []
+    files = []
+    for request in file_requests:
+        filename, filesize = request["filename"], request["filesize_bytes"]
+        if request.get("storage_policy") or request.get("chunks") is not None:
+            errors.append({"filename": filename, "error": "Packed files are plain replicated, no storage policy or chunks"})
+        elif not 0 < filesize <= block_size:
+            errors.append({"filename": filename, "error": f"Only files of 1 to {block_size} bytes can be packed, got {filesize}"})
+        else:
+            files.append((filename, filesize))
+    available_nodes = get_available_datanodes()
+    if files and not available_nodes:
+        errors.extend({"filename": filename, "error": "No live DataNodes"} for filename, _ in files)
+        files = []
+    if not files:
+        return {"containers": [], "errors": errors}, None
+    containers = pack_files_into_containers(files)
+    for container in containers:
+        container["assigned_datanodes"] = placement_policy.place(container["size"], replication_factor, available_nodes)
+    edit = {
+        "op": "add_containers",
+        "block_size": block_size,
+        "created_at": datetime.now().isoformat(),
+        "replication_factor": replication_factor,
+        "containers": containers
+    }
+    with namespace_lock:
+        txid = log_allocation(edit)
+    return {"containers": containers, "errors": errors}, txid
+
+
+def reopen_file(filename, filesize, sent_blocks=()):
+    """
+    Give an upload that failed partway its allocation back, so the client resumes it with the same
+    block ids instead of allocating the file again and orphaning what it already sent.
+    Blocks not in sent_blocks (the ones the client got to every DataNode) that have a dead DataNode in
+    their pipeline get it swapped for a live one and the change is logged. Sent blocks are left alone,
+    re-replication looks after those.
+    Returns (assignment, txid or None), (None, None) if the file is unknown. Raises ValueError for
+    files that can't be resumed: a different size, erasure coded, dedup or packed.
+    """
+    live_nodes = get_available_datanodes()
+    sent = set(sent_blocks)
+    with namespace_lock:
+        record = namespace.get_file(filename)
+        if record is None or record.blocks is None:
+            return None, None
+        if record.storage_policy is not None or record.dedup or record.container_offset is not None:
+            raise ValueError(f"{filename} is erasure coded, deduplicated or packed, only replicated uploads can be resumed")
+        if record.filesize != filesize:
+            raise ValueError(f"{filename} was allocated as {record.filesize} bytes, not {filesize}, upload it again instead")
+        result_blocks = []
+        reassigned = {}
+        for block_index in record.blocks:
+            block_id = namespace.block_id(block_index)
+            size = namespace.block_size(block_index)
+            nodes = namespace.block_replicas(block_index)
+            live = [node for node in nodes if liveness.is_live(node)]
+            if len(live) < len(nodes) and block_id not in sent:
+                candidates = [node for node in live_nodes if node not in nodes]
+                needed = max(len(nodes), namespace.expected_replicas(block_index)) - len(live)
+                nodes = live + (placement_policy.place(size, needed, candidates) if candidates else [])
+                reassigned[block_id] = nodes
+            result_blocks.append({"block_id": block_id, "size": size, "assigned_datanodes": nodes})
+        txid = None
+        if reassigned:
+            edit = {"op": "reassign_blocks", "block_assignments": reassigned}
+            apply_edit(edit)
+            txid = edit_log.append(edit)
+    if reassigned:
+        logger.info(f"Reopened {filename}, moved {len(reassigned)} blocks off dead DataNodes")
+    return {"blocks": result_blocks, "reopened": True}, txid
+
+
+def get_dedup_status():
+    """How much the dedup files share: their total size against the bytes of the distinct chunks they use."""
+    with namespace_lock:
+        logical = namespace.dedup_logical_bytes
+        stored = namespace.dedup_stored_bytes
+        chunks = namespace.dedup_chunks
+    return {"logical_bytes": logical, "stored_bytes": stored, "referenced_chunks": chunks,
+            "dedup_ratio": round(logical / stored, 3) if stored else None}
+
+
+def report_corrupt_replicas(node_id, block_ids):
+    """
+    A DataNode's scrubber found these blocks corrupt on its disk and quarantined them,
+    drop that node from their locations so readers stop being sent there.
+    Returns the txid to wait on, or None if none of the blocks had a replica there.
+    """
+    with namespace_lock:
+        known = []
+        for block_id in block_ids:
+            block_index = namespace.get_block_index(block_id)
+            if block_index is not None and node_id in namespace.block_replicas(block_index):
+                known.append(block_id)
+        if not known:
+            return None
+        edit = {"op": "remove_replicas", "node_id": node_id, "block_ids": known}
+        apply_edit(edit)
+        txid = edit_log.append(edit)
+        for block_id in known:
+            check_replication(namespace.get_block_index(block_id))
+    logger.warning(f"Removed corrupt replicas of {len(known)} blocks on {node_id}: {known}")
+    return txid
+
+
+def live_replicas(block_index):
+    return [node for node in namespace.block_replicas(block_index) if liveness.is_live(node)]
+
+
+def check_replication(block_index):
+    """Queue a block for re-replication if it has fewer live replicas (plus copies in flight) than wanted. Hold namespace_lock."""
+    live = live_replicas(block_index)
+    if len(live) + len(replication.pending_targets(block_index)) < namespace.expected_replicas(block_index):
+        replication.queue.push(block_index, len(live))
+
+
+def update_replicas(node_id, added, removed):
+    """
+    Log the replica changes a block report found, returns the txid of the last edit (None if nothing changed).
+    Adding a replica also forgets the block's replicas on dead nodes once it is fully replicated
+    again (or its slots are full), those are the copies re-replication just replaced. Hold namespace_lock.
+    """
+    txid = None
+    if removed:
+        edit = {"op": "remove_replicas", "node_id": node_id, "block_ids": removed}
+        apply_edit(edit)
+        txid = edit_log.append(edit)
+    stale = {}
+    for block_id in added:
+        block_index = namespace.get_block_index(block_id)
+        replicas = namespace.block_replicas(block_index)
+        live = [node for node in replicas if liveness.is_live(node) and node != node_id]
+        if len(live) + 1 >= namespace.expected_replicas(block_index) or len(replicas) >= namespace.max_replicas:
+            for node in replicas:
+                if node not in live and node != node_id:
+                    stale.setdefault(node, []).append(block_id)
+    for stale_node, block_ids in stale.items():
+        edit = {"op": "remove_replicas", "node_id": stale_node, "block_ids": block_ids}
+        apply_edit(edit)
+        txid = edit_log.append(edit)
+    if added:
+        edit = {"op": "add_replicas", "node_id": node_id, "block_ids": added}
+        apply_edit(edit)
+        txid = edit_log.append(edit)
+    for block_id in added:
+        block_index = namespace.get_block_index(block_id)
+        replication.replica_added(block_index, node_id)
+        missing_blocks.discard(block_index)
+    for block_id in removed:
+        check_replication(namespace.get_block_index(block_id))
+    if added or removed:
+        logger.info(f"Block report from {node_id}: {len(added)} replicas added, {len(removed)} removed")
+    return txid
+
+
+def process_block_report(node_id, block_ids):
+    """
+    Full block report: every block a DataNode has on disk.
+    Reconciles what the namespace thinks the node holds with what it actually holds.
+    Blocks the namespace doesn't know are ignored, blocks allocated in the last
+    BLOCK_REPORT_GRACE_SECONDS may still be uploading and are never counted missing.
+    Returns a txid to wait on, or None.
+    """
+    reported = set(block_ids)
+    with namespace_lock:
+        cutoff = time.monotonic() - BLOCK_REPORT_GRACE_SECONDS
+        while recent_allocations and recent_allocations[0][0] < cutoff:
+            recent_allocations.popleft()
+        first_recent = recent_allocations[0][1] if recent_allocations else namespace.num_blocks()
+        recorded = {}
+        for block_index in namespace.blocks_on_node(node_id):
+            recorded[namespace.block_id(block_index)] = block_index
+        added = [block_id for block_id in reported
+                 if block_id not in recorded and namespace.get_block_index(block_id) is not None]
+        removed = [block_id for block_id, block_index in recorded.items()
+                   if block_id not in reported and block_index < first_recent]
+        return update_replicas(node_id, added, removed)
+
+
+def process_incremental_report(node_id, added_ids, removed_ids):
+    """Blocks a DataNode stored or lost since its last heartbeat. Returns a txid to wait on, or None."""
+    with early_reports_lock:
+        if not namespace_loaded.done():
+            # heartbeats are answered while the namespace loads, their block reports have to wait for it
+            early_reports.append((node_id, added_ids, removed_ids))
+            return None
+    return apply_incremental_report(node_id, added_ids, removed_ids)
+
+
+def apply_incremental_report(node_id, added_ids, removed_ids):
+    with namespace_lock:
+        added, removed = [], []
+        for block_id in added_ids:
+            block_index = namespace.get_block_index(block_id)
+            if block_index is None:
+                continue
+            if node_id in namespace.block_replicas(block_index):
+                # normal uploads: the node was recorded when the blocks were allocated
+                replication.replica_added(block_index, node_id)
+            else:
+                added.append(block_id)
+        for block_id in removed_ids:
+            block_index = namespace.get_block_index(block_id)
+            if block_index is not None and node_id in namespace.block_replicas(block_index):
+                removed.append(block_id)
+        return update_replicas(node_id, added, removed)
+
+
+def replication_failed(node_id, block_ids):
+    """A DataNode gave up on copies we asked for, queue the blocks again."""
+    if not namespace_loaded.done():
+        return  # nothing was asked of it since this NameNode started
+    with namespace_lock:
+        for block_id in block_ids:
+            block_index = namespace.get_block_index(block_id)
+            if block_index is not None and replication.copy_failed(block_index):
+                check_replication(block_index)
+    logger.warning(f"DataNode {node_id} failed to replicate {len(block_ids)} blocks")
+
+
+def take_replication_commands(node_id):
+    return replication.take_commands(node_id)
+
+
+def queue_dead_node_blocks(node_id):
+    """Queue every block a dead DataNode held, a batch at a time so uploads aren't locked out meanwhile."""
+    with namespace_lock:
+        for block_index in replication.node_died(node_id):
+            check_replication(block_index)
+        block_indexes = namespace.blocks_on_node(node_id)
+    for start in range(0, len(block_indexes), REPLICATION_SCAN_BATCH):
+        with namespace_lock:
+            for block_index in block_indexes[start:start + REPLICATION_SCAN_BATCH]:
+                check_replication(block_index)
+    logger.warning(f"DataNode {node_id} is dead, checked its {len(block_indexes)} blocks for re-replication "
+                   f"({len(replication.queue)} blocks under-replicated)")
+
+
+def schedule_replication(max_blocks=REPLICATION_WORK_PER_CHECK):
+    """
+    Pop the most urgent under-replicated blocks and turn them into copy commands.
+    Blocks whose live replicas are all busy copying (or with nowhere to go) go back in the queue
+    for the next pass. Returns how many copies were scheduled.
+    """
+    live_nodes = get_available_datanodes()
+    deferred = []
+    scheduled = 0
+    for _ in range(max_blocks):
+        block_index = replication.queue.pop()
+        if block_index is None:
+            break
+        with namespace_lock:
+            replicas = namespace.block_replicas(block_index)
+            live = [node for node in replicas if liveness.is_live(node)]
+            in_flight = replication.pending_targets(block_index)
+            needed = namespace.expected_replicas(block_index) - len(live) - len(in_flight)
+            if needed <= 0:
+                continue
+            if not live:
+                if block_index not in missing_blocks:
+                    missing_blocks.add(block_index)
+                    logger.error(f"Block {namespace.block_id(block_index)} has no live replica left, can't re-replicate it")
+                continue
+            source = replication.pick_source(live)
+            candidates = [node for node in live_nodes if node not in replicas and node not in in_flight]
+            if source is None or not candidates:
+                deferred.append((block_index, len(live)))
+                continue
+            targets = placement_policy.place(namespace.block_size(block_index), needed, candidates)
+            replication.schedule(block_index, namespace.block_id(block_index), source, targets)
+            scheduled += 1
+    for block_index, live_count in deferred:
+        replication.queue.push(block_index, live_count)
+    return scheduled
+
+
+def run_replication_monitor():
+    """
+    Background thread: queue blocks of DataNodes that died, retry copies that timed out,
+    then hand out copy commands. Until HEARTBEAT_TIMEOUT_SECONDS after startup nothing is
+    queued (nodes are still checking in); after that, nodes the namespace knows that never
+    heartbeated are treated as dead too.
+    """
+    started = time.monotonic()
+    startup_checked = False
+    while True:
+        time.sleep(REPLICATION_CHECK_SECONDS)
+        try:
+            live_nodes = get_available_datanodes()  # also expires nodes that went silent
+            if not startup_checked and time.monotonic() - started >= HEARTBEAT_TIMEOUT_SECONDS:
+                with namespace_lock:
+                    known_nodes = list(namespace.nodes.names)
+                dead_nodes.extend(node for node in known_nodes if node not in live_nodes)
+                startup_checked = True
+            while dead_nodes:
+                queue_dead_node_blocks(dead_nodes.popleft())
+            expired = replication.expire()
+            if expired:
+                logger.warning(f"{len(expired)} block copies timed out, scheduling them again")
+                with namespace_lock:
+                    for block_index in expired:
+                        check_replication(block_index)
+            scheduled = schedule_replication()
+            if scheduled:
+                logger.info(f"Scheduled {scheduled} block copies, {len(replication.queue)} blocks still under-replicated")
+        except Exception as e:
+            logger.error(f"Replication monitor pass failed: {e}")
+
+
+def start_replication_monitor():
+    thread = threading.Thread(target=run_replication_monitor, daemon=True)
+    thread.start()
+    return thread
+
+
+def get_replication_status():
+    return {**replication.stats(), "missing_blocks": len(missing_blocks), "live_datanodes": list(get_available_datanodes())}
+
+
+def apply_edit(edit):
+    """Apply one namespace edit to the in-memory state, used both live and on edit log replay."""
+    if edit["op"] == "add_file":
+        metadata = edit["metadata"]
+        file_block_size = metadata["block_size"]
+        if metadata.get("dedup"):
+            # reused chunks keep their replicas, only the chunks this upload placed are (re)assigned
+            sizes = dict(zip(metadata["blocks"], metadata["block_sizes"]))
+            for block_id, node_names in edit["block_assignments"].items():
+                namespace.add_block(block_id, sizes[block_id], node_names)
+        else:
+            for block_number, block_id in enumerate(metadata["blocks"]):
+                if "block_sizes" in metadata:
+                    size = metadata["block_sizes"][block_number]
+                else:
+                    size = min(file_block_size, metadata["filesize"] - block_number * file_block_size)
+                namespace.add_block(block_id, size, edit["block_assignments"].get(block_id, []))
+        namespace.add_file(edit["filename"], metadata["filesize"], file_block_size, metadata["created_at"],
+                           metadata["replication_factor"], metadata["blocks"], metadata.get("storage_policy"),
+                           metadata.get("dedup", False))
+    elif edit["op"] == "add_files":
+        for file_edit in edit["files"]:
+            apply_edit(file_edit)
+    elif edit["op"] == "add_containers":
+        for container in edit["containers"]:
+            namespace.add_block(container["block_id"], container["size"], container["assigned_datanodes"])
+            for packed in container["files"]:
+                namespace.add_file(packed["filename"], packed["size"], edit["block_size"], edit["created_at"],
+                                   edit["replication_factor"], [container["block_id"]], container_offset=packed["offset"])
+    elif edit["op"] == "reassign_blocks":
+        for block_id, node_names in edit["block_assignments"].items():
+            block_index = namespace.get_block_index(block_id)
+            if block_index is not None:
+                namespace.set_replicas(block_index, node_names)
+    elif edit["op"] == "add_replicas":
+        for block_id in edit["block_ids"]:
+            block_index = namespace.get_block_index(block_id)
+            # a full block keeps its replicas, the extra copy is just not tracked
+            if block_index is not None and len(namespace.block_replicas(block_index)) < namespace.max_replicas:
+                namespace.add_replica(block_index, edit["node_id"])
+    elif edit["op"] == "remove_replicas":
+        for block_id in edit["block_ids"]:
+            block_index = namespace.get_block_index(block_id)
+            if block_index is not None:
+                namespace.remove_replica(block_index, edit["node_id"])
+    else:
+        # skipping it would leave the namespace silently wrong, better not to come up at all
+        raise ValueError(f"Unknown edit op {edit['op']} (txid {edit.get('txid')})")
+
+
+def wait_until_durable(txid):
+    """
+    Awaitable that resolves once the edit log is fsynced up to txid.
+    The fsync runs on the edit log writer thread, edits that pile up while it is busy
+    are covered by its next fsync (group commit).
+    """
+    return asyncio.wrap_future(edit_log_writer.submit(timed_sync, txid))
+
+
+def timed_sync(txid):
+    with edit_log_sync_seconds.time():
+        edit_log.sync(txid)
+
+
+
+def get_file_blocks(filename):
+    """
+    Look up a file's blocks and where they live, in file order.
+    Returns None if the file is unknown, otherwise the file info with each block's
+    offset, size and locations (live DataNodes first so readers try those before dead ones).
+    """
+    with namespace_lock:
+        record = namespace.get_file(filename)
+        if record is None or record.blocks is None:
+            return None
+        if record.storage_policy is not None:
+            return get_file_block_groups(filename, record)
+        if record.container_offset is not None:
+            # a packed file is a byte range of its container, readers ask for it with a Range header
+            block_index = record.blocks[0]
+            locations = namespace.block_replicas(block_index)
+            return {"filename": filename, "filesize": record.filesize, "blocks": [{
+                "block_id": namespace.block_id(block_index),
+                "offset": 0,
+                "size": record.filesize,
+                "container_offset": record.container_offset,
+                "locations": sorted(locations, key=lambda node: not liveness.is_live(node))
+            }]}
+        blocks = []
+        offset = 0
+        for block_index in record.blocks:
+            locations = namespace.block_replicas(block_index)
+            size = namespace.block_size(block_index)
+            blocks.append({
+                "block_id": namespace.block_id(block_index),
+                "offset": offset,
+                "size": size,
+                "locations": sorted(locations, key=lambda node: not liveness.is_live(node))
+            })
+            offset += size
+        filesize = record.filesize
+    return {"filename": filename, "filesize": filesize, "blocks": blocks}
+
+
+def get_file_block_groups(filename, record):
+    """get_file_blocks for erasure coded files: the block groups with their internal blocks. Hold namespace_lock."""
+    policy = get_storage_policy(record.storage_policy)
+    group_size = policy.group_size(record.block_size)
+    groups = []
+    for first in range(0, len(record.blocks), policy.width):
+        offset = len(groups) * group_size
+        blocks = []
+        for unit, block_index in enumerate(record.blocks[first:first + policy.width]):
+            locations = namespace.block_replicas(block_index)
+            blocks.append({
+                "block_id": namespace.block_id(block_index),
+                "index": unit,
+                "size": namespace.block_size(block_index),
+                "locations": sorted(locations, key=lambda node: not liveness.is_live(node))
+            })
+        groups.append({"offset": offset, "size": min(group_size, record.filesize - offset), "blocks": blocks})
+    return {"filename": filename, "filesize": record.filesize, **policy.describe(), "block_groups": groups}
+
+
+def get_active_datanodes_copy():
+    with datanodes_lock:
+        return dict(active_datanodes)
+
+
+def snapshot_metadata(txid):
+    """Point-in-time copy of the metadata as of txid, must be taken under namespace_lock."""
+    return {
+        "txid": txid,
+        "active_datanodes": get_active_datanodes_copy(),
+        "namespace": namespace.freeze(),
+    }
+
+
+def store_metadata(snapshot):
+    """
+    Persist a metadata snapshot to disk in the binary snapshot format (snapshot.py).
+    """
+    try:
+        extra = {
+            # convert datetime to string
+            "active_datanodes": {
+                node_id: dt.isoformat() for node_id,dt in snapshot["active_datanodes"].items()
+            },
+            "last_updated": datetime.now().isoformat()
+        }
+        store_snapshot(SNAPSHOT_FILE, snapshot["txid"], snapshot["namespace"], extra)
+        # the JSON checkpoint an older version left would be stale from now on
+        if os.path.exists(LEGACY_METADATA_FILE):
+            os.remove(LEGACY_METADATA_FILE)
+
+        logger.info(f"Metadata checkpoint saved to {SNAPSHOT_FILE} at txid {snapshot['txid']}")
+        return True
+
+    except Exception as e:
+        logger.error(f"Failed to save metadata checkpoint: {e}")
+        return False
+
+
+def checkpoint():
+    """Fold the edit log into a fresh snapshot and drop the segments it covers."""
+    global checkpoint_txid
+    with namespace_lock:
+        # roll while no one can mutate, so the snapshot matches txid exactly
+        txid = edit_log.roll()
+        metadata = snapshot_metadata(txid)
+    # the slow part (serializing + fsync) runs without holding up mutations
+    with checkpoint_seconds.time():
+        stored = store_metadata(metadata)
+    if not stored:
+        return
+    checkpoint_txid = txid
+    edit_log.purge_before(txid + 1)
+
+
+def run_checkpointer():
+    """Background thread: checkpoint every CHECKPOINT_INTERVAL_SECONDS or after CHECKPOINT_TXNS edits."""
+    last_checkpoint = time.monotonic()
+    while True:
+        time.sleep(CHECKPOINT_CHECK_SECONDS)
+        pending = edit_log.edits_since(checkpoint_txid)
+        interval_due = time.monotonic() - last_checkpoint >= CHECKPOINT_INTERVAL_SECONDS
+        if pending >= CHECKPOINT_TXNS or (pending and interval_due):
+            checkpoint()
+            last_checkpoint = time.monotonic()
+
+
+def start_checkpointer():
+    thread = threading.Thread(target=run_checkpointer, daemon=True)
+    thread.start()
+    return thread
+
+
+def read_legacy_metadata():
+    """(txid, namespace, active_datanodes as ISO strings) from a metadata.json checkpoint."""
+    with open(LEGACY_METADATA_FILE,"r",encoding="utf-8") as f:
+        metadata= json.load(f)
+    # Rebuild the compact namespace from file_metadata and block_assignments
+    loaded=Namespace.from_metadata(metadata["file_metadata"], metadata["block_assignments"], block_size)
+    # snapshots from before the edit log have no txid
+    return metadata.get("txid", 0), loaded, metadata["active_datanodes"]
+
+
+def load_metadata():
+    """
+    Load metadata from disk on NameNode startup.
+    Reads the last checkpoint snapshot, then replays the edit log written since it.
+    Holds namespace_lock throughout and marks the namespace loaded at the end.
+    """
+    global namespace, checkpoint_txid
+
+    snapshot_txid = 0
+    with namespace_lock:
+        # A snapshot that is there but can't be read raises. Its edits were purged at checkpoint time,
+        # so starting empty would serve a partial namespace and the next checkpoint would overwrite
+        # the snapshot with it. Only a fresh metadata dir starts empty.
+        if os.path.exists(SNAPSHOT_FILE):
+            snapshot_txid, namespace, extra = read_snapshot(SNAPSHOT_FILE)
+            saved_datanodes = extra["active_datanodes"]
+        elif os.path.exists(LEGACY_METADATA_FILE):
+            snapshot_txid, namespace, saved_datanodes = read_legacy_metadata()
+        else:
+            logger.info("No existing metadata snapshot found")
+            saved_datanodes = {}
+        # Restore active_datanodes (convert ISO strings back to datetime), heartbeats that
+        # came in while loading are newer and win
+        with datanodes_lock:
+            for node_id, dt_str in saved_datanodes.items():
+                active_datanodes.setdefault(node_id, datetime.fromisoformat(dt_str))
+        if snapshot_txid:
+            logger.info(f"Metadata snapshot loaded (txid {snapshot_txid})")
+
+        last_txid = snapshot_txid
+        replayed = 0
+        for edit in read_edits(METADATA_DIR, after_txid=snapshot_txid):
+            apply_edit(edit)
+            last_txid = edit["txid"]
+            replayed += 1
+        logger.info(f"Replayed {replayed} edits from the edit log, namespace at txid {last_txid}")
+
+        checkpoint_txid = snapshot_txid
+        edit_log.open(last_txid)
+        mark_namespace_loaded()
+
+
+def mark_namespace_loaded():
+    """Apply the block reports that arrived while loading, then let waiting requests through."""
+    with early_reports_lock:
+        for node_id, added_ids, removed_ids in early_reports:
+            apply_incremental_report(node_id, added_ids, removed_ids)
+        early_reports.clear()
+        if not namespace_loaded.done():
+            namespace_loaded.set_result(True)
+
+
+def is_namespace_loaded():
+    return namespace_loaded.done()
+
+
+def wait_until_loaded():
+    """Awaitable that resolves once the namespace has loaded at startup, raises if loading failed."""
+    return asyncio.wrap_future(namespace_loaded)
+
+
+def index_namespace_nodes():
+    """
+    Build the node -> blocks index a snapshot load leaves out, a batch per namespace_lock hold so requests
+    get in between. A block report that needs it before it is done finishes it on the spot.
+    """
+    started = time.perf_counter()
+    while True:
+        with namespace_lock:
+            if not namespace.unindexed_blocks or namespace.index_nodes(NODE_INDEX_BATCH):
+                break
+    logger.info(f"Node block index built in {time.perf_counter() - started:.2f}s")
+
+
+def start_metadata_loader():
+    """
+    Load the namespace on a background thread so the NameNode answers health checks and heartbeats
+    right away. Everything else waits for wait_until_loaded(). The checkpointer and replication
+    monitor start once the namespace is in; if it can't be loaded the process exits.
+    """
+    def run():
+        started = time.perf_counter()
+        try:
+            load_metadata()
+        except BaseException as e:
+            # don't come up without the namespace, requests would see a partial one. Exit so the
+            # container restarts and someone looks at the metadata dir
+            logger.exception(f"Loading the namespace failed, shutting down: {e}")
+            namespace_loaded.set_exception(e)
+            os._exit(1)
+        namespace_load_seconds.set(time.perf_counter() - started)
+        logger.info(f"Namespace loaded in {time.perf_counter() - started:.2f}s: "
+                    f"{namespace.num_files()} files, {namespace.num_blocks()} blocks")
+        start_checkpointer()
+        start_replication_monitor()
+        index_namespace_nodes()
+
+    thread = threading.Thread(target=run, daemon=True, name="metadata-loader")
+    thread.start()
+    return thread
@@ -0,0 +1,325 @@
+import os
+from array import array
+
+# Replica slots reserved per block, must be >= the replication factor (re-replication can briefly add one more)
+MAX_REPLICAS = int(os.getenv("MAX_REPLICAS", str(max(3, int(os.getenv("REPLICATION_FACTOR", "2")) + 1))))
+NO_NODE = -1
+
+
+class NodeRegistry:
+    """Interns DataNode hostnames as small ints so replica lists don't repeat the name string per block."""
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+
+    def intern(self, name):
+        node_id = self.ids.get(name)
+        if node_id is None:
+            node_id = len(self.names)
+            self.ids[name] = node_id
+            self.names.append(name)
+        return node_id
+
+    def get(self, name):
+        return self.ids.get(name)
+
+    def name(self, node_id):
+        return self.names[node_id]
+
+    def __len__(self):
+        return len(self.names)
+
+
+class FileRecord:
+    """
+    One file in the namespace, blocks is an array of block indexes in file order (None for legacy entries).
+    Erasure coded files have a storage_policy name and list the internal blocks group by group.
+    Dedup files are made of content-defined chunks, blocks shared with every other file holding the same bytes.
+    Packed small files live at container_offset inside a container block they share with other small files.
+    """
+    __slots__ = ("filesize", "block_size", "created_at", "replication_factor", "blocks", "storage_policy", "dedup",
+                 "container_offset")
+
+    def __init__(self, filesize, block_size, created_at, replication_factor, blocks, storage_policy=None, dedup=False,
+                 container_offset=None):
+        self.filesize = filesize
+        self.block_size = block_size
+        self.created_at = created_at
+        self.replication_factor = replication_factor
+        self.blocks = blocks
+        self.storage_policy = storage_policy
+        self.dedup = dedup
+        self.container_offset = container_offset
+
+    def to_metadata(self, block_ids, block_sizes=None):
+        """Same dict shape the NameNode has always stored for a file in metadata.json."""
+        metadata = {
+            "filesize": self.filesize,
+            "total_blocks": len(self.blocks) if self.blocks is not None else 0,
+            "block_size": self.block_size,
+            "created_at": self.created_at,
+            "replication_factor": self.replication_factor
+        }
+        if self.blocks is not None:
+            metadata["blocks"] = [block_ids[block_index] for block_index in self.blocks]
+        if self.storage_policy is not None:
+            metadata["storage_policy"] = self.storage_policy
+        if self.dedup:
+            metadata["dedup"] = True
+        if self.container_offset is not None:
+            metadata["container_offset"] = self.container_offset
+        if self.storage_policy is not None or self.dedup or self.container_offset is not None:
+            # internal block, chunk and container sizes don't follow from block_size, keep them
+            metadata["block_sizes"] = [block_sizes[block_index] for block_index in self.blocks]
+        return metadata
+
+
+class Namespace:
+    """
+    Compact in-memory namespace.
+    Blocks live in parallel arrays indexed by a block index: the id string, the size, the
+    replication factor of its file, and MAX_REPLICAS int32 replica slots holding interned node ids. On top of that there is a
+    block id -> index dict, a file -> block index array map, and a node -> block index reverse index.
+    The reverse index is append-only per node; entries whose block no longer lists that node are
+    skipped on read and dropped when the node's array gets compacted.
+    A namespace loaded from a binary snapshot looks block ids up in the snapshot's hash table (snapshot.BlockIndex)
+    and starts with an empty reverse index: blocks below unindexed_blocks aren't in it yet and go in a batch
+    at a time (index_nodes), or all at once when a node's blocks are asked for.
+    Dedup chunks are blocks named after their content fingerprint, so the block id dict doubles as the
+    fingerprint index; block_refs counts how many places in dedup files point at each chunk.
+    """
+    def __init__(self, max_replicas=MAX_REPLICAS):
+        self.max_replicas = max_replicas
+        self.nodes = NodeRegistry()
+        self.files = {}
+        self.block_index = {}
+        self.block_ids = []
+        self.block_sizes = array("q")
+        self.block_replication = array("b")  # wanted replicas, set when the block's file is added
+        self.block_refs = array("i")  # references from dedup files, 0 for every other block
+        self.replicas = array("i")
+        self.node_blocks = {}
+        self.node_stale = {}
+        self.unindexed_blocks = 0
+        self.dedup_logical_bytes = 0  # file bytes of all dedup files
+        self.dedup_stored_bytes = 0  # bytes of the distinct chunks they reference
+        self.dedup_chunks = 0  # chunks with at least one reference
+
+    # ---- blocks ----
+    def add_block(self, block_id, size, node_names=()):
+        """Add a block (or replace an existing block's size and replicas), returns its block index."""
+        block_index = self.block_index.get(block_id)
+        if block_index is None:
+            block_index = len(self.block_ids)
+            self.block_index[block_id] = block_index
+            self.block_ids.append(block_id)
+            self.block_sizes.append(size)
+            self.block_replication.append(0)
+            self.block_refs.append(0)
+            self.replicas.extend([NO_NODE] * self.max_replicas)
+        else:
+            self.block_sizes[block_index] = size
+        self.set_replicas(block_index, node_names)
+        return block_index
+
+    def set_replicas(self, block_index, node_names):
+        if len(node_names) > self.max_replicas:
+            raise ValueError(f"{len(node_names)} replicas requested, only {self.max_replicas} slots per block (MAX_REPLICAS)")
+        old_node_ids = self._replica_ids(block_index)
+        base = block_index * self.max_replicas
+        for slot in range(self.max_replicas):
+            self.replicas[base + slot] = NO_NODE
+        for node_id in old_node_ids:
+            self._unindex(node_id)
+        for slot, name in enumerate(node_names):
+            node_id = self.nodes.intern(name)
+            self.replicas[base + slot] = node_id
+            self.node_blocks.setdefault(node_id, array("q")).append(block_index)
+
+    def add_replica(self, block_index, node_name):
+        """Record one more replica of a block, returns False if it was already there."""
+        node_id = self.nodes.intern(node_name)
+        base = block_index * self.max_replicas
+        slots = self.replicas[base:base + self.max_replicas]
+        if node_id in slots:
+            return False
+        if NO_NODE not in slots:
+            raise ValueError(f"Block {self.block_ids[block_index]} already has {self.max_replicas} replicas")
+        self.replicas[base + slots.index(NO_NODE)] = node_id
+        self.node_blocks.setdefault(node_id, array("q")).append(block_index)
+        return True
+
+    def remove_replica(self, block_index, node_name):
+        """Forget one replica of a block, returns False if that node didn't have it."""
+        node_id = self.nodes.get(node_name)
+        current = self._replica_ids(block_index)
+        if node_id not in current:
+            return False
+        remaining = [other for other in current if other != node_id]
+        base = block_index * self.max_replicas
+        for slot in range(self.max_replicas):
+            self.replicas[base + slot] = remaining[slot] if slot < len(remaining) else NO_NODE
+        self._unindex(node_id)
+        return True
+
+    def _replica_ids(self, block_index):
+        base = block_index * self.max_replicas
+        return [node_id for node_id in self.replicas[base:base + self.max_replicas] if node_id != NO_NODE]
+
+    def get_block_index(self, block_id):
+        return self.block_index.get(block_id)
+
+    def block_id(self, block_index):
+        return self.block_ids[block_index]
+
+    def block_size(self, block_index):
+        return self.block_sizes[block_index]
+
+    def expected_replicas(self, block_index):
+        return self.block_replication[block_index]
+
+    def block_refcount(self, block_index):
+        return self.block_refs[block_index]
+
+    def block_replicas(self, block_index):
+        """Hostnames of the DataNodes holding a block."""
+        return [self.nodes.name(node_id) for node_id in self._replica_ids(block_index)]
+
+    # ---- node -> blocks reverse index ----
+    def _unindex(self, node_id):
+        # lazy delete: count the stale entry and compact once they are half the array
+        stale = self.node_stale.get(node_id, 0) + 1
+        self.node_stale[node_id] = stale
+        if stale * 2 > len(self.node_blocks.get(node_id, ())):
+            self._compact_node(node_id)
+
+    def _compact_node(self, node_id):
+        self.node_blocks[node_id] = array("q", self._live_node_blocks(node_id))
+        self.node_stale[node_id] = 0
+
+    def _live_node_blocks(self, node_id):
+        seen = set()
+        for block_index in self.node_blocks.get(node_id, ()):
+            if block_index not in seen and node_id in self._replica_ids(block_index):
+                seen.add(block_index)
+                yield block_index
+
+    def blocks_on_node(self, node_name):
+        """Block indexes a DataNode holds, without scanning every block."""
+        if self.unindexed_blocks:
+            self.index_nodes()
+        node_id = self.nodes.get(node_name)
+        if node_id is None:
+            return []
+        return list(self._live_node_blocks(node_id))
+
+    def index_nodes(self, max_blocks=None):
+        """Add up to max_blocks (default all) of the blocks loaded from a snapshot to the reverse index, True once all are in."""
+        end = self.unindexed_blocks
+        start = 0 if max_blocks is None else max(0, end - max_blocks)
+        node_blocks = self.node_blocks
+        for slot in range(self.max_replicas):
+            node_ids = self.replicas[start * self.max_replicas + slot:end * self.max_replicas:self.max_replicas]
+            for block_index, node_id in zip(range(start, end), node_ids):
+                if node_id != NO_NODE:
+                    blocks = node_blocks.get(node_id)
+                    if blocks is None:
+                        blocks = node_blocks[node_id] = array("q")
+                    blocks.append(block_index)
+        self.unindexed_blocks = start
+        return start == 0
+
+    # ---- files ----
+    def add_file(self, filename, filesize, block_size, created_at, replication_factor, block_ids, storage_policy=None,
+                 dedup=False, container_offset=None):
+        """
+        Record a file whose blocks were already added, block_ids in file order (None if unknown).
+        A packed file has its container as its only block and starts at container_offset in it.
+        Replacing a dedup file drops the references its old version held.
+        """
+        old = self.files.get(filename)
+        if old is not None and old.dedup:
+            self._unreference(old)
+        blocks = None
+        if block_ids is not None:
+            blocks = array("q", (self.block_index[block_id] for block_id in block_ids))
+            # erasure coded blocks get rebuilt from the rest of their stripe, not copied,
+            # so they ask for 0 replicas and the replication monitor leaves them alone
+            wanted = 0 if storage_policy else min(replication_factor or 0, self.max_replicas)
+            for block_index in blocks:
+                self.block_replication[block_index] = wanted
+        self.files[filename] = FileRecord(filesize, block_size, created_at, replication_factor, blocks, storage_policy, dedup,
+                                          container_offset)
+        if dedup:
+            self.dedup_logical_bytes += filesize
+            for block_index in blocks:
+                if self.block_refs[block_index] == 0:
+                    self.dedup_stored_bytes += self.block_sizes[block_index]
+                    self.dedup_chunks += 1
+                self.block_refs[block_index] += 1
+
+    def _unreference(self, record):
+        self.dedup_logical_bytes -= record.filesize
+        for block_index in record.blocks:
+            self.block_refs[block_index] -= 1
+            if self.block_refs[block_index] == 0:
+                # nothing points at the chunk any more, its replicas stay until they are cleaned up
+                self.dedup_stored_bytes -= self.block_sizes[block_index]
+                self.dedup_chunks -= 1
+
+    def get_file(self, filename):
+        return self.files.get(filename)
+
+    def num_files(self):
+        return len(self.files)
+
+    def num_blocks(self):
+        return len(self.block_ids)
+
+    # ---- persistence ----
+    def freeze(self):
+        """
+        Cheap point-in-time copy for checkpointing: arrays and dicts are copied at C speed,
+        FileRecords are shared since they are replaced, never edited, once added.
+        The id -> index dict and the reverse index are left out, the snapshot writer works from block_ids.
+        """
+        frozen = Namespace(self.max_replicas)
+        frozen.nodes.ids = dict(self.nodes.ids)
+        frozen.nodes.names = list(self.nodes.names)
+        frozen.files = self.files.copy()
+        frozen.block_ids = list(self.block_ids)
+        frozen.block_sizes = array("q", self.block_sizes)
+        frozen.block_replication = array("b", self.block_replication)
+        frozen.block_refs = array("i", self.block_refs)
+        frozen.replicas = array("i", self.replicas)
+        frozen.dedup_logical_bytes = self.dedup_logical_bytes
+        frozen.dedup_stored_bytes = self.dedup_stored_bytes
+        frozen.dedup_chunks = self.dedup_chunks
+        return frozen
+
+    def to_metadata(self):
+        """Expand into the file_metadata / block_assignments dicts stored in metadata.json."""
+        file_metadata = {filename: record.to_metadata(self.block_ids, self.block_sizes) for filename, record in self.files.items()}
+        block_assignments = {block_id: self.block_replicas(block_index) for block_index, block_id in enumerate(self.block_ids)}
+        return file_metadata, block_assignments
+
+    @classmethod
+    def from_metadata(cls, file_metadata, block_assignments, default_block_size):
+        """Build a namespace from the metadata.json dicts."""
+        namespace = cls()
+        sizes = {}
+        for metadata in file_metadata.values():
+            file_block_size = metadata.get("block_size", default_block_size)
+            if "block_sizes" in metadata:
+                sizes.update(zip(metadata["blocks"], metadata["block_sizes"]))
+                continue
+            for block_number, block_id in enumerate(metadata.get("blocks", [])):
+                sizes[block_id] = min(file_block_size, metadata["filesize"] - block_number * file_block_size)
+        for block_id, node_names in block_assignments.items():
+            namespace.add_block(block_id, sizes.get(block_id, 0), node_names)
+        for filename, metadata in file_metadata.items():
+            namespace.add_file(filename, metadata["filesize"], metadata.get("block_size", default_block_size),
+                               metadata.get("created_at"), metadata.get("replication_factor"), metadata.get("blocks"),
+                               metadata.get("storage_policy"), metadata.get("dedup", False),
+                               metadata.get("container_offset"))
+        return namespace
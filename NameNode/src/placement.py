@@ -0,0 +1,156 @@
+import os
+import random
+import threading
+from abc import ABC, abstractmethod
+
+# Default capacity assumed for DataNodes that haven't sent a storage report yet
+DEFAULT_CAPACITY_BYTES = int(os.getenv("DEFAULT_CAPACITY_BYTES", str(100 * 1024 ** 3)))
+# How much one in-flight write counts against a node, as a fraction of its capacity
+INFLIGHT_WRITE_PENALTY = float(os.getenv("INFLIGHT_WRITE_PENALTY", "0.01"))
+
+
+class NodeLoad:
+    """What the NameNode knows about a DataNode's storage and write load."""
+    __slots__ = ("capacity", "used", "inflight", "pending", "block_count")
+
+    def __init__(self):
+        self.capacity = DEFAULT_CAPACITY_BYTES
+        self.used = 0
+        self.inflight = 0
+        self.pending = 0  # bytes we assigned since its last report, not yet reflected in used
+        self.block_count = 0
+
+    def free(self):
+        return self.capacity - self.used - self.pending
+
+    def score(self):
+        """Lower is better: fraction of capacity used (counting pending bytes) plus a penalty per in-flight write."""
+        capacity = self.capacity or 1
+        return (self.used + self.pending) / capacity + self.inflight * INFLIGHT_WRITE_PENALTY
+
+
+class NodeStatsTable:
+    """Storage reports from heartbeats plus the bytes the NameNode has placed on each node since."""
+    def __init__(self):
+        self.nodes = {}
+        self.lock = threading.Lock()
+
+    def _get(self, node_id):
+        load = self.nodes.get(node_id)
+        if load is None:
+            load = self.nodes[node_id] = NodeLoad()
+        return load
+
+    def update_report(self, node_id, capacity=None, used=None, inflight=None, block_count=None):
+        with self.lock:
+            load = self._get(node_id)
+            if used is not None:
+                # whatever the node wrote since the last report was (mostly) what we sent it
+                load.pending = max(0, load.pending - max(0, used - load.used))
+                load.used = used
+            if capacity is not None:
+                load.capacity = capacity
+            if inflight is not None:
+                load.inflight = inflight
+            if block_count is not None:
+                load.block_count = block_count
+
+    def record_assignment(self, node_ids, size):
+        with self.lock:
+            for node_id in node_ids:
+                self._get(node_id).pending += size
+
+    def get(self, node_id):
+        return self.nodes.get(node_id)
+
+
+class PlacementPolicy(ABC):
+    """Picks the DataNodes for one block's replicas. Implementations must never repeat a node."""
+    def __init__(self, stats):
+        self.stats = stats
+
+    @abstractmethod
+    def choose(self, block_size, replication_factor, candidates):
+        pass
+
+    def place(self, block_size, replication_factor, candidates):
+        nodes = self.choose(block_size, replication_factor, candidates)
+        self.stats.record_assignment(nodes, block_size)
+        return nodes
+
+
+class RoundRobinPlacement(PlacementPolicy):
+    """
+    The original consecutive (n, n+1, ...) placement, kept for comparison.
+    The cursor carries over between files so they don't all start on the first node.
+    """
+    def __init__(self, stats):
+        super().__init__(stats)
+        self.cursor = 0
+        self.lock = threading.Lock()
+
+    def choose(self, block_size, replication_factor, candidates):
+        num_replicas = min(replication_factor, len(candidates))
+        with self.lock:
+            start = self.cursor
+            self.cursor += 1
+        return [candidates[(start + i) % len(candidates)] for i in range(num_replicas)]
+
+
+class PowerOfTwoChoicesPlacement(PlacementPolicy):
+    """
+    For every replica sample two random nodes not chosen yet and keep the less loaded one,
+    using free space and in-flight writes (NodeLoad.score). Nodes without room for the block are
+    skipped while others have room. O(replicas) per block, no sort or scan over the cluster.
+    """
+    MAX_SAMPLE_ATTEMPTS = 8
+
+    def choose(self, block_size, replication_factor, candidates):
+        num_replicas = min(replication_factor, len(candidates))
+        if num_replicas == len(candidates):
+            chosen = list(candidates)
+            random.shuffle(chosen)
+            return chosen
+        chosen = []
+        for _ in range(num_replicas):
+            first = self._sample(candidates, chosen, block_size)
+            second = self._sample(candidates, chosen + [first], block_size)
+            if second is not None and self._score(second) < self._score(first):
+                first = second
+            chosen.append(first)
+        return chosen
+
+    def _sample(self, candidates, exclude, block_size):
+        fallback = None
+        for _ in range(self.MAX_SAMPLE_ATTEMPTS):
+            node_id = candidates[random.randrange(len(candidates))]
+            if node_id in exclude:
+                continue
+            load = self.stats.get(node_id)
+            if load is None or load.free() >= block_size:
+                return node_id
+            fallback = fallback or node_id
+        if fallback is not None:
+            return fallback
+        # unlucky draws on a tiny cluster: take the first node not excluded
+        for node_id in candidates:
+            if node_id not in exclude:
+                return node_id
+        return None
+
+    def _score(self, node_id):
+        load = self.stats.get(node_id)
+        return load.score() if load is not None else 0.0
+
+
+PLACEMENT_POLICIES = {
+    "round_robin": RoundRobinPlacement,
+    "p2c": PowerOfTwoChoicesPlacement,
+}
+
+
+def get_placement_policy(name, stats):
+    try:
+        return PLACEMENT_POLICIES[name](stats)
+    except KeyError:
+        raise ValueError(f"Unknown placement policy {name}, pick one of {sorted(PLACEMENT_POLICIES)}")
@@ -0,0 +1,151 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+
+# Copies a DataNode may be sending at once, the DataNode also throttles their bandwidth
+MAX_REPLICATION_STREAMS = int(os.getenv("MAX_REPLICATION_STREAMS", "2"))
+# A scheduled copy not confirmed by a block report within this long is scheduled again
+REPLICATION_TIMEOUT_SECONDS = int(os.getenv("REPLICATION_TIMEOUT_SECONDS", "300"))
+
+
+class UnderReplicatedQueue:
+    """
+    Blocks with fewer live replicas than their file wants, most urgent first.
+    Priority is the number of live replicas, so a block down to its last copy is repaired
+    before one that only lost one of three. Entries are re-checked when popped, so pushing
+    a block that got repaired in the meantime is harmless.
+    """
+    def __init__(self):
+        self.heap = []
+        self.queued = set()
+        self.counter = itertools.count()  # FIFO within a priority
+        self.lock = threading.Lock()
+
+    def push(self, block_index, live_replicas):
+        with self.lock:
+            if block_index in self.queued:
+                return
+            self.queued.add(block_index)
+            heapq.heappush(self.heap, (live_replicas, next(self.counter), block_index))
+
+    def pop(self):
+        with self.lock:
+            if not self.heap:
+                return None
+            _, _, block_index = heapq.heappop(self.heap)
+            self.queued.discard(block_index)
+            return block_index
+
+    def __len__(self):
+        return len(self.queued)
+
+
+class PendingReplication:
+    __slots__ = ("source", "targets", "command", "deadline")
+
+    def __init__(self, source, targets, command, deadline):
+        self.source = source
+        self.targets = targets
+        self.command = command
+        self.deadline = deadline
+
+
+class ReplicationScheduler:
+    """
+    Turns under-replicated blocks into copy commands for DataNodes.
+    A command goes to one live replica (the source) and is handed out with that node's next
+    heartbeat response, the source then streams the block down a pipeline of new targets.
+    Each source runs at most MAX_REPLICATION_STREAMS copies at a time, so recovering a dead node
+    is spread over every node that shares blocks with it instead of hammering a few.
+    A copy is done once a target's block report lists the block, or times out and is retried.
+    """
+    def __init__(self, max_streams=MAX_REPLICATION_STREAMS, timeout_seconds=REPLICATION_TIMEOUT_SECONDS):
+        self.max_streams = max_streams
+        self.timeout = timeout_seconds
+        self.queue = UnderReplicatedQueue()
+        self.pending = {}  # block index -> PendingReplication
+        self.streams = {}  # source node -> copies it is running
+        self.commands = {}  # source node -> deque of commands not delivered yet
+        self.lock = threading.Lock()
+
+    def pick_source(self, live_replicas):
+        """The live replica with the fewest running copies, None if they are all busy."""
+        with self.lock:
+            source = min(live_replicas, key=lambda node: self.streams.get(node, 0), default=None)
+            if source is None or self.streams.get(source, 0) >= self.max_streams:
+                return None
+            return source
+
+    def pending_targets(self, block_index):
+        with self.lock:
+            pending = self.pending.get(block_index)
+            return pending.targets if pending else []
+
+    def schedule(self, block_index, block_id, source, targets):
+        command = {"op": "replicate", "block_id": block_id, "targets": targets}
+        with self.lock:
+            self.pending[block_index] = PendingReplication(source, list(targets), command, time.monotonic() + self.timeout)
+            self.streams[source] = self.streams.get(source, 0) + 1
+            self.commands.setdefault(source, deque()).append(command)
+
+    def take_commands(self, node_id):
+        """Commands for a DataNode, delivered in its heartbeat response."""
+        with self.lock:
+            commands = self.commands.pop(node_id, None)
+        return list(commands) if commands else []
+
+    def replica_added(self, block_index, node_id):
+        """A target reported the block, returns True once every target of the copy has it."""
+        with self.lock:
+            pending = self.pending.get(block_index)
+            if pending is None or node_id not in pending.targets:
+                return False
+            pending.targets = [target for target in pending.targets if target != node_id]
+            if pending.targets:
+                return False
+            self._finish(block_index)
+            return True
+
+    def copy_failed(self, block_index):
+        """The source gave up on a copy, returns True if it was pending so it can be queued again."""
+        with self.lock:
+            if block_index not in self.pending:
+                return False
+            self._finish(block_index)
+            return True
+
+    def expire(self):
+        """Drop copies that were never confirmed, returns their block indexes so they get queued again."""
+        now = time.monotonic()
+        with self.lock:
+            expired = [block_index for block_index, pending in self.pending.items() if pending.deadline < now]
+            for block_index in expired:
+                self._finish(block_index)
+        return expired
+
+    def node_died(self, node_id):
+        """Cancel copies from or to a dead DataNode, returns their block indexes so they get queued again."""
+        with self.lock:
+            cancelled = [block_index for block_index, pending in self.pending.items()
+                         if pending.source == node_id or node_id in pending.targets]
+            for block_index in cancelled:
+                self._finish(block_index)
+        return cancelled
+
+    def _finish(self, block_index):
+        pending = self.pending.pop(block_index)
+        undelivered = self.commands.get(pending.source)
+        if undelivered and pending.command in undelivered:
+            undelivered.remove(pending.command)
+        remaining = self.streams.get(pending.source, 0) - 1
+        if remaining > 0:
+            self.streams[pending.source] = remaining
+        else:
+            self.streams.pop(pending.source, None)
+
+    def stats(self):
+        with self.lock:
+            return {"under_replicated": len(self.queue), "pending_replications": len(self.pending)}
@@ -0,0 +1,349 @@
+import json
+import mmap
+import os
+import sys
+import struct
+import zlib
+from array import array
+
+from namespace import MAX_REPLICAS, NO_NODE, FileRecord, Namespace
+
+# Binary checkpoint of the namespace: a header, then sections of (tag, length, payload).
+# Every number column is the raw bytes of an array, padded to 8 bytes so it can be used straight
+# out of the memory-mapped file. Block ids and filenames come with a hash table built at checkpoint
+# time, so loading doesn't insert millions of names into dicts: it is a few big copies and one split,
+# and file records are only built when a file is looked up.
+SNAPSHOT_MAGIC = b"HDSNAP"
+SNAPSHOT_VERSION = 1
+HEADER = struct.Struct("<6sHQ")  # magic, version, txid
+SECTION = struct.Struct("<4s4xQ")  # tag, payload length
+ALIGNMENT = 8
+# block ids are split a piece at a time so heartbeats get the GIL in between
+SPLIT_PIECE_BYTES = 1024 * 1024
+
+# FileRecord fields that don't fit a number column, bits of the FFLG column
+FLAG_DEDUP = 1
+FLAG_NO_BLOCKS = 2  # legacy entry without a block list
+FLAG_NO_CREATED_AT = 4
+
+# section tag -> (Namespace attribute, array typecode) of the block columns
+BLOCK_COLUMNS = {
+    b"BSIZ": ("block_sizes", "q"),
+    b"BREP": ("block_replication", "b"),
+    b"BREF": ("block_refs", "i"),
+    b"REPL": ("replicas", "i"),  # max_replicas node id slots per block
+}
+# section tag -> array typecode of the file columns, one entry per file unless noted
+FILE_COLUMNS = {
+    b"FSIZ": "q",  # file size
+    b"FBSZ": "q",  # block size
+    b"FREP": "h",  # replication factor, -1 for None
+    b"FPOL": "h",  # index into the storage policy list, -1 for replicated
+    b"FFLG": "b",  # FLAG_* bits
+    b"FCOF": "q",  # container offset, -1 for files that aren't packed
+    b"FNOF": "q",  # where each filename starts in FNAM, one extra entry for the end
+    b"FBST": "q",  # where each file's blocks start in FBLK, one extra entry for the end
+    b"FBLK": "q",  # block indexes of every file, one after the other
+    b"FCAO": "q",  # where each file's created_at starts in FCAT, one extra entry for the end
+}
+
+
+def build_name_table(names):
+    """
+    Open addressing hash table over names (crc32, linear probing, at most half full): slot -> row + 1, 0 if empty.
+    crc32 and not hash() since str hashes change from one process to the next.
+    """
+    size = 1
+    while size < 2 * len(names):
+        size *= 2
+    mask = size - 1
+    slots = array("i", [0]) * size
+    crc32 = zlib.crc32
+    for row, name in enumerate(names, 1):
+        slot = crc32(name.encode()) & mask
+        while slots[slot]:
+            slot = (slot + 1) & mask
+        slots[slot] = row
+    return slots
+
+
+class NameTable:
+    """name -> row lookups on a build_name_table table, name_matches(row, name, encoded name) compares the stored name."""
+    def __init__(self, slots, name_matches):
+        self.slots = slots
+        self.mask = len(slots) - 1
+        self.name_matches = name_matches
+
+    def find(self, name):
+        encoded = name.encode()
+        slot = zlib.crc32(encoded) & self.mask
+        while True:
+            row = self.slots[slot] - 1
+            if row < 0:
+                return None
+            if self.name_matches(row, name, encoded):
+                return row
+            slot = (slot + 1) & self.mask
+
+
+class BlockIndex:
+    """
+    block id -> block index of a namespace loaded from a snapshot, stands in for the Namespace's dict.
+    Blocks from the snapshot are found through its hash table, blocks added since go in a dict.
+    Block ids are never removed or renumbered, so the table stays right as the namespace changes.
+    """
+    def __init__(self, table):
+        self.table = table
+        self.added = {}
+
+    def get(self, block_id, default=None):
+        block_index = self.added.get(block_id)
+        if block_index is None:
+            block_index = self.table.find(block_id)
+        return default if block_index is None else block_index
+
+    def __getitem__(self, block_id):
+        block_index = self.get(block_id)
+        if block_index is None:
+            raise KeyError(block_id)
+        return block_index
+
+    def __setitem__(self, block_id, block_index):
+        self.added[block_id] = block_index
+
+
+class FileTable:
+    """
+    filename -> FileRecord of a namespace loaded from a snapshot, stands in for the Namespace's files dict.
+    The snapshot's file columns stay in the memory-mapped file and a FileRecord is made when a file is
+    looked up. Files added or replaced since the load go in a plain dict on top. The columns are never
+    written to, so copies share them.
+    """
+    def __init__(self, columns, names, created_at, policies):
+        self.columns = columns
+        self.names = names
+        self.created_at = created_at
+        self.policies = policies
+        self.table = NameTable(columns[b"FTAB"], self.name_matches)
+        self.rows = len(columns[b"FSIZ"])
+        self.changed = {}
+        self.new_files = 0  # changed files that have no row
+
+    def name_matches(self, row, name, encoded):
+        offsets = self.columns[b"FNOF"]
+        return self.names[offsets[row]:offsets[row + 1]] == encoded
+
+    def name(self, row):
+        offsets = self.columns[b"FNOF"]
+        return str(self.names[offsets[row]:offsets[row + 1]], "utf-8")
+
+    def record(self, row):
+        columns = self.columns
+        flags = columns[b"FFLG"][row]
+        blocks = None
+        if not flags & FLAG_NO_BLOCKS:
+            blocks = array("q", columns[b"FBLK"][columns[b"FBST"][row]:columns[b"FBST"][row + 1]])
+        created_at = None
+        if not flags & FLAG_NO_CREATED_AT:
+            created_at = str(self.created_at[columns[b"FCAO"][row]:columns[b"FCAO"][row + 1]], "utf-8")
+        replication_factor = columns[b"FREP"][row]
+        policy = columns[b"FPOL"][row]
+        container_offset = columns[b"FCOF"][row]
+        return FileRecord(columns[b"FSIZ"][row], columns[b"FBSZ"][row], created_at,
+                          None if replication_factor < 0 else replication_factor, blocks,
+                          None if policy < 0 else self.policies[policy], bool(flags & FLAG_DEDUP),
+                          None if container_offset < 0 else container_offset)
+
+    def get(self, filename, default=None):
+        record = self.changed.get(filename)
+        if record is not None:
+            return record
+        row = self.table.find(filename)
+        return default if row is None else self.record(row)
+
+    def __setitem__(self, filename, record):
+        if filename not in self.changed and self.table.find(filename) is None:
+            self.new_files += 1
+        self.changed[filename] = record
+
+    def __len__(self):
+        return self.rows + self.new_files
+
+    def items(self):
+        yield from self.changed.items()
+        for row in range(self.rows):
+            filename = self.name(row)
+            if filename not in self.changed:
+                yield filename, self.record(row)
+
+    def copy(self):
+        table = FileTable(self.columns, self.names, self.created_at, self.policies)
+        table.changed = dict(self.changed)
+        table.new_files = self.new_files
+        return table
+
+
+def write_section(f, tag, payload):
+    f.write(SECTION.pack(tag, len(payload)))
+    f.write(payload)
+    f.write(b"\0" * (-len(payload) % ALIGNMENT))
+
+
+def write_snapshot(f, txid, namespace, extra):
+    """Write a (frozen) namespace to the open binary file f. extra is JSON-able data stored alongside it."""
+    policies = []
+    files = {tag: array(typecode) for tag, typecode in FILE_COLUMNS.items()}
+    for tag in (b"FNOF", b"FBST", b"FCAO"):
+        files[tag].append(0)
+    filenames = []
+    names = bytearray()
+    created_at = bytearray()
+    for filename, record in namespace.files.items():
+        filenames.append(filename)
+        names += filename.encode()
+        flags = FLAG_DEDUP if record.dedup else 0
+        if record.blocks is None:
+            flags |= FLAG_NO_BLOCKS
+        else:
+            files[b"FBLK"].extend(record.blocks)
+        if record.created_at is None:
+            flags |= FLAG_NO_CREATED_AT
+        else:
+            created_at += record.created_at.encode()
+        policy = -1
+        if record.storage_policy is not None:
+            if record.storage_policy not in policies:
+                policies.append(record.storage_policy)
+            policy = policies.index(record.storage_policy)
+        files[b"FSIZ"].append(record.filesize)
+        files[b"FBSZ"].append(record.block_size)
+        files[b"FREP"].append(-1 if record.replication_factor is None else record.replication_factor)
+        files[b"FPOL"].append(policy)
+        files[b"FFLG"].append(flags)
+        files[b"FCOF"].append(-1 if record.container_offset is None else record.container_offset)
+        files[b"FNOF"].append(len(names))
+        files[b"FBST"].append(len(files[b"FBLK"]))
+        files[b"FCAO"].append(len(created_at))
+
+    meta = {
+        "byteorder": sys.byteorder,
+        "max_replicas": namespace.max_replicas,
+        "nodes": namespace.nodes.names,
+        "policies": policies,
+        "blocks": len(namespace.block_ids),
+        "files": len(filenames),
+        "dedup_logical_bytes": namespace.dedup_logical_bytes,
+        "dedup_stored_bytes": namespace.dedup_stored_bytes,
+        "dedup_chunks": namespace.dedup_chunks,
+        **extra,
+    }
+    f.write(HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, txid))
+    write_section(f, b"META", json.dumps(meta).encode())
+    # block ids are [A-Za-z0-9_], so a NUL separated list is safe
+    write_section(f, b"BIDS", "\0".join(namespace.block_ids).encode())
+    write_section(f, b"BTAB", build_name_table(namespace.block_ids).tobytes())
+    for tag, (attribute, _) in BLOCK_COLUMNS.items():
+        write_section(f, tag, getattr(namespace, attribute).tobytes())
+    write_section(f, b"FNAM", bytes(names))
+    write_section(f, b"FTAB", build_name_table(filenames).tobytes())
+    write_section(f, b"FCAT", bytes(created_at))
+    for tag, column in files.items():
+        write_section(f, tag, column.tobytes())
+
+
+def read_sections(view):
+    """tag -> memoryview of its payload, view is the whole snapshot."""
+    magic, version, txid = HEADER.unpack_from(view, 0)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise ValueError(f"Not a version {SNAPSHOT_VERSION} namespace snapshot")
+    sections = {}
+    offset = HEADER.size
+    while offset < len(view):
+        tag, length = SECTION.unpack_from(view, offset)
+        offset += SECTION.size
+        sections[tag] = view[offset:offset + length]
+        offset += length + (-length % ALIGNMENT)
+    return txid, sections
+
+
+def split_block_ids(payload):
+    block_ids = []
+    start = 0
+    while start < len(payload):
+        piece = bytes(payload[start:start + SPLIT_PIECE_BYTES])
+        if start + len(piece) < len(payload):
+            # end the piece on a separator, the rest of the id comes with the next one
+            piece = piece[:piece.rfind(b"\0")]
+            start += len(piece) + 1
+        else:
+            start += len(piece)
+        block_ids.extend(piece.decode().split("\0"))
+    return block_ids
+
+
+def read_snapshot(path):
+    """
+    Load a snapshot written by write_snapshot, returns (txid, namespace, extra).
+    The file stays memory-mapped for as long as the namespace's BlockIndex and FileTable use it.
+    The node -> blocks reverse index is left for Namespace.index_nodes.
+    """
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    txid, sections = read_sections(view)
+    meta = json.loads(bytes(sections.pop(b"META")))
+    if meta.pop("byteorder") != sys.byteorder:
+        raise ValueError("Snapshot was written on a machine with a different byte order")
+
+    namespace = Namespace(meta.pop("max_replicas"))
+    for name in meta.pop("nodes"):
+        namespace.nodes.intern(name)
+    block_ids = namespace.block_ids = split_block_ids(sections[b"BIDS"])
+    namespace.block_index = BlockIndex(NameTable(sections[b"BTAB"].cast("i"), lambda row, name, encoded: block_ids[row] == name))
+    # block columns change as blocks are added, they are copied out of the mapping
+    for tag, (attribute, typecode) in BLOCK_COLUMNS.items():
+        column = array(typecode)
+        column.frombytes(sections[tag])
+        setattr(namespace, attribute, column)
+    namespace.unindexed_blocks = len(block_ids)
+    columns = {tag: sections[tag].cast(typecode) for tag, typecode in FILE_COLUMNS.items()}
+    columns[b"FTAB"] = sections[b"FTAB"].cast("i")
+    namespace.files = FileTable(columns, sections[b"FNAM"], sections[b"FCAT"], meta.pop("policies"))
+    namespace.dedup_logical_bytes = meta.pop("dedup_logical_bytes")
+    namespace.dedup_stored_bytes = meta.pop("dedup_stored_bytes")
+    namespace.dedup_chunks = meta.pop("dedup_chunks", None)
+    if namespace.dedup_chunks is None:
+        # snapshots from before the counter, count them once here
+        namespace.dedup_chunks = len(namespace.block_refs) - namespace.block_refs.count(0)
+    if namespace.max_replicas < MAX_REPLICAS:
+        # MAX_REPLICAS went up since the snapshot, give every block the extra slots
+        old, slots = namespace.max_replicas, namespace.replicas
+        namespace.max_replicas = MAX_REPLICAS
+        namespace.replicas = array("i", [NO_NODE]) * (MAX_REPLICAS * len(block_ids))
+        for slot in range(old):
+            namespace.replicas[slot::MAX_REPLICAS] = slots[slot::old]
+    return txid, namespace, meta
+
+
+def store_snapshot(path, txid, namespace, extra):
+    """Write the snapshot to a temp file, fsync it and move it into place so a crash never leaves half of one."""
+    temp_path = path + ".tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            write_snapshot(f, txid, namespace, extra)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+if __name__ == "__main__":
+    # python snapshot.py metadata.snap: print a snapshot as the JSON the NameNode used to checkpoint
+    txid, namespace, extra = read_snapshot(sys.argv[1])
+    file_metadata, block_assignments = namespace.to_metadata()
+    json.dump({"txid": txid, **extra, "file_metadata": file_metadata, "block_assignments": block_assignments},
+              sys.stdout, indent=2)
+    print()
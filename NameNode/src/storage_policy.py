@@ -0,0 +1,57 @@
+import os
+
+# File bytes striped onto one internal block before moving on to the next, should divide the block size
+EC_CELL_SIZE = int(os.getenv("EC_CELL_SIZE", str(1024 * 1024)))
+REPLICATED = "replicated"
+
+
+class ErasureCodingPolicy:
+    """
+    Reed-Solomon striping, RS(data_units, parity_units).
+    A file is cut into block groups of data_units * block_size bytes. Inside a group the bytes are
+    dealt out cell by cell to data_units internal blocks, and the client adds parity_units parity
+    blocks computed stripe by stripe. Every internal block sits on its own DataNode with a single
+    copy, any data_units of them are enough to read the group back.
+    """
+    def __init__(self, name, data_units, parity_units, cell_size=EC_CELL_SIZE):
+        self.name = name
+        self.data_units = data_units
+        self.parity_units = parity_units
+        self.cell_size = cell_size
+
+    @property
+    def width(self):
+        return self.data_units + self.parity_units
+
+    def group_size(self, block_size):
+        """File bytes covered by one block group."""
+        return self.data_units * block_size
+
+    def internal_block_sizes(self, group_size):
+        """Sizes of the data then parity internal blocks of a group holding group_size file bytes."""
+        stripe_size = self.data_units * self.cell_size
+        full_stripes, last_stripe = divmod(group_size, stripe_size)
+        data_sizes = [full_stripes * self.cell_size + max(0, min(self.cell_size, last_stripe - i * self.cell_size))
+                      for i in range(self.data_units)]
+        # parity cells are as long as the longest data cell of their stripe, the first one
+        return data_sizes + [data_sizes[0]] * self.parity_units
+
+    def describe(self):
+        return {"storage_policy": self.name, "data_units": self.data_units,
+                "parity_units": self.parity_units, "cell_size": self.cell_size}
+
+
+EC_POLICIES = {
+    "RS-6-3": ErasureCodingPolicy("RS-6-3", 6, 3),
+    "RS-3-2": ErasureCodingPolicy("RS-3-2", 3, 2),
+}
+
+
+def get_storage_policy(name):
+    """None for plain replication, otherwise the erasure coding policy called name."""
+    if name is None or name == REPLICATED:
+        return None
+    try:
+        return EC_POLICIES[name]
+    except KeyError:
+        raise ValueError(f"Unknown storage policy {name}, pick {REPLICATED} or one of {sorted(EC_POLICIES)}")
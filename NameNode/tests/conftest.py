@@ -0,0 +1,25 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# metadata_manager and namenode_logger pick their dirs from the environment on import, keep them out of /usr/local/app
+TEST_DIR = tempfile.mkdtemp(prefix="namenode_tests_")
+os.environ["METADATA_DIR"] = os.path.join(TEST_DIR, "metadata")
+os.environ["NAMENODE_LOG_DIR"] = os.path.join(TEST_DIR, "logs")
+os.environ["NAMENODE_BLOCK_LOG_DIR"] = os.path.join(TEST_DIR, "block_logs")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+DATANODES = ("dn1", "dn2", "dn3", "dn4", "dn5")
+
+
+@pytest.fixture(scope="session")
+def metadata_manager():
+    """metadata_manager loaded from an empty metadata dir, with five live DataNodes."""
+    import metadata_manager
+    metadata_manager.load_metadata()
+    for node_id in DATANODES:
+        metadata_manager.update_datanode_heartbeat(node_id)
+    return metadata_manager
@@ -0,0 +1,89 @@
+import hashlib
+import os
+
+import pytest
+
+from edit_log import EditLog, list_segments, read_edits, segment_name
+from namespace import Namespace
+
+
+def write_edits(directory, count, first_txid=0):
+    log = EditLog(str(directory))
+    log.open(first_txid)
+    txids = [log.append({"op": "test", "n": n}) for n in range(count)]
+    log.sync(txids[-1])
+    log.close()
+    return txids
+
+
+def test_edits_read_back_in_order(tmp_path):
+    assert write_edits(tmp_path, 3) == [1, 2, 3]
+    assert [(edit["txid"], edit["n"]) for edit in read_edits(str(tmp_path))] == [(1, 0), (2, 1), (3, 2)]
+    assert [edit["txid"] for edit in read_edits(str(tmp_path), after_txid=2)] == [3]
+
+
+def test_roll_and_purge(tmp_path):
+    log = EditLog(str(tmp_path))
+    log.open(0)
+    log.append({"op": "test"})
+    log.append({"op": "test"})
+    assert log.roll() == 2
+    log.sync(log.append({"op": "test"}))
+    log.close()
+    assert [first_txid for first_txid, _ in list_segments(str(tmp_path))] == [1, 3]
+    log.purge_before(3)
+    assert [first_txid for first_txid, _ in list_segments(str(tmp_path))] == [3]
+    assert [edit["txid"] for edit in read_edits(str(tmp_path), after_txid=2)] == [3]
+
+
+def test_torn_last_record_is_skipped(tmp_path):
+    write_edits(tmp_path, 2)
+    with open(tmp_path / segment_name(1), "a", encoding="utf-8") as f:
+        f.write('{"op":"test","n":9,"tx')
+    # the restart after the crash starts a new segment, its edits still count
+    write_edits(tmp_path, 1, first_txid=2)
+    assert [edit["txid"] for edit in read_edits(str(tmp_path))] == [1, 2, 3]
+
+
+def test_corrupt_record_in_the_middle_raises(tmp_path):
+    write_edits(tmp_path, 3)
+    path = tmp_path / segment_name(1)
+    lines = path.read_text(encoding="utf-8").splitlines(keepends=True)
+    lines[1] = lines[1][:10] + "\n"
+    path.write_text("".join(lines), encoding="utf-8")
+    with pytest.raises(ValueError):
+        list(read_edits(str(tmp_path)))
+
+
+def test_open_truncates_a_leftover_segment(tmp_path):
+    (tmp_path / segment_name(1)).write_text('{"op":"test","txid":1', encoding="utf-8")
+    write_edits(tmp_path, 1)
+    assert [edit["txid"] for edit in read_edits(str(tmp_path))] == [1]
+
+
+def test_replay_rebuilds_the_namespace(metadata_manager, monkeypatch):
+    mm = metadata_manager
+    mm.allocate_blocks("replay/plain.bin", 100_000_000, 2)
+    mm.allocate_blocks("replay/ec.bin", 20_000_000, 2, "RS-3-2")
+    chunks = [{"fingerprint": hashlib.sha256(bytes([n])).hexdigest(), "size": 1000 + n} for n in range(4)]
+    mm.allocate_blocks("replay/dedup1.bin", sum(chunk["size"] for chunk in chunks), 2, None, chunks)
+    mm.allocate_blocks("replay/dedup2.bin", sum(chunk["size"] for chunk in chunks[:2]), 2, None, chunks[:2])
+    mm.allocate_files([{"filename": f"replay/batch{n}.txt", "filesize_bytes": 10 + n} for n in range(3)])
+    mm.allocate_containers([{"filename": f"replay/small{n}", "filesize_bytes": 4000} for n in range(5)])
+    # an overwrite and replica changes after the first allocation
+    mm.allocate_blocks("replay/plain.bin", 5, 2)
+    block_id = mm.get_file_blocks("replay/batch0.txt")["blocks"][0]["block_id"]
+    mm.apply_incremental_report("dn5", [block_id], [])
+    mm.edit_log.sync(mm.edit_log.txid)
+    expected = mm.namespace.to_metadata(), mm.get_dedup_status()
+
+    monkeypatch.setattr(mm, "namespace", Namespace())
+    for edit in read_edits(mm.METADATA_DIR):
+        mm.apply_edit(edit)
+    assert (mm.namespace.to_metadata(), mm.get_dedup_status()) == expected
+    assert "dn5" in mm.get_file_blocks("replay/batch0.txt")["blocks"][0]["locations"]
+
+
+def test_unknown_edit_op_raises(metadata_manager):
+    with pytest.raises(ValueError):
+        metadata_manager.apply_edit({"op": "no_such_op", "txid": 1})
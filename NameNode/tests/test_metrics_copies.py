@@ -0,0 +1,14 @@
+import os
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+COPIES = ("NameNode/src/metrics.py", "DataNode/src/metrics.py", "Client/metrics.py")
+
+
+def test_metrics_copies_are_identical():
+    # each image only gets its own dir, so metrics.py is copied three times. Line endings differ per dir, nothing else may
+    contents = []
+    for path in COPIES:
+        with open(os.path.join(ROOT, path), "rb") as f:
+            contents.append(f.read().replace(b"\r\n", b"\n"))
+    for path, content in zip(COPIES[1:], contents[1:]):
+        assert content == contents[0], f"{path} differs from {COPIES[0]}, change all three copies"
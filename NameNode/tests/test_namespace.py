@@ -0,0 +1,81 @@
+from namespace import Namespace
+
+
+def add_file(namespace, filename, nodes_per_block, block_size=100, dedup=False):
+    block_ids = [f"{filename}_{n}" for n in range(len(nodes_per_block))]
+    for block_id, nodes in zip(block_ids, nodes_per_block):
+        namespace.add_block(block_id, block_size, nodes)
+    namespace.add_file(filename, block_size * len(block_ids), block_size, "2025-08-10T12:00:00", 2, block_ids, dedup=dedup)
+    return block_ids
+
+
+def node_block_ids(namespace, node):
+    return sorted(namespace.block_id(block_index) for block_index in namespace.blocks_on_node(node))
+
+
+def test_blocks_and_replicas():
+    namespace = Namespace(max_replicas=3)
+    block_ids = add_file(namespace, "a", [["dn1", "dn2"], ["dn2", "dn3"]])
+    assert namespace.num_blocks() == 2 and namespace.num_files() == 1
+    first = namespace.get_block_index(block_ids[0])
+    assert namespace.block_replicas(first) == ["dn1", "dn2"]
+    assert namespace.expected_replicas(first) == 2
+    assert namespace.add_replica(first, "dn3")
+    assert not namespace.add_replica(first, "dn3")
+    assert namespace.remove_replica(first, "dn1")
+    assert not namespace.remove_replica(first, "dn1")
+    assert namespace.block_replicas(first) == ["dn2", "dn3"]
+    assert node_block_ids(namespace, "dn1") == []
+    assert node_block_ids(namespace, "dn3") == sorted(block_ids)
+    assert namespace.get_block_index("unknown") is None
+
+
+def test_reverse_index_compacts_stale_entries():
+    namespace = Namespace(max_replicas=3)
+    block_ids = add_file(namespace, "a", [["dn1", "dn2"]] * 100)
+    node_id = namespace.nodes.get("dn1")
+    for block_id in block_ids[:80]:
+        namespace.remove_replica(namespace.get_block_index(block_id), "dn1")
+    # entries are dropped lazily, the array is rebuilt once half of it is stale
+    assert len(namespace.node_blocks[node_id]) - namespace.node_stale[node_id] == 20
+    assert len(namespace.node_blocks[node_id]) < 50
+    assert node_block_ids(namespace, "dn1") == sorted(block_ids[80:])
+    # moving a block off a node and back doesn't list it twice
+    block_index = namespace.get_block_index(block_ids[90])
+    namespace.set_replicas(block_index, ["dn2", "dn3"])
+    namespace.set_replicas(block_index, ["dn1", "dn2"])
+    assert node_block_ids(namespace, "dn1") == sorted(block_ids[80:])
+
+
+def test_overwriting_a_dedup_file_drops_its_references():
+    namespace = Namespace()
+    shared = add_file(namespace, "one", [["dn1"], ["dn1"]], dedup=True)
+    namespace.add_file("two", 100, 100, "2025-08-10T12:00:00", 2, shared[:1], dedup=True)
+    assert [namespace.block_refcount(namespace.get_block_index(block_id)) for block_id in shared] == [2, 1]
+    assert (namespace.dedup_logical_bytes, namespace.dedup_stored_bytes, namespace.dedup_chunks) == (300, 200, 2)
+    namespace.add_file("one", 100, 100, "2025-08-10T12:00:00", 2, shared[:1], dedup=True)
+    assert [namespace.block_refcount(namespace.get_block_index(block_id)) for block_id in shared] == [2, 0]
+    assert (namespace.dedup_logical_bytes, namespace.dedup_stored_bytes, namespace.dedup_chunks) == (200, 100, 1)
+
+
+def test_metadata_round_trip():
+    namespace = Namespace()
+    add_file(namespace, "a", [["dn1", "dn2"], ["dn2", "dn3"]])
+    add_file(namespace, "b", [["dn3"]], block_size=7)
+    file_metadata, block_assignments = namespace.to_metadata()
+    assert file_metadata["a"]["blocks"] == ["a_0", "a_1"]
+    assert block_assignments["a_1"] == ["dn2", "dn3"]
+    loaded = Namespace.from_metadata(file_metadata, block_assignments, 100)
+    assert loaded.to_metadata() == (file_metadata, block_assignments)
+    assert loaded.block_size(loaded.get_block_index("b_0")) == 7
+
+
+def test_freeze_is_a_point_in_time_copy():
+    namespace = Namespace()
+    add_file(namespace, "a", [["dn1", "dn2"]])
+    frozen = namespace.freeze()
+    add_file(namespace, "b", [["dn1"]])
+    namespace.remove_replica(namespace.get_block_index("a_0"), "dn1")
+    assert sorted(frozen.files) == ["a"]
+    assert frozen.block_ids == ["a_0"]
+    assert frozen.block_replicas(0) == ["dn1", "dn2"]
@@ -0,0 +1,56 @@
+import hashlib
+
+import pytest
+
+from edit_log import read_edits
+
+BLOCK_SIZE = 33554432
+
+
+def allocated_blocks(mm, filename):
+    return [(block["block_id"], block["assigned_datanodes"]) for block in mm.allocate_blocks(filename, 3 * BLOCK_SIZE, 2)[0]["blocks"]]
+
+
+def test_reopen_returns_the_same_allocation(metadata_manager):
+    mm = metadata_manager
+    blocks = allocated_blocks(mm, "reopen/same.bin")
+    assignment, txid = mm.reopen_file("reopen/same.bin", 3 * BLOCK_SIZE)
+    assert txid is None
+    assert assignment["reopened"]
+    assert [(block["block_id"], block["assigned_datanodes"]) for block in assignment["blocks"]] == blocks
+
+
+def test_reopen_moves_unsent_blocks_off_dead_nodes(metadata_manager, monkeypatch):
+    mm = metadata_manager
+    blocks = allocated_blocks(mm, "reopen/dead.bin")
+    # 3 blocks x 2 replicas on 5 DataNodes, some node holds two of them: one counts as sent, the other doesn't
+    nodes_used = [node for _, nodes in blocks for node in nodes]
+    dead = max(nodes_used, key=nodes_used.count)
+    monkeypatch.setattr(mm.liveness, "is_live", lambda node_id: node_id != dead)
+    sent = [block_id for block_id, nodes in blocks if dead in nodes][:1]
+    assignment, txid = mm.reopen_file("reopen/dead.bin", 3 * BLOCK_SIZE, sent)
+    assert txid is not None
+    for (block_id, nodes), block in zip(blocks, assignment["blocks"]):
+        assert block["block_id"] == block_id
+        if block_id in sent or dead not in nodes:
+            assert block["assigned_datanodes"] == nodes
+        else:
+            assert dead not in block["assigned_datanodes"]
+            assert len(block["assigned_datanodes"]) == len(nodes)
+    # the reassignment is in the namespace and in the edit log
+    assert [block["locations"] for block in mm.get_file_blocks("reopen/dead.bin")["blocks"]] == \
+           [sorted(block["assigned_datanodes"], key=lambda node: node == dead) for block in assignment["blocks"]]
+    mm.edit_log.sync(txid)
+    assert next(edit for edit in read_edits(mm.METADATA_DIR, after_txid=txid - 1))["op"] == "reassign_blocks"
+
+
+def test_reopen_refuses_what_it_cannot_resume(metadata_manager):
+    mm = metadata_manager
+    allocated_blocks(mm, "reopen/resized.bin")
+    assert mm.reopen_file("reopen/unknown.bin", 10) == (None, None)
+    with pytest.raises(ValueError):
+        mm.reopen_file("reopen/resized.bin", 3 * BLOCK_SIZE + 1)
+    chunks = [{"fingerprint": hashlib.sha256(b"reopen").hexdigest(), "size": 6}]
+    mm.allocate_blocks("reopen/dedup.bin", 6, 2, None, chunks)
+    with pytest.raises(ValueError):
+        mm.reopen_file("reopen/dedup.bin", 6)
@@ -0,0 +1,116 @@
+import hashlib
+
+import pytest
+
+import snapshot
+from edit_log import EditLog
+from namespace import Namespace
+from snapshot import read_snapshot, split_block_ids, store_snapshot
+
+
+def build_namespace():
+    namespace = Namespace(max_replicas=3)
+    for block_id, size, nodes in [("plain_0", 100, ["dn1", "dn2"]), ("plain_1", 40, ["dn2", "dn3"]),
+                                  ("ec_0", 50, ["dn1"]), ("ec_1", 50, ["dn2"]), ("ec_p", 50, ["dn3"]),
+                                  ("chunk_a", 30, ["dn1", "dn3"]), ("chunk_b", 20, ["dn2"]),
+                                  ("container", 4000, ["dn3", "dn1"]), ("orphan", 7, [])]:
+        namespace.add_block(block_id, size, nodes)
+    created_at = "2025-08-10T12:00:00.123456"
+    namespace.add_file("plain.bin", 140, 100, created_at, 2, ["plain_0", "plain_1"])
+    namespace.add_file("ec.bin", 100, 100, created_at, 2, ["ec_0", "ec_1", "ec_p"], storage_policy="RS-2-1")
+    namespace.add_file("dedup1.bin", 50, 100, created_at, 2, ["chunk_a", "chunk_b"], dedup=True)
+    namespace.add_file("dedup2.bin", 30, 100, created_at, 2, ["chunk_a"], dedup=True)
+    namespace.add_file("packed/ünïcode small.txt", 1000, 100, created_at, 2, ["container"], container_offset=3000)
+    namespace.add_file("legacy.txt", 10, 100, None, None, None)
+    return namespace
+
+
+def test_round_trip(tmp_path):
+    namespace = build_namespace()
+    path = str(tmp_path / "metadata.snap")
+    store_snapshot(path, 42, namespace, {"active_datanodes": {"dn1": "2025-08-10T12:00:00"}})
+    txid, loaded, extra = read_snapshot(path)
+    assert txid == 42
+    assert extra["active_datanodes"] == {"dn1": "2025-08-10T12:00:00"}
+    assert loaded.to_metadata() == namespace.to_metadata()
+    assert (loaded.dedup_logical_bytes, loaded.dedup_stored_bytes, loaded.dedup_chunks) == (80, 50, 2)
+    assert loaded.get_file("missing") is None
+    assert loaded.get_block_index("missing") is None
+    assert loaded.get_file("packed/ünïcode small.txt").container_offset == 3000
+    for block_id in namespace.block_ids:
+        block_index = loaded.get_block_index(block_id)
+        assert loaded.block_replicas(block_index) == namespace.block_replicas(namespace.get_block_index(block_id))
+        assert loaded.expected_replicas(block_index) == namespace.expected_replicas(namespace.get_block_index(block_id))
+
+
+def test_loaded_namespace_takes_changes_and_indexes_nodes_in_batches(tmp_path):
+    namespace = build_namespace()
+    path = str(tmp_path / "metadata.snap")
+    store_snapshot(path, 1, namespace, {})
+    _, loaded, _ = read_snapshot(path)
+    assert loaded.unindexed_blocks == loaded.num_blocks()
+    while not loaded.index_nodes(2):
+        assert loaded.unindexed_blocks > 0
+    for node in ("dn1", "dn2", "dn3"):
+        assert sorted(loaded.block_id(b) for b in loaded.blocks_on_node(node)) == \
+               sorted(namespace.block_id(b) for b in namespace.blocks_on_node(node))
+
+    for target in (namespace, loaded):
+        target.add_block("new_0", 5, ["dn2"])
+        target.add_file("plain.bin", 5, 100, "2025-08-11T00:00:00", 2, ["new_0"])
+        target.add_file("dedup1.bin", 20, 100, "2025-08-11T00:00:00", 2, ["chunk_b"], dedup=True)
+        target.remove_replica(target.get_block_index("chunk_a"), "dn1")
+    assert loaded.to_metadata() == namespace.to_metadata()
+    assert loaded.dedup_chunks == namespace.dedup_chunks == 2
+    # and it snapshots again
+    store_snapshot(path, 2, loaded, {})
+    assert read_snapshot(path)[1].to_metadata() == namespace.to_metadata()
+
+
+def test_split_block_ids_across_pieces(monkeypatch):
+    block_ids = [f"block_{n}_{'x' * (n % 5)}" for n in range(50)]
+    monkeypatch.setattr(snapshot, "SPLIT_PIECE_BYTES", 16)
+    assert split_block_ids(memoryview("\0".join(block_ids).encode())) == block_ids
+
+
+def test_not_a_snapshot_raises(tmp_path):
+    path = tmp_path / "metadata.snap"
+    path.write_bytes(b"{}" * 100)
+    with pytest.raises(ValueError):
+        read_snapshot(str(path))
+
+
+def test_load_metadata_from_snapshot_and_edit_log(metadata_manager, monkeypatch, tmp_path):
+    mm = metadata_manager
+    monkeypatch.setattr(mm, "METADATA_DIR", str(tmp_path))
+    monkeypatch.setattr(mm, "SNAPSHOT_FILE", str(tmp_path / "metadata.snap"))
+    monkeypatch.setattr(mm, "LEGACY_METADATA_FILE", str(tmp_path / "metadata.json"))
+    monkeypatch.setattr(mm, "namespace", Namespace())
+    monkeypatch.setattr(mm, "edit_log", EditLog(str(tmp_path)))
+    monkeypatch.setattr(mm, "checkpoint_txid", 0)
+    mm.load_metadata()
+    chunks = [{"fingerprint": hashlib.sha256(bytes([n])).hexdigest(), "size": 100 + n} for n in range(3)]
+    mm.allocate_blocks("snap/before.bin", 70_000_000, 2)
+    mm.allocate_blocks("snap/dedup.bin", 303, 2, None, chunks)
+    mm.checkpoint()
+    # after the checkpoint, only in the edit log
+    mm.allocate_blocks("snap/before.bin", 10, 2)
+    mm.allocate_blocks("snap/after.bin", 40_000_000, 2, "RS-3-2")
+    mm.edit_log.sync(mm.edit_log.txid)
+    expected = mm.namespace.to_metadata(), mm.get_dedup_status(), mm.edit_log.txid
+
+    monkeypatch.setattr(mm, "namespace", Namespace())
+    monkeypatch.setattr(mm, "edit_log", EditLog(str(tmp_path)))
+    mm.load_metadata()
+    assert (mm.namespace.to_metadata(), mm.get_dedup_status(), mm.edit_log.txid) == expected
+
+
+def test_load_metadata_fails_on_an_unreadable_snapshot(metadata_manager, monkeypatch, tmp_path):
+    mm = metadata_manager
+    path = tmp_path / "metadata.snap"
+    path.write_bytes(b"garbage" * 10)
+    monkeypatch.setattr(mm, "SNAPSHOT_FILE", str(path))
+    namespace = mm.namespace
+    with pytest.raises(ValueError):
+        mm.load_metadata()
+    assert mm.namespace is namespace
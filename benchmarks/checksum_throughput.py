@@ -0,0 +1,81 @@
+"""
+Checksum overhead on the block write path.
+
+Streams the same block through the DataNode's write loop three ways and reports MB/s:
+raw (plain write, what we had before checksums), computed (ChecksumComputer over raw bytes,
+what a client without checksums gets) and framed (client side framing + DataNode verification
+of [chunk][crc32] packets, the default upload path). Also times a scrub of the written block.
+Everything runs in-process against a temp dir, no DataNode needed.
+
+    python benchmarks/checksum_throughput.py --block-mb 32 --rounds 5
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+import tempfile
+import time
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "DataNode", "src"))
+
+from checksums import ChecksumComputer, FramedChecksumVerifier, meta_path_for, verify_block_file, write_meta
+
+# what uvicorn hands to request.stream() is roughly this size per chunk
+RECEIVE_CHUNK_SIZE = 64 * 1024
+
+
+def frame(data, chunk_size):
+    """Client side framing, same as Client/client.py BlockStream."""
+    return b"".join(data[i:i + chunk_size] + struct.pack(">I", zlib.crc32(data[i:i + chunk_size]))
+                    for i in range(0, len(data), chunk_size))
+
+
+def write_block(path, body, checksummer):
+    start = time.perf_counter()
+    with open(path, "wb") as f:
+        for i in range(0, len(body), RECEIVE_CHUNK_SIZE):
+            chunk = body[i:i + RECEIVE_CHUNK_SIZE]
+            f.write(checksummer.feed(chunk) if checksummer else chunk)
+        if checksummer:
+            f.write(checksummer.finish())
+            write_meta(meta_path_for(path), checksummer.chunk_size, checksummer.checksums)
+        f.flush()
+        os.fsync(f.fileno())
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--block-mb", type=int, default=32)
+    parser.add_argument("--chunk-kb", type=int, default=64, help="checksum chunk size")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    chunk_size = args.chunk_kb * 1024
+    data = os.urandom(args.block_mb * 1024 * 1024)
+    mb = len(data) / (1024 * 1024)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        path = os.path.join(data_dir, "block_bench.dat")
+        results = {"raw": [], "computed": [], "framed": [], "client_framing": [], "scrub": []}
+        for _ in range(args.rounds):
+            results["raw"].append(write_block(path, data, None))
+            results["computed"].append(write_block(path, data, ChecksumComputer(chunk_size)))
+            start = time.perf_counter()
+            body = frame(data, chunk_size)
+            results["client_framing"].append(time.perf_counter() - start)
+            results["framed"].append(write_block(path, body, FramedChecksumVerifier(chunk_size)))
+            start = time.perf_counter()
+            assert verify_block_file(path, meta_path_for(path)) is None
+            results["scrub"].append(time.perf_counter() - start)
+
+    report = {"block_mb": args.block_mb, "chunk_kb": args.chunk_kb, "rounds": args.rounds}
+    for name, timings in results.items():
+        report[f"{name}_mb_per_s"] = round(mb / min(timings))
+    report["framed_overhead_pct"] = round((min(results["framed"]) / min(results["raw"]) - 1) * 100, 1)
+    print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
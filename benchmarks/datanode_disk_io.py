@@ -0,0 +1,167 @@
+"""
+DataNode block writes: blocking disk calls on the event loop vs the volumes.py disk threads.
+
+--concurrency uploads at a time stream --blocks blocks of --block-kb KB each into one asyncio loop,
+in 64KB pieces checksummed like store_block does, with a yield between pieces standing in for the
+network. "blocking" is the old store_block (open/write/rename right on the loop, no fsync), the
+others go through BlockWriter with each FSYNC_MODE and --dirs data dirs. Alongside the uploads a
+probe task sleeps 1ms at a time and records how late it wakes up, that is how long a heartbeat
+answer or a /health check would have waited for the loop.
+--disk-ms-per-mb makes every write that much slower (sleeping where the write ran) to stand in
+for a busy or slow disk, page cache writes on an idle machine hardly ever block.
+One JSON line per setup: MB/s, blocks/s, block latency p50/p99 and loop stall p99/max.
+
+    python benchmarks/datanode_disk_io.py --blocks 64 --block-kb 16384 --concurrency 16
+    python benchmarks/datanode_disk_io.py --blocks 2000 --block-kb 64 --modes block group
+    python benchmarks/datanode_disk_io.py --disk-ms-per-mb 5
+    python benchmarks/datanode_disk_io.py --dir /mnt/disk1 --dir /mnt/disk2 --modes group
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "DataNode", "src"))
+
+from checksums import CHECKSUM_CHUNK_SIZE, ChecksumComputer, meta_path_for, write_meta
+import volumes
+from volumes import FSYNC_MODES, BlockWriter, VolumeSet
+
+PIECE_BYTES = 64 * 1024
+
+
+class SlowFile(io.FileIO):
+    """A file whose writes take ms_per_mb longer, like a disk that is busy with something else."""
+    ms_per_mb = 0
+
+    def write(self, data):
+        time.sleep(len(data) / 1024 / 1024 * self.ms_per_mb / 1000)
+        return super().write(data)
+
+
+def open_file(path, mode):
+    return SlowFile(path, mode) if SlowFile.ms_per_mb else open(path, mode)
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def blocking_write(directory, block_id, pieces):
+    """The write path before volumes.py, every disk call on the event loop."""
+    block_path = os.path.join(directory, f"{block_id}.dat")
+    temp_path = block_path + ".tmp"
+    checksummer = ChecksumComputer(CHECKSUM_CHUNK_SIZE)
+    with open_file(temp_path, "wb") as f:
+        for piece in pieces:
+            await asyncio.sleep(0)
+            f.write(checksummer.feed(piece))
+        checksummer.finish()
+    write_meta(meta_path_for(block_path), checksummer.chunk_size, checksummer.checksums)
+    os.replace(temp_path, block_path)
+
+
+async def volume_write(volume_set, block_id, pieces):
+    volume = await asyncio.to_thread(volume_set.choose, block_id, sum(map(len, pieces)))
+    writer = BlockWriter(volume, block_id)
+    await writer.open()
+    checksummer = ChecksumComputer(CHECKSUM_CHUNK_SIZE)
+    for piece in pieces:
+        await asyncio.sleep(0)
+        await writer.write(checksummer.feed(piece))
+    checksummer.finish()
+    await writer.commit(checksummer.chunk_size, checksummer.checksums)
+
+
+async def loop_probe(stalls, stop):
+    while not stop.is_set():
+        expected = time.perf_counter() + 0.001
+        await asyncio.sleep(0.001)
+        stalls.append(max(0.0, time.perf_counter() - expected))
+
+
+async def run_writes(write, args, pieces):
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, stalls = [], []
+    stop = asyncio.Event()
+
+    async def one(index):
+        async with semaphore:
+            start = time.perf_counter()
+            await write(f"block_bench_{index}", pieces)
+            latencies.append(time.perf_counter() - start)
+
+    probe = asyncio.create_task(loop_probe(stalls, stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(args.blocks)))
+    seconds = time.perf_counter() - start
+    stop.set()
+    await probe
+    return seconds, sorted(latencies), sorted(stalls)
+
+
+def run_setup(name, dirs, fsync_mode, args, pieces):
+    for directory in dirs:
+        os.makedirs(directory)
+    if fsync_mode is None:
+        write = lambda block_id, block: blocking_write(dirs[0], block_id, block)
+    else:
+        volume_set = VolumeSet(dirs, threads=args.threads, fsync_mode=fsync_mode)
+        write = lambda block_id, block: volume_write(volume_set, block_id, block)
+    seconds, latencies, stalls = asyncio.run(run_writes(write, args, pieces))
+    total_bytes = args.blocks * sum(map(len, pieces))
+    for directory in dirs:
+        shutil.rmtree(directory)
+    return {
+        "setup": name,
+        "fsync_mode": fsync_mode or "none",
+        "dirs": len(dirs),
+        "seconds": round(seconds, 3),
+        "mb_per_s": round(total_bytes / seconds / 1024 / 1024, 1),
+        "blocks_per_s": round(args.blocks / seconds, 1),
+        "block_latency_p50_ms": round(percentile(latencies, 0.5) * 1000, 1),
+        "block_latency_p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "loop_stall_p99_ms": round(percentile(stalls, 0.99) * 1000, 2),
+        "loop_stall_max_ms": round(stalls[-1] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--blocks", type=int, default=64)
+    parser.add_argument("--block-kb", type=int, default=16 * 1024)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--threads", type=int, default=4, help="disk threads per data dir")
+    parser.add_argument("--modes", nargs="+", default=list(FSYNC_MODES), choices=FSYNC_MODES)
+    parser.add_argument("--disk-ms-per-mb", type=float, default=0, help="extra time every MB written takes")
+    parser.add_argument("--dir", action="append", help="data dir to write under (repeat for several disks), default a temp dir")
+    args = parser.parse_args()
+
+    piece = os.urandom(PIECE_BYTES)
+    pieces = [piece] * (args.block_kb * 1024 // PIECE_BYTES) + [piece[:args.block_kb * 1024 % PIECE_BYTES]]
+    pieces = [piece for piece in pieces if piece]
+    SlowFile.ms_per_mb = args.disk_ms_per_mb
+    # BlockWriter opens its temp files through the volumes module
+    volumes.open = open_file
+    with tempfile.TemporaryDirectory() as workdir:
+        bases = args.dir or [workdir]
+        # every setup writes into fresh dirs, several per disk when there are fewer --dir than data dirs
+        def data_dirs(name, count):
+            return [os.path.join(bases[i % len(bases)], f"{name}_{i}") for i in range(count)]
+
+        print(json.dumps(run_setup("blocking", data_dirs("blocking", 1), None, args, pieces)), flush=True)
+        for fsync_mode in args.modes:
+            for count in sorted({1, max(2, len(bases))}):
+                name = f"volumes_{fsync_mode}_{count}"
+                print(json.dumps(run_setup("volumes", data_dirs(name, count), fsync_mode, args, pieces)), flush=True)
+
+
+if __name__ == "__main__":
+    main()
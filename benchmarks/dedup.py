@@ -0,0 +1,175 @@
+"""
+Content-defined chunking throughput and dedup ratio on repeated uploads.
+
+Chunking: MB/s of FastCDC cut points alone and of chunk_file (cut points + sha256 fingerprints),
+next to plain sha256 of the same bytes.
+Dedup: builds a corpus of --files random files, uploads it, then re-uploads it --rounds times with
+a few small edits (inserts, deletes, overwrites) in --edit-fraction of the files each round, the way
+the client re-uploads client_testfiles. Every upload goes through the NameNode's real allocation
+path in-process (temp metadata dir, fake DataNodes), so the fingerprint index decides what is sent.
+Compared chunkers: FastCDC, fixed 1MB chunks (same index, but edits shift every later boundary),
+and the regular 32MB blocks with random ids (everything is sent every time).
+
+    python benchmarks/dedup.py --files 16 --file-mb 8 --rounds 5
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "Client"))
+sys.path.insert(0, os.path.join(ROOT, "NameNode", "src"))
+
+from chunking import FastCDC, DEDUP_AVG_CHUNK
+
+MB = 1024 * 1024
+
+
+def chunking_throughput(size_mb, rounds):
+    chunker = FastCDC()
+    data = os.urandom(size_mb * MB)
+
+    def best_of(function):
+        best = float("inf")
+        for _ in range(rounds):
+            start = time.perf_counter()
+            function()
+            best = min(best, time.perf_counter() - start)
+        return round(size_mb / best, 1)
+
+    with tempfile.NamedTemporaryFile() as f:
+        f.write(data)
+        f.flush()
+        chunks = list(chunker.chunk_file(f.name))
+        result = {
+            "data_mb": size_mb,
+            "sha256_only_mb_per_s": best_of(lambda: hashlib.sha256(data).hexdigest()),
+            "fastcdc_cut_points_mb_per_s": best_of(lambda: chunker.cut_points(data)),
+            "fastcdc_chunk_file_mb_per_s": best_of(lambda: list(chunker.chunk_file(f.name))),
+        }
+    sizes = [size for _, size, _ in chunks]
+    result.update(chunks=len(chunks), avg_chunk_kb=round(sum(sizes) / len(sizes) / 1024, 1),
+                  min_chunk_kb=round(min(sizes) / 1024, 1), max_chunk_kb=round(max(sizes) / 1024, 1))
+    return result
+
+
+def fixed_chunks(path, chunk_size=DEDUP_AVG_CHUNK):
+    offset = 0
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                return
+            yield offset, len(data), hashlib.sha256(data).hexdigest()
+            offset += len(data)
+
+
+def edit_file(path, rng, edits):
+    """A few small edits at random places, some of them change the file length."""
+    data = bytearray(open(path, "rb").read())
+    for _ in range(edits):
+        at = rng.randrange(len(data))
+        kind = rng.choice(("insert", "delete", "overwrite"))
+        length = rng.randint(1, 100)
+        if kind == "insert":
+            data[at:at] = os.urandom(length)
+        elif kind == "delete":
+            del data[at:at + length]
+        else:
+            data[at:at + length] = os.urandom(len(data[at:at + length]))
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def run_uploads(metadata_manager, namespace_class, chunker_name, paths, args):
+    """Upload the corpus args.rounds + 1 times through allocate_blocks, report bytes sent per round."""
+    metadata_manager.namespace = namespace_class()
+    rng = random.Random(args.seed)
+    chunker = FastCDC()
+    for upload_round in range(args.rounds + 1):
+        if upload_round:
+            for path in paths:
+                if rng.random() < args.edit_fraction:
+                    edit_file(path, rng, rng.randint(1, 3))
+        logical, sent = 0, 0
+        start = time.perf_counter()
+        for path in paths:
+            filesize = os.path.getsize(path)
+            # a new name per round so the NameNode keeps every version and its refcounts add up
+            filename = f"{os.path.basename(path)}.v{upload_round}"
+            if chunker_name == "blocks_32mb":
+                assignment, _ = metadata_manager.allocate_blocks(filename, filesize, args.replication)
+                sent += filesize
+            else:
+                pieces = chunker.chunk_file(path) if chunker_name == "fastcdc" else fixed_chunks(path)
+                chunks = [{"fingerprint": fingerprint, "size": size} for _, size, fingerprint in pieces]
+                assignment, _ = metadata_manager.allocate_blocks(filename, filesize, args.replication, None, chunks)
+                sent += assignment["dedup"]["new_bytes"]
+            logical += filesize
+        yield {
+            "chunker": chunker_name,
+            "round": upload_round,
+            "logical_mb": round(logical / MB, 1),
+            "sent_mb": round(sent / MB, 2),
+            "sent_pct": round(100 * sent / logical, 2),
+            "allocate_seconds": round(time.perf_counter() - start, 2),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunking-mb", type=int, default=64)
+    parser.add_argument("--timing-rounds", type=int, default=3)
+    parser.add_argument("--files", type=int, default=16)
+    parser.add_argument("--file-mb", type=float, default=8)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--edit-fraction", type=float, default=0.5, help="share of files edited per round")
+    parser.add_argument("--replication", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(json.dumps({"chunking": chunking_throughput(args.chunking_mb, args.timing_rounds)}), flush=True)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ.update(METADATA_DIR=os.path.join(workdir, "metadata"),
+                          NAMENODE_LOG_DIR=os.path.join(workdir, "logs"),
+                          NAMENODE_BLOCK_LOG_DIR=os.path.join(workdir, "block_logs"))
+        import metadata_manager
+        from namespace import Namespace
+        metadata_manager.load_metadata()
+        for i in range(5):
+            metadata_manager.update_datanode_heartbeat(f"datanode{i}")
+
+        corpus = os.path.join(workdir, "corpus")
+        os.makedirs(corpus)
+        originals = {}
+        for i in range(args.files):
+            originals[f"file{i}.bin"] = os.urandom(int(args.file_mb * MB))
+        for chunker_name in ("fastcdc", "fixed_1mb", "blocks_32mb"):
+            # every chunker starts from the same corpus and sees the same edits
+            paths = []
+            for name, data in originals.items():
+                path = os.path.join(corpus, name)
+                with open(path, "wb") as f:
+                    f.write(data)
+                paths.append(path)
+            total_logical, total_sent = 0, 0
+            for row in run_uploads(metadata_manager, Namespace, chunker_name, paths, args):
+                print(json.dumps(row), flush=True)
+                if row["round"]:
+                    total_logical += row["logical_mb"]
+                    total_sent += row["sent_mb"]
+            summary = {"chunker": chunker_name, "reupload_rounds": args.rounds,
+                       "reupload_sent_pct": round(100 * total_sent / total_logical, 2)}
+            if chunker_name != "blocks_32mb":
+                summary["namenode"] = metadata_manager.get_dedup_status()
+            print(json.dumps({"summary": summary}), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+End to end benchmark suite: real NameNode and DataNode processes, driven through Client/client.py.
+
+For every --replication factor a fresh local cluster is started (see local_cluster.py, Linux only,
+no Docker), then every --workload is generated (seeded, so reruns upload the same bytes) and run
+through each --mode:
+  upload    client.upload() per file from --threads threads, latency per file
+  batch     client.upload_multiple_files(), batched allocation, throughput only
+  download  client.download() per file from --threads threads, latency per file, sizes checked
+Every mode prints one JSON line with MB/s, files/s, latency percentiles and the CPU seconds and
+peak RSS of the client, NameNode and DataNodes. The first line describes the run (commit, host,
+arguments) so result files can be told apart.
+
+Workloads are name=count:sizes, sizes being fixed:SIZE, uniform:MIN:MAX or lognormal:MEDIAN:SIGMA
+(SIZE like 4KB, 1MB, 64MB), or one of the presets: small, mixed, large.
+
+--baseline old.jsonl compares against an earlier run of the same workloads, prints a
+"comparison" line per mode and exits with 1 if throughput dropped or p99 latency grew by more
+than --tolerance percent.
+
+    python benchmarks/e2e.py --workload small mixed --replication 2 > run.jsonl
+    python benchmarks/e2e.py --workload small mixed --replication 2 --baseline run.jsonl
+    python benchmarks/e2e.py --workload "tiny=2000:uniform:1KB:16KB" --mode batch --datanodes 5
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from local_cluster import ROOT, LocalCluster
+
+UNITS = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+PRESETS = {
+    "small": "small=2000:lognormal:16KB:1.0",
+    "mixed": "mixed=200:lognormal:1MB:1.5",
+    "large": "large=8:fixed:64MB",
+}
+MODES = ("upload", "batch", "download")
+# most a single file may be, so a lognormal tail can't fill the disk
+MAX_FILE_BYTES = 1024 ** 3
+
+
+def parse_size(text):
+    for unit in sorted(UNITS, key=len, reverse=True):
+        if text.upper().endswith(unit):
+            return int(float(text[:-len(unit)]) * UNITS[unit])
+    return int(text)
+
+
+def parse_workload(text):
+    """name=count:kind:params -> (name, count, size spec), presets are looked up first."""
+    text = PRESETS.get(text, text)
+    name, spec = text.split("=", 1)
+    count, kind, *params = spec.split(":")
+    if kind not in ("fixed", "uniform", "lognormal"):
+        raise argparse.ArgumentTypeError(f"Unknown size distribution {kind} in {text}")
+    return name, int(count), kind, params
+
+
+def file_sizes(count, kind, params, rng):
+    if kind == "fixed":
+        return [parse_size(params[0])] * count
+    if kind == "uniform":
+        low, high = parse_size(params[0]), parse_size(params[1])
+        return [rng.randint(low, high) for _ in range(count)]
+    median, sigma = parse_size(params[0]), float(params[1])
+    return [min(MAX_FILE_BYTES, max(1, int(rng.lognormvariate(0, sigma) * median))) for _ in range(count)]
+
+
+def write_workload(directory, name, count, kind, params, seed):
+    """Write the workload's files once, the same bytes on every run with the same seed."""
+    rng = random.Random(f"{seed}/{name}")
+    os.makedirs(directory)
+    paths = []
+    for i, size in enumerate(file_sizes(count, kind, params, rng)):
+        path = os.path.join(directory, f"file{i}.bin")
+        with open(path, "wb") as f:
+            remaining = size
+            while remaining:
+                piece = min(remaining, 8 * 1024 * 1024)
+                f.write(rng.randbytes(piece))
+                remaining -= piece
+        paths.append(path)
+    return paths
+
+
+def linked_copy(paths, directory):
+    """Hard links under a new directory, every mode uploads under its own NameNode filenames."""
+    os.makedirs(directory)
+    copies = []
+    for path in paths:
+        copy = os.path.join(directory, os.path.basename(path))
+        os.link(path, copy)
+        copies.append(copy)
+    return copies
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def timed_calls(function, items, threads):
+    """Run function(item) from a thread pool, returns (results, seconds per call)."""
+    def call(item):
+        start = time.perf_counter()
+        result = function(item)
+        return result, time.perf_counter() - start
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        outcomes = list(executor.map(call, items))
+    return [result for result, _ in outcomes], [seconds for _, seconds in outcomes]
+
+
+def known_to_namenode(client, filename):
+    response = client.get_session().get(f"{client.namenode_url}/files/{quote(filename)}", timeout=client.HTTP_TIMEOUT)
+    return response.status_code == 200
+
+
+def client_usage():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # ru_maxrss is in KB on Linux
+    return usage.ru_utime + usage.ru_stime, usage.ru_maxrss * 1024
+
+
+def run_mode(mode, client, cluster, paths, args):
+    """One mode over one workload's files, returns its result line."""
+    total_bytes = sum(os.path.getsize(path) for path in paths)
+    usage_before = cluster.resource_usage()
+    client_cpu_before, _ = client_usage()
+    latencies = None
+    failures = 0
+    start = time.perf_counter()
+    if mode == "upload":
+        responses, latencies = timed_calls(client.upload, paths, args.threads)
+        failures = sum(response is None or response.status_code != 200 for response in responses)
+    elif mode == "batch":
+        client.upload_multiple_files(paths, max_concurrent=args.threads)
+        failures = None  # counted below, after the clock stopped
+    else:
+        outputs = {path: path + ".out" for path in paths}
+        results, latencies = timed_calls(lambda path: client.download(path, outputs[path]), paths, args.threads)
+        failures = sum(not result or os.path.getsize(outputs[path]) != os.path.getsize(path)
+                       for path, result in zip(paths, results))
+        for output in outputs.values():
+            if os.path.exists(output):
+                os.remove(output)
+    seconds = time.perf_counter() - start
+    usage_after = cluster.resource_usage()
+    client_cpu_after, client_peak_rss = client_usage()
+    if failures is None:
+        failures = sum(not known_to_namenode(client, path) for path in paths)
+
+    result = {
+        "mode": mode,
+        "seconds": round(seconds, 3),
+        "mb_per_s": round(total_bytes / seconds / 1024 / 1024, 2),
+        "files_per_s": round(len(paths) / seconds, 1),
+        "failures": failures,
+    }
+    if latencies:
+        latencies.sort()
+        for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+            result[f"latency_{name}_ms"] = round(percentile(latencies, fraction) * 1000, 2)
+        result["latency_max_ms"] = round(latencies[-1] * 1000, 2)
+    result.update({
+        "client_cpu_seconds": round(client_cpu_after - client_cpu_before, 2),
+        "client_peak_rss_mb": round(client_peak_rss / 1024 / 1024, 1),
+        "namenode_cpu_seconds": round(usage_after["namenode"][0] - usage_before["namenode"][0], 2),
+        "namenode_peak_rss_mb": round(usage_after["namenode"][1] / 1024 / 1024, 1),
+        "datanodes_cpu_seconds": round(usage_after["datanodes"][0] - usage_before["datanodes"][0], 2),
+        "datanode_peak_rss_mb": round(usage_after["datanodes"][1] / 1024 / 1024, 1),
+    })
+    return result
+
+
+def run_description(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"run": {
+        "commit": commit,
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "platform": platform.platform(),
+        "datanodes": args.datanodes,
+        "threads": args.threads,
+        "seed": args.seed,
+        "workloads": [PRESETS.get(workload, workload) for workload in args.workload],
+        "modes": args.mode,
+        "replication": args.replication,
+    }}
+
+
+def result_key(result):
+    return result["workload"], result["replication"], result["mode"]
+
+
+def compare(results, baseline_path, tolerance):
+    """Print a comparison line per result found in the baseline, returns True if any of them regressed."""
+    baseline = {}
+    with open(baseline_path) as f:
+        for line in f:
+            row = json.loads(line)
+            if "mode" in row:
+                baseline[result_key(row)] = row
+    regressed = False
+    for result in results:
+        old = baseline.get(result_key(result))
+        if old is None:
+            continue
+        comparison = {"comparison": dict(zip(("workload", "replication", "mode"), result_key(result)))}
+        throughput_change = 100 * (result["mb_per_s"] - old["mb_per_s"]) / old["mb_per_s"]
+        comparison["mb_per_s_change_pct"] = round(throughput_change, 1)
+        worse = throughput_change < -tolerance
+        if old.get("latency_p99_ms") and result.get("latency_p99_ms"):
+            latency_change = 100 * (result["latency_p99_ms"] - old["latency_p99_ms"]) / old["latency_p99_ms"]
+            comparison["latency_p99_change_pct"] = round(latency_change, 1)
+            worse = worse or latency_change > tolerance
+        comparison["regression"] = worse
+        regressed = regressed or worse
+        print(json.dumps(comparison), flush=True)
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workload", nargs="+", default=["small", "mixed"])
+    parser.add_argument("--mode", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--replication", type=int, nargs="+", default=[2])
+    parser.add_argument("--datanodes", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=5, help="client threads for upload/download, concurrent files for batch")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--baseline", help="earlier output of this script to compare against")
+    parser.add_argument("--tolerance", type=float, default=10, help="percent change counted as a regression")
+    args = parser.parse_args()
+    workloads = [parse_workload(workload) for workload in args.workload]
+    if "download" in args.mode and not {"upload", "batch"} & set(args.mode):
+        parser.error("download needs upload or batch to run first")
+    for replication in args.replication:
+        if replication > args.datanodes:
+            parser.error(f"replication {replication} needs at least as many --datanodes")
+
+    print(json.dumps(run_description(args)), flush=True)
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        corpus = os.path.join(workdir, "corpus")
+        files = {name: write_workload(os.path.join(corpus, name), name, count, kind, params, args.seed)
+                 for name, count, kind, params in workloads}
+        for replication in args.replication:
+            cluster_dir = os.path.join(workdir, f"cluster_rf{replication}")
+            os.makedirs(cluster_dir)
+            with LocalCluster(cluster_dir, args.datanodes, replication) as cluster:
+                client = cluster.client()
+                logging.getLogger(client.__name__).setLevel(logging.WARNING)
+                client.display_upload_result = lambda allocation: None
+                # relative names so they double as NameNode filenames
+                os.chdir(cluster_dir)
+                try:
+                    for name, count, kind, params in workloads:
+                        uploaded = None
+                        for mode in args.mode:
+                            if mode == "download":
+                                paths = uploaded
+                            else:
+                                paths = linked_copy(files[name], os.path.relpath(os.path.join(cluster_dir, name, mode)))
+                                uploaded = paths
+                            result = {"workload": name, "replication": replication, "datanodes": args.datanodes,
+                                      "files": count, "total_mb": round(sum(map(os.path.getsize, paths)) / 1024 / 1024, 1),
+                                      **run_mode(mode, client, cluster, paths, args)}
+                            results.append(result)
+                            print(json.dumps(result), flush=True)
+                finally:
+                    os.chdir(ROOT)
+    if args.baseline and compare(results, args.baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
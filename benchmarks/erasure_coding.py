@@ -0,0 +1,95 @@
+"""
+Erasure coding throughput and storage overhead.
+
+Encodes full stripes with the client's Reed-Solomon codec and reports MB/s of file data, then
+decodes them with one and with parity_units data cells missing (the worst case a group survives).
+Also compares raw bytes stored per file size: REPLICATION_FACTOR full copies (the blocks
+split_file_into_blocks makes and assign_blocks_to_datanode places) against each EC policy (the
+internal blocks split_file_into_block_groups makes, parity included).
+Pure Python + NumPy, no cluster needed.
+
+    python benchmarks/erasure_coding.py --rounds 5
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "Client"))
+sys.path.insert(0, os.path.join(ROOT, "NameNode", "src"))
+
+import numpy as np
+
+from erasure import get_codec
+
+MB = 1024 * 1024
+
+
+def codec_throughput(policy, rounds):
+    codec = get_codec(policy.data_units, policy.parity_units)
+    rng = np.random.default_rng(42)
+    data = rng.integers(0, 256, (policy.data_units, policy.cell_size), dtype=np.uint8)
+    stripe_mb = policy.data_units * policy.cell_size / MB
+
+    def best_of(function):
+        best = float("inf")
+        for _ in range(rounds):
+            start = time.perf_counter()
+            function()
+            best = min(best, time.perf_counter() - start)
+        return round(stripe_mb / best, 1)
+
+    parity = codec.encode(data)
+    cells = {unit: data[unit] for unit in range(policy.data_units)}
+    cells.update({policy.data_units + unit: parity[unit] for unit in range(policy.parity_units)})
+    one_missing = {index: cell for index, cell in cells.items() if index != 0}
+    worst_case = {index: cell for index, cell in cells.items() if index >= policy.parity_units}
+    assert (codec.decode(worst_case, policy.cell_size) == data).all()
+    return {
+        "policy": policy.name,
+        "cell_kb": policy.cell_size // 1024,
+        "encode_mb_per_s": best_of(lambda: codec.encode(data)),
+        "decode_1_missing_mb_per_s": best_of(lambda: codec.decode(one_missing, policy.cell_size)),
+        f"decode_{policy.parity_units}_missing_mb_per_s": best_of(lambda: codec.decode(worst_case, policy.cell_size)),
+    }
+
+
+def storage_overhead(file_sizes_mb, replication_factor, policies):
+    from block_manager import split_file_into_blocks, split_file_into_block_groups
+    rows = []
+    for size_mb in file_sizes_mb:
+        filesize = int(size_mb * MB)
+        replicated = sum(block["size"] for block in split_file_into_blocks("bench.bin", filesize)) * replication_factor
+        row = {"file_mb": size_mb, f"replicated_x{replication_factor}": round(replicated / filesize, 2)}
+        for policy in policies:
+            stored = sum(block["size"] for group in split_file_into_block_groups("bench.bin", filesize, policy)
+                         for block in group["blocks"])
+            row[policy.name] = round(stored / filesize, 2)
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--replication", type=int, default=2)
+    parser.add_argument("--file-sizes-mb", type=float, nargs="+", default=[1, 8, 32, 100, 1024, 10240])
+    args = parser.parse_args()
+
+    # block_manager logs through the NameNode loggers, keep their files out of the way
+    with tempfile.TemporaryDirectory() as log_dir:
+        os.environ.setdefault("NAMENODE_LOG_DIR", log_dir)
+        os.environ.setdefault("NAMENODE_BLOCK_LOG_DIR", log_dir)
+        from storage_policy import EC_POLICIES
+        policies = [EC_POLICIES[name] for name in sorted(EC_POLICIES)]
+        for policy in policies:
+            print(json.dumps(codec_throughput(policy, args.rounds)), flush=True)
+        for row in storage_overhead(args.file_sizes_mb, args.replication, policies):
+            print(json.dumps({"storage_overhead": row}), flush=True)
+
+
+if __name__ == "__main__":
+    main()
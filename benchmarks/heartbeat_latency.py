@@ -0,0 +1,124 @@
+"""
+NameNode heartbeat latency under allocation bursts.
+
+Starts the NameNode as a local uvicorn process (temp metadata/log dirs, no Docker), keeps a set
+of fake DataNodes heartbeating, and measures heartbeat round trip latency twice: with the
+NameNode idle, and while several clients keep asking it to allocate very large files.
+If allocations stay off the event loop the two latency distributions should look the same.
+
+    python benchmarks/heartbeat_latency.py --seconds 10 --file-size-gb 1024
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+NAMENODE_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "NameNode", "src")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_namenode(workdir, port):
+    env = dict(os.environ,
+               METADATA_DIR=os.path.join(workdir, "metadata"),
+               NAMENODE_LOG_DIR=os.path.join(workdir, "logs"),
+               NAMENODE_BLOCK_LOG_DIR=os.path.join(workdir, "block_logs"))
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+                                "--log-level", "warning"], cwd=NAMENODE_SRC, env=env)
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            if requests.get(url + "/health", timeout=1).status_code == 200:
+                return process, url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("NameNode did not come up")
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else None
+
+
+def heartbeat_loop(url, node_id, interval, stop, latencies):
+    session = requests.Session()
+    while not stop.is_set():
+        start = time.perf_counter()
+        session.post(f"{url}/nodes/{node_id}/heartbeat", json={"node_id": node_id}, timeout=30)
+        latencies.append((time.perf_counter() - start) * 1000)
+        time.sleep(interval)
+
+
+def allocation_loop(url, client_id, file_size, stop, allocations):
+    session = requests.Session()
+    counter = 0
+    while not stop.is_set():
+        counter += 1
+        start = time.perf_counter()
+        session.post(f"{url}/files", json={"filename": f"bench/client{client_id}_{counter}.bin", "filesize_bytes": file_size},
+                     timeout=300)
+        allocations.append((time.perf_counter() - start) * 1000)
+
+
+def run_phase(url, args, burst):
+    stop = threading.Event()
+    latencies, allocations = [], []
+    threads = [threading.Thread(target=heartbeat_loop, args=(url, f"bench-dn-{i}", args.heartbeat_interval, stop, latencies))
+               for i in range(args.datanodes)]
+    if burst:
+        file_size = int(args.file_size_gb * 1024 ** 3)
+        threads += [threading.Thread(target=allocation_loop, args=(url, i, file_size, stop, allocations))
+                    for i in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return {
+        "phase": "allocation_burst" if burst else "idle",
+        "heartbeats": len(latencies),
+        "heartbeat_p50_ms": round(percentile(latencies, 50), 2),
+        "heartbeat_p99_ms": round(percentile(latencies, 99), 2),
+        "heartbeat_max_ms": round(max(latencies), 2),
+        "allocations": len(allocations),
+        "allocation_p50_ms": round(percentile(allocations, 50), 2) if allocations else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--datanodes", type=int, default=20)
+    parser.add_argument("--heartbeat-interval", type=float, default=0.1)
+    parser.add_argument("--clients", type=int, default=4, help="concurrent allocating clients during the burst")
+    parser.add_argument("--file-size-gb", type=float, default=1024, help="size of each allocated file (1TB = 32768 blocks)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        process, url = start_namenode(workdir, free_port())
+        try:
+            # one round of heartbeats first so allocations have live DataNodes to place on
+            for i in range(args.datanodes):
+                requests.post(f"{url}/nodes/bench-dn-{i}/heartbeat", json={}, timeout=5)
+            for burst in (False, True):
+                print(json.dumps(run_phase(url, args, burst)), flush=True)
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
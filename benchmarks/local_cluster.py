@@ -0,0 +1,162 @@
+"""
+A NameNode and N DataNodes as local uvicorn processes, for the end to end benchmarks (no Docker).
+
+Every process gets its own temp dirs under workdir, and every DataNode its own loopback address
+(127.0.0.2, 127.0.0.3, ...) so they all share one port the way containers do and the client reaches
+them by node id like in docker-compose. Linux only (the whole 127.0.0.0/8 range is routed to loopback there).
+"""
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import requests
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+NAMENODE_SRC = os.path.join(ROOT, "NameNode", "src")
+DATANODE_SRC = os.path.join(ROOT, "DataNode", "src")
+CLIENT_SRC = os.path.join(ROOT, "Client")
+
+
+def free_port(host="127.0.0.1"):
+    with socket.socket() as s:
+        s.bind((host, 0))
+        return s.getsockname()[1]
+
+
+def wait_healthy(url, process, what):
+    for _ in range(200):
+        if process.poll() is not None:
+            raise RuntimeError(f"{what} exited with {process.returncode}")
+        try:
+            if requests.get(url + "/health", timeout=1).status_code == 200:
+                return
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"{what} did not come up")
+
+
+def start_namenode(workdir, port, replication=2, **env):
+    """Start the NameNode on 127.0.0.1:port, extra keyword arguments are environment overrides."""
+    env = dict(os.environ,
+               METADATA_DIR=os.path.join(workdir, "metadata"),
+               NAMENODE_LOG_DIR=os.path.join(workdir, "logs"),
+               NAMENODE_BLOCK_LOG_DIR=os.path.join(workdir, "block_logs"),
+               REPLICATION_FACTOR=str(replication),
+               **{name: str(value) for name, value in env.items()})
+    log = open(os.path.join(workdir, "namenode.log"), "w")
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+                                "--log-level", "warning"], cwd=NAMENODE_SRC, env=env, stdout=log, stderr=log)
+    url = f"http://127.0.0.1:{port}"
+    wait_healthy(url, process, "NameNode")
+    return process, url
+
+
+def start_datanode(workdir, node_id, port, namenode_url, **env):
+    """Start a DataNode listening on node_id (a loopback address) and port, keyword arguments override its environment."""
+    env = dict(os.environ,
+               NODE_ID=node_id,
+               DATA_DIR=os.path.join(workdir, "data", node_id),
+               NAMENODE_URL=namenode_url,
+               DATANODE_PORT=str(port),
+               HEARTBEAT_INTERVAL_SECONDS="1",
+               **{name: str(value) for name, value in env.items()})
+    log = open(os.path.join(workdir, f"{node_id}.log"), "w")
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "app:app", "--host", node_id, "--port", str(port),
+                                "--log-level", "warning"], cwd=DATANODE_SRC, env=env, stdout=log, stderr=log)
+    wait_healthy(f"http://{node_id}:{port}", process, f"DataNode {node_id}")
+    return process
+
+
+def replication_status(namenode_url):
+    return requests.get(f"{namenode_url}/replication", timeout=10).json()
+
+
+def process_usage(pid):
+    """CPU seconds used so far and peak RSS in bytes of a running process, from /proc."""
+    with open(f"/proc/{pid}/stat") as f:
+        # the command name can hold spaces, the fields we want come after its closing paren
+        fields = f.read().rsplit(")", 1)[1].split()
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    peak_rss = 0
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                peak_rss = int(line.split()[1]) * 1024
+    return cpu_seconds, peak_rss
+
+
+class LocalCluster:
+    """
+    with LocalCluster(workdir, datanodes=3) as cluster: starts everything, waits until the NameNode
+    sees every DataNode alive, and stops all of it on the way out.
+    namenode_env / datanode_env are environment overrides for the NameNode / every DataNode.
+    """
+    def __init__(self, workdir, datanodes=3, replication=2, namenode_env=None, datanode_env=None):
+        self.workdir = workdir
+        self.num_datanodes = datanodes
+        self.replication = replication
+        self.namenode_env = namenode_env or {}
+        self.datanode_env = datanode_env or {}
+        self.namenode = None
+        self.namenode_url = None
+        self.datanodes = {}  # node id -> process
+        self.datanode_port = None
+
+    def __enter__(self):
+        try:
+            self.start()
+        except BaseException:
+            self.stop()
+            raise
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        self.namenode, self.namenode_url = start_namenode(self.workdir, free_port(), self.replication, **self.namenode_env)
+        self.datanode_port = free_port()
+        for i in range(self.num_datanodes):
+            node_id = f"127.0.0.{i + 2}"
+            self.datanodes[node_id] = start_datanode(self.workdir, node_id, self.datanode_port, self.namenode_url,
+                                                     **self.datanode_env)
+        while len(replication_status(self.namenode_url)["live_datanodes"]) < self.num_datanodes:
+            time.sleep(0.2)
+
+    def stop(self):
+        for process in self.processes():
+            if process.poll() is None:
+                process.terminate()
+                process.wait()
+
+    def processes(self):
+        return ([self.namenode] if self.namenode else []) + list(self.datanodes.values())
+
+    def resource_usage(self):
+        """{"namenode": (cpu seconds, peak rss), "datanodes": (summed cpu seconds, largest peak rss)} of live processes."""
+        namenode = process_usage(self.namenode.pid)
+        datanodes = [process_usage(process.pid) for process in self.datanodes.values() if process.poll() is None]
+        return {"namenode": namenode,
+                "datanodes": (sum(cpu for cpu, _ in datanodes), max((rss for _, rss in datanodes), default=0))}
+
+    def data_bytes(self):
+        """Bytes of block data (.dat files) stored across all DataNodes."""
+        total = 0
+        for node_id in self.datanodes:
+            directory = os.path.join(self.workdir, "data", node_id)
+            with os.scandir(directory) as entries:
+                total += sum(entry.stat().st_size for entry in entries if entry.name.endswith(".dat"))
+        return total
+
+    def client(self):
+        """The client module, pointed at this cluster."""
+        os.environ["DATANODE_PORT"] = str(self.datanode_port)
+        if CLIENT_SRC not in sys.path:
+            sys.path.insert(0, CLIENT_SRC)
+        import client
+        client.namenode_url = self.namenode_url
+        client.DATANODE_PORT = self.datanode_port
+        return client
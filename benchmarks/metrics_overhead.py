@@ -0,0 +1,150 @@
+"""
+Cost of the /metrics instrumentation.
+
+Per operation: ns per Counter.inc, Histogram.observe and `with histogram.time()`, single threaded
+and with --threads threads hitting the same histogram, and how long a scrape of the NameNode's
+metrics takes.
+NameNode allocation (in-process, temp metadata dir): allocate_blocks + the fsync'd edit log wait,
+timed the way POST /files is (allocation histogram, edit log sync histogram, blocks counter), against
+the same loop with every observe/inc turned into a no-op. Median of --rounds, alternating the two.
+fsync jitter is bigger than the difference, so the instrumentation a request goes through is also
+timed on its own and compared to the per-file allocation time.
+
+    python benchmarks/metrics_overhead.py --files 5000 --rounds 9
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "NameNode", "src"))
+
+import metrics
+from metrics import Counter, Histogram
+
+
+def ns_per_op(function, operations):
+    start = time.perf_counter()
+    function(operations)
+    return round((time.perf_counter() - start) / operations * 1e9, 1)
+
+
+def operation_costs(args):
+    counter = Counter("bench_total", "benchmark counter", ("kind",))
+    histogram = Histogram("bench_seconds", "benchmark histogram", ("kind",))
+
+    def loop(operations):
+        for _ in range(operations):
+            pass
+
+    def inc(operations):
+        for _ in range(operations):
+            counter.inc(1, "a")
+
+    def observe(operations):
+        for _ in range(operations):
+            histogram.observe(0.003, "a")
+
+    def timer(operations):
+        for _ in range(operations):
+            with histogram.time("a"):
+                pass
+
+    def threaded(operations):
+        per_thread = operations // args.threads
+        threads = [threading.Thread(target=observe, args=(per_thread,)) for _ in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    empty = ns_per_op(loop, args.operations)
+    return {
+        "mode": "per_operation",
+        "operations": args.operations,
+        "empty_loop_ns": empty,
+        "counter_inc_ns": round(ns_per_op(inc, args.operations) - empty, 1),
+        "histogram_observe_ns": round(ns_per_op(observe, args.operations) - empty, 1),
+        "histogram_timer_ns": round(ns_per_op(timer, args.operations) - empty, 1),
+        f"histogram_observe_{args.threads}_threads_ns": round(ns_per_op(threaded, args.operations) - empty, 1),
+    }
+
+
+def allocation_overhead(workdir, args):
+    os.environ.update(METADATA_DIR=os.path.join(workdir, "metadata"),
+                      NAMENODE_LOG_DIR=os.path.join(workdir, "logs"),
+                      NAMENODE_BLOCK_LOG_DIR=os.path.join(workdir, "block_logs"))
+    import metadata_manager
+    metadata_manager.load_metadata()
+    for i in range(10):
+        metadata_manager.update_datanode_heartbeat(f"datanode{i}")
+    # same as the POST /files handler in NameNode/src/app.py
+    allocation_seconds = Histogram("namenode_allocation_seconds", "benchmark copy", ("endpoint",))
+    real_observe, real_inc = Histogram.observe, Counter.inc
+
+    def run(label, instrumented):
+        if not instrumented:
+            Histogram.observe = lambda self, value, *labelvalues: None
+            Counter.inc = lambda self, amount=1, *labelvalues: None
+        try:
+            start = time.perf_counter()
+            for i in range(args.files):
+                with allocation_seconds.time("files"):
+                    _, txid = metadata_manager.allocate_blocks(f"{label}/file{i}.txt", args.file_kb * 1024, 2)
+                    metadata_manager.timed_sync(txid)
+            return time.perf_counter() - start
+        finally:
+            Histogram.observe, Counter.inc = real_observe, real_inc
+
+    seconds = {"off": [], "on": []}
+    for round_number in range(args.rounds):
+        for mode in ("off", "on"):
+            seconds[mode].append(run(f"{mode}{round_number}", mode == "on"))
+    off, on = statistics.median(seconds["off"]), statistics.median(seconds["on"])
+
+    # what one POST /files adds: its allocation timer, the edit log sync timer and the blocks counter
+    start = time.perf_counter()
+    for _ in range(args.files):
+        with allocation_seconds.time("files"):
+            with metadata_manager.edit_log_sync_seconds.time():
+                metadata_manager.blocks_allocated.inc(1)
+    instrumentation = (time.perf_counter() - start) / args.files
+    return {
+        "mode": "namenode_allocation",
+        "files": args.files,
+        "metrics_off_files_per_s": round(args.files / off),
+        "metrics_on_files_per_s": round(args.files / on),
+        "measured_overhead_pct": round(100 * (on - off) / off, 2),
+        "instrumentation_us_per_request": round(instrumentation * 1e6, 2),
+        "instrumentation_pct_of_request": round(100 * instrumentation / (off / args.files), 2),
+        "scrape_ms": round(timed_scrape() * 1000, 2),
+    }
+
+
+def timed_scrape():
+    start = time.perf_counter()
+    metrics.render()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--operations", type=int, default=1_000_000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--file-kb", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=9)
+    args = parser.parse_args()
+
+    print(json.dumps(operation_costs(args)), flush=True)
+    with tempfile.TemporaryDirectory() as workdir:
+        print(json.dumps(allocation_overhead(workdir, args)), flush=True)
+
+
+if __name__ == "__main__":
+    main()
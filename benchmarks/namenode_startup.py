@@ -0,0 +1,185 @@
+"""
+NameNode cold start: JSON checkpoint vs binary snapshot.
+
+Builds a synthetic namespace (4 blocks per file, REPLICATION_FACTOR 2 over 100 DataNodes), writes
+it as the old metadata.json (up to --json-max-blocks, the JSON load needs several GB beyond that)
+and as metadata.snap, then starts a NameNode on each in a fresh process the way app.py does
+(start_metadata_loader) and reports:
+  load_seconds          until the namespace is loaded and uploads/reads are served
+  first_heartbeat_ms    until the first heartbeat is answered, counted from the start of the load
+  heartbeat_stall_ms    longest a heartbeat was held up (beyond its interval) while loading and indexing
+  first_lookup_ms       first GET /files lookup once loaded
+  block_lookup_us       block id -> block index lookup, what block reports and uploads do per block
+  node_index_seconds    after the load, until the node -> blocks index (block reports) is built in the background
+  peak_rss_mb           peak resident memory of the process
+With the old blocking load nothing, heartbeats included, was answered before load_seconds.
+
+    python benchmarks/namenode_startup.py                      # 1M and 10M blocks
+    python benchmarks/namenode_startup.py --blocks 1000000 --formats json binary
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from array import array
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "NameNode", "src"))
+
+BLOCKS_PER_FILE = 4
+REPLICATION_FACTOR = 2
+NUM_NODES = 100
+BLOCK_SIZE = 33554432
+HEARTBEAT_INTERVAL_SECONDS = 0.05
+
+
+def use_metadata_dir(workdir, name):
+    os.environ.update(METADATA_DIR=os.path.join(workdir, name),
+                      NAMENODE_LOG_DIR=os.path.join(workdir, "logs"),
+                      NAMENODE_BLOCK_LOG_DIR=os.path.join(workdir, "block_logs"))
+
+
+def build_namespace(num_blocks):
+    """Fill the Namespace arrays directly, add_block per block would take longer than what is measured."""
+    from namespace import FileRecord, Namespace
+    namespace = Namespace()
+    nodes = [f"{node * 2654435761 % 16 ** 12:012x}" for node in range(NUM_NODES)]  # docker style hostnames
+    for name in nodes:
+        namespace.nodes.intern(name)
+    num_files = num_blocks // BLOCKS_PER_FILE
+    # shaped like block_manager's ids, the last part stands in for the uuid
+    namespace.block_ids = [f"block_file_{block // BLOCKS_PER_FILE}_txt_{block % BLOCKS_PER_FILE:04d}_{block * 2654435761 % 16 ** 8:08x}"
+                           for block in range(num_files * BLOCKS_PER_FILE)]
+    namespace.block_index = dict(zip(namespace.block_ids, range(len(namespace.block_ids))))
+    count = len(namespace.block_ids)
+    namespace.block_sizes = array("q", [BLOCK_SIZE]) * count
+    namespace.block_replication = array("b", [REPLICATION_FACTOR]) * count
+    namespace.block_refs = array("i", [0]) * count
+    namespace.replicas = array("i", [-1]) * (count * namespace.max_replicas)
+    for replica in range(REPLICATION_FACTOR):
+        namespace.replicas[replica::namespace.max_replicas] = array("i", [(block + replica) % NUM_NODES for block in range(count)])
+    namespace.unindexed_blocks = count
+    for file_number in range(num_files):
+        blocks = array("q", range(file_number * BLOCKS_PER_FILE, (file_number + 1) * BLOCKS_PER_FILE))
+        namespace.files[f"client_testfiles/file_{file_number}.txt"] = FileRecord(
+            BLOCKS_PER_FILE * BLOCK_SIZE, BLOCK_SIZE, "2025-08-10T12:00:00.123456", REPLICATION_FACTOR, blocks)
+    return namespace
+
+
+def write_checkpoints(workdir, num_blocks, formats):
+    """Write the namespace in every format, each into its own metadata dir."""
+    results = {"blocks": num_blocks}
+    start = time.perf_counter()
+    namespace = build_namespace(num_blocks)
+    results["files"] = namespace.num_files()
+    results["build_seconds"] = round(time.perf_counter() - start, 2)
+    active_datanodes = {name: datetime.now() for name in namespace.nodes.names}
+    if "binary" in formats:
+        use_metadata_dir(workdir, "binary")
+        import metadata_manager
+        start = time.perf_counter()
+        metadata_manager.store_metadata({"txid": 1, "active_datanodes": active_datanodes, "namespace": namespace})
+        results["binary_write_seconds"] = round(time.perf_counter() - start, 2)
+        results["binary_mb"] = round(os.path.getsize(metadata_manager.SNAPSHOT_FILE) / 1024 / 1024, 1)
+    if "json" in formats:
+        # what checkpoints wrote before metadata.snap
+        path = os.path.join(workdir, "json", "metadata.json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        start = time.perf_counter()
+        file_metadata, block_assignments = namespace.to_metadata()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"txid": 1, "active_datanodes": {node: dt.isoformat() for node, dt in active_datanodes.items()},
+                       "file_metadata": file_metadata, "block_assignments": block_assignments,
+                       "last_updated": datetime.now().isoformat()}, f, separators=(",", ":"))
+        results["json_write_seconds"] = round(time.perf_counter() - start, 2)
+        results["json_mb"] = round(os.path.getsize(path) / 1024 / 1024, 1)
+    return results
+
+
+def heartbeat_until(metadata_manager, done, start):
+    """Heartbeat like a DataNode until done(), returns when each heartbeat was answered (relative to start)."""
+    answered = []
+    while not done():
+        metadata_manager.update_datanode_heartbeat("datanode0", BLOCK_SIZE * 1000, 0, 0, 0)
+        metadata_manager.process_incremental_report("datanode0", [], [])
+        answered.append(time.perf_counter() - start)
+        time.sleep(HEARTBEAT_INTERVAL_SECONDS)
+    return answered
+
+
+def cold_start(workdir, fmt, num_blocks):
+    use_metadata_dir(workdir, fmt)
+    import metadata_manager
+
+    start = time.perf_counter()
+    metadata_manager.start_metadata_loader()
+    answered = heartbeat_until(metadata_manager, metadata_manager.is_namespace_loaded, start)
+    metadata_manager.namespace_loaded.result()
+    load_seconds = time.perf_counter() - start
+    answered += heartbeat_until(metadata_manager, lambda: not metadata_manager.namespace.unindexed_blocks, start)
+    node_index = time.perf_counter() - start - load_seconds
+
+    start = time.perf_counter()
+    file_blocks = metadata_manager.get_file_blocks(f"client_testfiles/file_{num_blocks // BLOCKS_PER_FILE // 2}.txt")
+    first_lookup = time.perf_counter() - start
+    assert len(file_blocks["blocks"]) == BLOCKS_PER_FILE
+    block_ids = random.sample(metadata_manager.namespace.block_ids, 10000)
+    start = time.perf_counter()
+    for block_id in block_ids:
+        metadata_manager.namespace.get_block_index(block_id)
+    block_lookup = (time.perf_counter() - start) / len(block_ids)
+    on_node = metadata_manager.namespace.blocks_on_node(metadata_manager.namespace.nodes.name(0))
+    assert len(on_node) == num_blocks * REPLICATION_FACTOR // NUM_NODES
+    gaps = [later - earlier for earlier, later in zip(answered, answered[1:])]
+    return {
+        "format": fmt,
+        "blocks": num_blocks,
+        "load_seconds": round(load_seconds, 2),
+        "first_heartbeat_ms": round(answered[0] * 1000, 1) if answered else None,
+        "heartbeat_stall_ms": round(max(max(gaps, default=0) - HEARTBEAT_INTERVAL_SECONDS, 0) * 1000, 1),
+        "first_lookup_ms": round(first_lookup * 1000, 2),
+        "block_lookup_us": round(block_lookup * 1e6, 2),
+        "node_index_seconds": round(node_index, 2),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def run(workdir, *args):
+    output = subprocess.run([sys.executable, __file__, "--workdir", workdir, *args],
+                            capture_output=True, text=True, check=True).stdout
+    return output.strip().splitlines()[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--blocks", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    parser.add_argument("--formats", nargs="+", default=["json", "binary"], choices=["json", "binary"])
+    parser.add_argument("--json-max-blocks", type=int, default=2_000_000,
+                        help="skip the JSON checkpoint above this many blocks")
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    parser.add_argument("--write", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.workdir:
+        if args.write:
+            print(json.dumps(write_checkpoints(args.workdir, args.blocks[0], args.formats)))
+        else:
+            print(json.dumps(cold_start(args.workdir, args.formats[0], args.blocks[0])))
+        return
+
+    for num_blocks in args.blocks:
+        formats = [fmt for fmt in args.formats if fmt != "json" or num_blocks <= args.json_max_blocks]
+        with tempfile.TemporaryDirectory() as workdir:
+            # each step in its own process so one can't leave memory behind for the next
+            print(run(workdir, "--write", "--blocks", str(num_blocks), "--formats", *formats), flush=True)
+            for fmt in formats:
+                print(run(workdir, "--blocks", str(num_blocks), "--formats", fmt), flush=True)
+
+
+if __name__ == "__main__":
+    main()
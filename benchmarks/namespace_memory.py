@@ -0,0 +1,112 @@
+"""
+NameNode namespace memory benchmark.
+
+Builds a synthetic namespace (4 blocks per file, REPLICATION_FACTOR 2 over 100 DataNodes) in both
+the old dict-of-dicts layout and the compact Namespace, and reports resident bytes per block.
+Each run happens in its own process so one layout's garbage can't skew the other.
+
+    python benchmarks/namespace_memory.py                      # 1M and 10M blocks
+    python benchmarks/namespace_memory.py --blocks 1000000 --layouts compact
+"""
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "NameNode", "src"))
+
+BLOCKS_PER_FILE = 4
+REPLICATION_FACTOR = 2
+NUM_NODES = 100
+
+
+def rss_bytes():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def synthetic_blocks(num_blocks):
+    """Yield (filename, block_ids) shaped like what block_manager generates."""
+    for file_number in range(num_blocks // BLOCKS_PER_FILE):
+        filename = f"client_testfiles/file_{file_number}.txt"
+        yield filename, [f"block_file_{file_number}_txt_{i:04d}_{uuid.uuid4().hex[:8]}" for i in range(BLOCKS_PER_FILE)]
+
+
+def node_names():
+    # docker style 12 hex char hostnames
+    return [uuid.uuid4().hex[:12] for _ in range(NUM_NODES)]
+
+
+def build_dicts(num_blocks):
+    nodes = node_names()
+    file_metadata = {}
+    block_assignments = {}
+    for file_number, (filename, block_ids) in enumerate(synthetic_blocks(num_blocks)):
+        for i, block_id in enumerate(block_ids):
+            # after json.load every hostname in every replica list is its own string object
+            block_assignments[block_id] = [nodes[(file_number + i + r) % NUM_NODES].encode().decode()
+                                           for r in range(REPLICATION_FACTOR)]
+        file_metadata[filename] = {
+            "filesize": BLOCKS_PER_FILE * 33554432,
+            "total_blocks": BLOCKS_PER_FILE,
+            "block_size": 33554432,
+            "blocks": list(block_ids),
+            "created_at": "2025-08-10T12:00:00.123456",
+            "replication_factor": REPLICATION_FACTOR
+        }
+    return file_metadata, block_assignments
+
+
+def build_compact(num_blocks):
+    from namespace import Namespace
+    nodes = node_names()
+    namespace = Namespace()
+    for file_number, (filename, block_ids) in enumerate(synthetic_blocks(num_blocks)):
+        for i, block_id in enumerate(block_ids):
+            namespace.add_block(block_id, 33554432, [nodes[(file_number + i + r) % NUM_NODES] for r in range(REPLICATION_FACTOR)])
+        namespace.add_file(filename, BLOCKS_PER_FILE * 33554432, 33554432, "2025-08-10T12:00:00.123456",
+                           REPLICATION_FACTOR, block_ids)
+    return namespace
+
+
+def measure(layout, num_blocks):
+    gc.collect()
+    before = rss_bytes()
+    start = time.perf_counter()
+    state = build_compact(num_blocks) if layout == "compact" else build_dicts(num_blocks)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    used = rss_bytes() - before
+    return {
+        "layout": layout,
+        "blocks": num_blocks,
+        "rss_mb": round(used / 1024 / 1024, 1),
+        "bytes_per_block": round(used / num_blocks, 1),
+        "build_seconds": round(elapsed, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--blocks", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    parser.add_argument("--layouts", nargs="+", default=["dicts", "compact"], choices=["dicts", "compact"])
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(measure(args.layouts[0], args.blocks[0])))
+        return
+
+    for num_blocks in args.blocks:
+        for layout in args.layouts:
+            output = subprocess.run([sys.executable, __file__, "--single", "--blocks", str(num_blocks), "--layouts", layout],
+                                    capture_output=True, text=True, check=True).stdout
+            print(output.strip(), flush=True)
+
+
+if __name__ == "__main__":
+    main()
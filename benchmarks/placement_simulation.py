@@ -0,0 +1,87 @@
+"""
+Block placement simulation.
+
+Places blocks on a simulated cluster with each placement policy and reports placement throughput
+and how evenly the cluster ends up used. By default 1000 DataNodes with capacities between 200 and
+1600 blocks (the run fills about half the cluster) and a tenth of the nodes already half full.
+Nodes send a storage report every --report-every blocks, like heartbeats would.
+Pure Python, no NameNode process needed.
+
+    python benchmarks/placement_simulation.py --nodes 1000 --blocks 200000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "NameNode", "src"))
+
+from placement import NodeStatsTable, get_placement_policy, PLACEMENT_POLICIES
+
+BLOCK_SIZE = 32 * 1024 * 1024
+# capacities are small multiples of this so a few hundred thousand blocks fill the cluster noticeably
+CAPACITY_UNIT = 100 * BLOCK_SIZE
+
+
+def simulate(policy_name, args):
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+    nodes = [f"dn-{i:04d}" for i in range(args.nodes)]
+    capacity = {node: rng.choice([2, 4, 8, 16]) * CAPACITY_UNIT for node in nodes}
+    # existing skew: a tenth of the cluster is already half full
+    used = {node: capacity[node] // 2 if rng.random() < 0.1 else 0 for node in nodes}
+    stats = NodeStatsTable()
+    for node in nodes:
+        stats.update_report(node, capacity[node], used[node], 0)
+    policy = get_placement_policy(policy_name, stats)
+
+    blocks_per_node = dict.fromkeys(nodes, 0)
+    duplicate_placements = 0
+    elapsed = 0.0
+    for block_number in range(args.blocks):
+        start = time.perf_counter()
+        chosen = policy.place(BLOCK_SIZE, args.replication, nodes)
+        elapsed += time.perf_counter() - start
+        if len(set(chosen)) != len(chosen):
+            duplicate_placements += 1
+        for node in chosen:
+            used[node] += BLOCK_SIZE
+            blocks_per_node[node] += 1
+        if block_number % args.report_every == 0:
+            for node in nodes:
+                stats.update_report(node, capacity[node], used[node], 0)
+
+    utilization = [used[node] / capacity[node] for node in nodes]
+    counts = list(blocks_per_node.values())
+    return {
+        "policy": policy_name,
+        "nodes": args.nodes,
+        "blocks": args.blocks,
+        "placements_per_second": round(args.blocks / elapsed),
+        "us_per_block": round(elapsed / args.blocks * 1e6, 2),
+        "utilization_stdev": round(statistics.pstdev(utilization), 4),
+        "utilization_min": round(min(utilization), 4),
+        "utilization_max": round(max(utilization), 4),
+        "blocks_per_node_max_over_mean": round(max(counts) / statistics.mean(counts), 2),
+        "duplicate_placements": duplicate_placements
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=1000)
+    parser.add_argument("--blocks", type=int, default=200000)
+    parser.add_argument("--replication", type=int, default=2)
+    parser.add_argument("--report-every", type=int, default=1000, help="blocks between simulated storage reports")
+    parser.add_argument("--policies", nargs="+", default=sorted(PLACEMENT_POLICIES), choices=sorted(PLACEMENT_POLICIES))
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    for policy_name in args.policies:
+        print(json.dumps(simulate(policy_name, args)), flush=True)
+
+
+if __name__ == "__main__":
+    main()
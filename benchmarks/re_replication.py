@@ -0,0 +1,116 @@
+"""
+Time to full replication after a DataNode dies.
+
+Starts a NameNode and --datanodes DataNodes as local uvicorn processes (temp dirs, no Docker),
+each DataNode on its own loopback address (127.0.0.2, 127.0.0.3, ...) so they all share one port
+the way containers do. Uploads --files files through the client, kills one DataNode with SIGKILL
+and polls the NameNode until every block has its full set of live replicas again.
+Reports how long the NameNode took to notice (heartbeat timeout) and how long recovery took after that.
+Linux only (the whole 127.0.0.0/8 range is routed to loopback there).
+
+    python benchmarks/re_replication.py --datanodes 5 --files 4 --file-mb 96 --replication-mbps 20
+"""
+import argparse
+import json
+import os
+import signal
+import tempfile
+import time
+from urllib.parse import quote
+
+import requests
+
+from local_cluster import ROOT, LocalCluster, replication_status
+
+
+def fully_replicated(namenode_url, filenames, replication, live):
+    for filename in filenames:
+        blocks = requests.get(f"{namenode_url}/files/{quote(filename)}", timeout=10).json()["blocks"]
+        for block in blocks:
+            if sum(node in live for node in block["locations"]) < replication:
+                return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--datanodes", type=int, default=5)
+    parser.add_argument("--replication", type=int, default=2)
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--file-mb", type=int, default=96)
+    parser.add_argument("--heartbeat-timeout", type=int, default=6, help="seconds without heartbeats before a node is dead")
+    parser.add_argument("--replication-mbps", type=float, default=20, help="per DataNode re-replication bandwidth cap")
+    parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        cluster = LocalCluster(workdir, args.datanodes, args.replication,
+                               namenode_env={"HEARTBEAT_TIMEOUT_SECONDS": args.heartbeat_timeout,
+                                             "REPLICATION_CHECK_SECONDS": "0.5"},
+                               datanode_env={"REPLICATION_BYTES_PER_SECOND": int(args.replication_mbps * 1024 * 1024)})
+        try:
+            cluster.start()
+            namenode_url = cluster.namenode_url
+            datanodes = cluster.datanodes
+
+            # upload through the real client, relative names so they double as NameNode filenames
+            client = cluster.client()
+            os.chdir(workdir)
+            os.makedirs("files", exist_ok=True)
+            filenames = []
+            for i in range(args.files):
+                filename = f"files/file{i}.bin"
+                with open(filename, "wb") as f:
+                    f.write(os.urandom(args.file_mb * 1024 * 1024))
+                response = client.upload(filename)
+                if response is None or response.status_code != 200:
+                    raise RuntimeError(f"Upload of {filename} failed")
+                filenames.append(filename)
+            # every upload was acked by the whole pipeline, wait for the incremental reports to land too
+            time.sleep(2)
+
+            victim = next(iter(datanodes))
+            blocks_lost, bytes_lost = 0, 0
+            for filename in filenames:
+                blocks = requests.get(f"{namenode_url}/files/{quote(filename)}", timeout=10).json()["blocks"]
+                lost = [block for block in blocks if victim in block["locations"]]
+                blocks_lost += len(lost)
+                bytes_lost += sum(block["size"] for block in lost)
+            datanodes[victim].send_signal(signal.SIGKILL)
+            killed_at = time.monotonic()
+            detected_at = None
+            live = None
+            while time.monotonic() - killed_at < args.timeout:
+                status = replication_status(namenode_url)
+                live = set(status["live_datanodes"])
+                if detected_at is None and victim not in live:
+                    detected_at = time.monotonic()
+                if (detected_at is not None and not status["under_replicated"] and not status["pending_replications"]
+                        and fully_replicated(namenode_url, filenames, args.replication, live)):
+                    break
+                time.sleep(0.2)
+            else:
+                raise RuntimeError(f"Not fully replicated after {args.timeout}s: {replication_status(namenode_url)}")
+            recovered_at = time.monotonic()
+
+            recovery_seconds = recovered_at - detected_at
+            lost_mb = bytes_lost / (1024 * 1024)
+            print(json.dumps({
+                "datanodes": args.datanodes,
+                "replication": args.replication,
+                "files": args.files,
+                "file_mb": args.file_mb,
+                "replication_mbps_per_node": args.replication_mbps,
+                "blocks_lost": blocks_lost,
+                "detection_seconds": round(detected_at - killed_at, 2),
+                "recovery_seconds": round(recovery_seconds, 2),
+                "time_to_full_replication_seconds": round(recovered_at - killed_at, 2),
+                "recovery_mb_per_s": round(lost_mb / recovery_seconds, 1) if recovery_seconds else None
+            }), flush=True)
+        finally:
+            cluster.stop()
+            os.chdir(ROOT)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Small files with and without packing into container blocks.
+
+NameNode (one process per mode, temp metadata dir): allocates --files files of --file-kb each,
+a block per file through allocate_files (--batch-size per call) or packed through
+allocate_containers (--pack-size per call), and reports files/s, blocks and block replicas per
+DataNode, RSS the namespace grew by, and the checkpoint size.
+DataNode store path: writes --store-files of those files the way PUT /blocks stores a block
+(verify [chunk][crc32] framing, temp file, .meta sidecar, rename) once per file and once per
+container, and reports files/s and files left on disk.
+
+    python benchmarks/small_file_packing.py --files 200000 --file-kb 4
+"""
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "NameNode", "src"))
+sys.path.insert(0, os.path.join(ROOT, "DataNode", "src"))
+
+KB = 1024
+CHECKSUM_CHUNK_SIZE = 64 * KB
+NUM_DATANODES = 10
+
+
+def rss_bytes():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def namenode_run(mode, workdir, args):
+    os.environ.update(METADATA_DIR=os.path.join(workdir, "metadata"),
+                      NAMENODE_LOG_DIR=os.path.join(workdir, "logs"),
+                      NAMENODE_BLOCK_LOG_DIR=os.path.join(workdir, "block_logs"))
+    import metadata_manager
+    metadata_manager.load_metadata()
+    for i in range(NUM_DATANODES):
+        metadata_manager.update_datanode_heartbeat(f"datanode{i}")
+    filesize = args.file_kb * KB
+    per_call = args.pack_size if mode == "packed" else args.batch_size
+
+    gc.collect()
+    before = rss_bytes()
+    start = time.perf_counter()
+    for first in range(0, args.files, per_call):
+        requests = [{"filename": f"small/file{i}.txt", "filesize_bytes": filesize}
+                    for i in range(first, min(first + per_call, args.files))]
+        if mode == "packed":
+            _, txid = metadata_manager.allocate_containers(requests, args.replication)
+        else:
+            _, txid = metadata_manager.allocate_files(requests, args.replication)
+        metadata_manager.edit_log.sync(txid)
+    seconds = time.perf_counter() - start
+    gc.collect()
+    used = rss_bytes() - before
+
+    metadata_manager.checkpoint()
+    blocks = metadata_manager.namespace.num_blocks()
+    return {
+        "mode": mode,
+        "files": args.files,
+        "file_kb": args.file_kb,
+        "files_per_s": round(args.files / seconds),
+        "blocks": blocks,
+        "block_replicas_per_datanode": round(blocks * args.replication / NUM_DATANODES),
+        "namespace_rss_mb": round(used / 1024 / 1024, 1),
+        "bytes_per_file": round(used / args.files),
+        "checkpoint_mb": round(os.path.getsize(metadata_manager.SNAPSHOT_FILE) / 1024 / 1024, 1),
+    }
+
+
+def framed(data):
+    """The body the client sends for a block, [chunk][crc32] packets."""
+    parts = []
+    for i in range(0, len(data), CHECKSUM_CHUNK_SIZE):
+        chunk = data[i:i + CHECKSUM_CHUNK_SIZE]
+        parts.append(chunk)
+        parts.append(zlib.crc32(chunk).to_bytes(4, "big"))
+    return b"".join(parts)
+
+
+def store_block(directory, block_id, body):
+    """What PUT /blocks does with a body once it's off the socket."""
+    from checksums import FramedChecksumVerifier, meta_path_for, write_meta
+    block_path = os.path.join(directory, f"{block_id}.dat")
+    temp_path = block_path + ".tmp"
+    verifier = FramedChecksumVerifier(CHECKSUM_CHUNK_SIZE)
+    with open(temp_path, "wb") as f:
+        f.write(verifier.feed(body))
+        f.write(verifier.finish())
+    write_meta(meta_path_for(block_path), verifier.chunk_size, verifier.checksums)
+    os.replace(temp_path, block_path)
+
+
+def datanode_store(workdir, args):
+    from block_manager import pack_files_into_containers
+    source = os.path.join(workdir, "source")
+    os.makedirs(source)
+    paths = []
+    for i in range(args.store_files):
+        path = os.path.join(source, f"file{i}.txt")
+        with open(path, "wb") as f:
+            f.write(os.urandom(args.file_kb * KB))
+        paths.append(path)
+
+    results = {"mode": "datanode_store", "files": args.store_files, "file_kb": args.file_kb}
+    for label in ("per_file", "packed"):
+        directory = os.path.join(workdir, label)
+        os.makedirs(directory)
+        start = time.perf_counter()
+        if label == "per_file":
+            for i, path in enumerate(paths):
+                with open(path, "rb") as f:
+                    store_block(directory, f"block_{i}", framed(f.read()))
+        else:
+            containers = pack_files_into_containers([(path, os.path.getsize(path)) for path in paths])
+            for container in containers:
+                data = []
+                for packed in container["files"]:
+                    with open(packed["filename"], "rb") as f:
+                        data.append(f.read())
+                store_block(directory, container["block_id"], framed(b"".join(data)))
+        results[f"{label}_files_per_s"] = round(args.store_files / (time.perf_counter() - start))
+        results[f"{label}_files_on_disk"] = len(os.listdir(directory))
+    results["speedup"] = round(results["packed_files_per_s"] / results["per_file_files_per_s"], 1)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=200000)
+    parser.add_argument("--file-kb", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=1000, help="files per allocate_files call")
+    parser.add_argument("--pack-size", type=int, default=10000, help="files per allocate_containers call")
+    parser.add_argument("--store-files", type=int, default=20000)
+    parser.add_argument("--replication", type=int, default=2)
+    parser.add_argument("--single", choices=["per_file", "packed"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        with tempfile.TemporaryDirectory() as workdir:
+            print(json.dumps(namenode_run(args.single, workdir, args)))
+        return
+
+    for mode in ("per_file", "packed"):
+        output = subprocess.run([sys.executable, __file__, "--single", mode, "--files", str(args.files),
+                                 "--file-kb", str(args.file_kb), "--batch-size", str(args.batch_size),
+                                 "--pack-size", str(args.pack_size), "--replication", str(args.replication)],
+                                capture_output=True, text=True, check=True).stdout
+        print(output.strip().splitlines()[-1], flush=True)
+    with tempfile.TemporaryDirectory() as workdir:
+        print(json.dumps(datanode_store(workdir, args)), flush=True)
+
+
+if __name__ == "__main__":
+    main()
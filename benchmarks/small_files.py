@@ -0,0 +1,118 @@
+"""
+Files per second for many-small-files uploads, one POST /files per file vs POST /files/batch.
+
+NameNode only (always runs, in-process, temp metadata dir): allocates --files files of --file-kb
+each the way the two endpoints do, allocate_blocks + edit log fsync per file against
+allocate_files + one fsync per --batch-size files.
+End to end (--cluster): starts a NameNode and --datanodes DataNodes as local uvicorn processes
+(same setup as re_replication.py, Linux only) and uploads the files through the client, first
+with one upload() per file and then with upload_multiple_files, which allocates in batches.
+
+    python benchmarks/small_files.py --files 20000 --file-kb 4 --batch-size 100
+    python benchmarks/small_files.py --cluster --files 2000 --datanodes 3
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "NameNode", "src"))
+
+KB = 1024
+
+
+def namenode_files_per_second(workdir, args):
+    os.environ.update(METADATA_DIR=os.path.join(workdir, "metadata"),
+                      NAMENODE_LOG_DIR=os.path.join(workdir, "logs"),
+                      NAMENODE_BLOCK_LOG_DIR=os.path.join(workdir, "block_logs"))
+    import metadata_manager
+    metadata_manager.load_metadata()
+    for i in range(args.datanodes):
+        metadata_manager.update_datanode_heartbeat(f"datanode{i}")
+    filesize = args.file_kb * KB
+
+    start = time.perf_counter()
+    for i in range(args.files):
+        _, txid = metadata_manager.allocate_blocks(f"single/file{i}.txt", filesize, args.replication)
+        metadata_manager.edit_log.sync(txid)
+    single_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for first in range(0, args.files, args.batch_size):
+        requests = [{"filename": f"batch/file{i}.txt", "filesize_bytes": filesize}
+                    for i in range(first, min(first + args.batch_size, args.files))]
+        _, txid = metadata_manager.allocate_files(requests, args.replication)
+        metadata_manager.edit_log.sync(txid)
+    batch_seconds = time.perf_counter() - start
+
+    return {
+        "mode": "namenode_allocation",
+        "files": args.files,
+        "file_kb": args.file_kb,
+        "batch_size": args.batch_size,
+        "per_file_files_per_s": round(args.files / single_seconds),
+        "batched_files_per_s": round(args.files / batch_seconds),
+        "speedup": round(single_seconds / batch_seconds, 1),
+    }
+
+
+def cluster_files_per_second(workdir, args):
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from local_cluster import LocalCluster
+    with LocalCluster(workdir, args.datanodes, args.replication) as cluster:
+        os.environ["UPLOAD_BATCH_SIZE"] = str(args.batch_size)
+        client = cluster.client()
+        client.display_upload_result = lambda allocation: None
+        logging.getLogger(client.__name__).setLevel(logging.WARNING)
+        os.chdir(workdir)
+        try:
+            results = {"mode": "end_to_end", "files": args.files, "file_kb": args.file_kb, "datanodes": args.datanodes,
+                       "batch_size": args.batch_size, "upload_threads": args.threads}
+            for label in ("per_file", "batched"):
+                os.makedirs(label)
+                paths = []
+                for i in range(args.files):
+                    path = os.path.join(label, f"file{i}.txt")
+                    with open(path, "wb") as f:
+                        f.write(os.urandom(args.file_kb * KB))
+                    paths.append(path)
+                start = time.perf_counter()
+                if label == "per_file":
+                    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+                        responses = list(executor.map(client.upload, paths))
+                    if any(response is None or response.status_code != 200 for response in responses):
+                        raise RuntimeError("Some per-file uploads failed")
+                else:
+                    client.upload_multiple_files(paths, max_concurrent=args.threads)
+                results[f"{label}_files_per_s"] = round(args.files / (time.perf_counter() - start), 1)
+            results["speedup"] = round(results["batched_files_per_s"] / results["per_file_files_per_s"], 1)
+            return results
+        finally:
+            os.chdir(ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=20000)
+    parser.add_argument("--file-kb", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--datanodes", type=int, default=3)
+    parser.add_argument("--replication", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=5, help="client upload threads (end to end only)")
+    parser.add_argument("--cluster", action="store_true", help="also measure end to end with local processes")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        print(json.dumps(namenode_files_per_second(os.path.join(workdir, "inprocess"), args)), flush=True)
+    if args.cluster:
+        with tempfile.TemporaryDirectory() as workdir:
+            print(json.dumps(cluster_files_per_second(workdir, args)), flush=True)
+
+
+if __name__ == "__main__":
+    main()